@@ -20,6 +20,8 @@ from sys import executable
 from os.path import expanduser, dirname
 import sys
 
+import completion
+
 __author__ = 'nir'
 
 
@@ -31,6 +33,8 @@ def main():
         sys.exit('failed to retrieve os distribution')
 
     if distro in ('Ubuntu', 'debian'):
+        print 'generating completion index at {0}'.format(
+            completion.generate_index())
         user = getuser()
         home = expanduser("~")
         intd = dirname(executable)
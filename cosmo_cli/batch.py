@@ -0,0 +1,204 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# Helpers of the batch commands, which make a call to a management server
+# per item of a manifest (e.g. deployments create-batch).
+#
+# Manifests are either yaml lists of items (or mappings holding such a
+# list), or csv files whose header line names the items' fields. The
+# progress of a batch is journaled to a file, a json line per completed
+# item, so that a batch which was interrupted can be run again, skipping
+# the items it already completed. Once a batch is done, a json report of
+# all its items is written.
+#
+# The items of the batches which select them from a listing (e.g. by
+# --match and --older-than) are selected with select().
+
+import calendar
+import fnmatch
+import json
+import os
+import threading
+import time
+
+import storage
+
+__author__ = 'ran'
+
+
+class ManifestError(Exception):
+    pass
+
+
+def load_manifest(path, fields, key):
+    """
+    :param string path: the manifest's path; files with a .csv extension
+     are read as csv, others as yaml.
+    :param list fields: the fields every item must have.
+    :param string key: the field identifying an item, which mustn't repeat.
+    :rtype: `list` of the manifest's items, as dicts.
+    :raises ManifestError: if the manifest can't be read or isn't valid.
+    """
+    try:
+        with open(path, 'r') as f:
+            if os.path.splitext(path)[1].lower() == '.csv':
+                import csv
+                items = list(csv.DictReader(f))
+            else:
+                import yaml
+                items = yaml.safe_load(f)
+    except (IOError, ValueError) as e:
+        raise ManifestError('failed reading manifest {0}: {1}'
+                            .format(path, e))
+    except Exception as e:
+        # e.g. yaml errors, whose module is imported lazily
+        raise ManifestError('failed parsing manifest {0}: {1}'
+                            .format(path, e))
+    if isinstance(items, dict) and len(items) == 1:
+        # e.g. {'deployments': [...]}
+        items = items.values()[0]
+    if not isinstance(items, list):
+        raise ManifestError('manifest {0} is not a list of items'
+                            .format(path))
+    keys = set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or \
+                not all(item.get(field) for field in fields):
+            raise ManifestError(
+                'item {0} of manifest {1} is missing some of the fields: {2}'
+                .format(index + 1, path, ', '.join(fields)))
+        for field in fields:
+            item[field] = str(item[field]).strip()
+        if item[key] in keys:
+            raise ManifestError('{0} {1} repeats in manifest {2}'
+                                .format(key, item[key], path))
+        keys.add(item[key])
+    return items
+
+
+class Journal(object):
+
+    def __init__(self, path, key):
+        """
+        :param string path: the journal's path.
+        :param string key: the field identifying an entry's item.
+        """
+        self.path = path
+        self.key = key
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        :rtype: `dict` of the latest entry of every item journaled so far,
+         by the item's key.
+        """
+        entries = {}
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the last line of an interrupted batch
+                        continue
+                    entries[entry[self.key]] = entry
+        except IOError:
+            pass
+        return entries
+
+    def record(self, entry):
+        """
+        Appends an entry to the journal (from any thread).
+        """
+        line = json.dumps(entry, sort_keys=True) + '\n'
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+
+
+def write_report(path, items, counts):
+    """
+    Writes the json report of a batch.
+
+    :param list items: the result of every item, in the manifest's order.
+    :param dict counts: the number of items by their result's status.
+    """
+    storage.write_json(path, {'summary': counts, 'items': items})
+
+
+def count(items, status_field='status'):
+    """
+    :rtype: `dict` of the number of items by their status.
+    """
+    counts = {}
+    for item in items:
+        counts[item[status_field]] = counts.get(item[status_field], 0) + 1
+    return counts
+
+
+# seconds per unit of the ages given to select()
+AGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_age(age):
+    """
+    :param string age: a number of seconds, minutes, hours, days or weeks,
+     e.g. 30m or 2d.
+    :rtype: `float` the age in seconds.
+    :raises ValueError: if the age isn't valid.
+    """
+    age = age.strip().lower()
+    try:
+        return float(age[:-1]) * AGE_UNITS[age[-1]]
+    except (IndexError, KeyError, ValueError):
+        raise ValueError('age {0} should be a number followed by one of: {1}'
+                         .format(age, ', '.join(sorted(AGE_UNITS))))
+
+
+def parse_timestamp(timestamp):
+    """
+    :param string timestamp: a utc timestamp of the management server, e.g.
+     2014-06-10 12:00:00.123456 or 2014-06-10T12:00:00.123Z.
+    :rtype: `float` the timestamp in seconds since the epoch, or None if it
+     can't be parsed.
+    """
+    try:
+        parsed = time.strptime(timestamp[:19].replace('T', ' '),
+                               '%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return None
+    return calendar.timegm(parsed)
+
+
+def select(records, pattern, older_than=None, now=None):
+    """
+    :param list records: records having an id and a createdAt timestamp.
+    :param string pattern: a glob pattern (e.g. ci-*) of the ids to select.
+    :param float older_than: the minimal age, in seconds, of the records to
+     select; records whose age is unknown aren't selected.
+    :rtype: `list` of the selected records.
+    """
+    now = now or time.time()
+    selected = []
+    for record in records:
+        if not fnmatch.fnmatchcase(record['id'], pattern):
+            continue
+        if older_than is not None:
+            created_at = parse_timestamp(record.get('createdAt'))
+            if created_at is None or now - created_at < older_than:
+                continue
+        selected.append(record)
+    return selected
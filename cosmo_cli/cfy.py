@@ -0,0 +1,44 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# The entry point of the cfy executable.
+#
+# Kept deliberately small: shell completion is answered from the static
+# completion index, and commands are forwarded to the cfy daemon when one
+# is running, before the cli module (and its dependencies) is imported at
+# all.
+
+import os
+import sys
+
+import profiling
+
+__author__ = 'ran'
+
+
+def main():
+    profiling.mark(profiling.STARTED)
+    if '_ARGCOMPLETE' in os.environ:
+        import completion
+        completion.autocomplete()
+
+    import daemon
+    exit_code = daemon.run_command(sys.argv)
+    if exit_code is not None:
+        sys.exit(exit_code)
+
+    from cosmo_cli import main as cli_main
+    cli_main()
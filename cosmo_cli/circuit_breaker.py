@@ -0,0 +1,139 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# A circuit breaker per management server, shared by all cfy processes
+# through config.CIRCUIT_BREAKERS_FILE.
+#
+# Calls to a management server which fail transiently (see transport) are
+# counted; once config.CIRCUIT_BREAKER_THRESHOLD of them have failed with
+# no more than config.CIRCUIT_BREAKER_WINDOW seconds between failures, the
+# circuit opens, and calls to the server fail at once for
+# config.CIRCUIT_BREAKER_RESET seconds. The first call after that is let
+# through as a trial (the others still fail at once): its success closes
+# the circuit, and its failure opens it again. Failures older than the
+# window are forgotten, so the file only holds the servers which failed
+# recently.
+
+import time
+
+import clients
+import config
+import storage
+
+__author__ = 'ran'
+
+THRESHOLD_ENV_VAR = 'CFY_CIRCUIT_BREAKER_THRESHOLD'
+RESET_ENV_VAR = 'CFY_CIRCUIT_BREAKER_RESET'
+
+
+class CircuitOpenError(Exception):
+
+    def __init__(self, management_ip, seconds_left):
+        super(CircuitOpenError, self).__init__(
+            'management server {0} failed repeatedly; not calling it for '
+            'another {1:.0f} seconds'.format(management_ip, seconds_left))
+        self.management_ip = management_ip
+
+
+def _get_threshold():
+    return clients.get_setting(THRESHOLD_ENV_VAR,
+                               config.CIRCUIT_BREAKER_THRESHOLD, int)
+
+
+def _get_reset_seconds():
+    return clients.get_setting(RESET_ENV_VAR, config.CIRCUIT_BREAKER_RESET,
+                               float)
+
+
+def _is_recent(breaker, now):
+    return breaker['opened_at'] is not None or \
+        now - breaker['failed_at'] < config.CIRCUIT_BREAKER_WINDOW
+
+
+def _read_breakers():
+    return storage.read_json(config.CIRCUIT_BREAKERS_FILE, {})
+
+
+def _write_breakers(breakers, now):
+    storage.write_json(config.CIRCUIT_BREAKERS_FILE,
+                       dict((ip, breaker)
+                            for ip, breaker in breakers.iteritems()
+                            if _is_recent(breaker, now)))
+
+
+def check(management_ip):
+    """
+    Lets a call to the management server through, unless its circuit is
+    open.
+
+    :raises CircuitOpenError: if the circuit is open.
+    """
+    if _get_threshold() <= 0:
+        return
+    breaker = _read_breakers().get(management_ip)
+    if not breaker or breaker['opened_at'] is None:
+        return
+    now = time.time()
+    reset_seconds = _get_reset_seconds()
+    if now - breaker['opened_at'] < reset_seconds:
+        raise CircuitOpenError(management_ip,
+                               breaker['opened_at'] + reset_seconds - now)
+    with storage.lock(config.CIRCUIT_BREAKERS_FILE):
+        breakers = _read_breakers()
+        breaker = breakers.get(management_ip)
+        if not breaker or breaker['opened_at'] is None:
+            return
+        if now - breaker['opened_at'] < reset_seconds:
+            # another process is making the trial call
+            raise CircuitOpenError(
+                management_ip, breaker['opened_at'] + reset_seconds - now)
+        # this call is the trial; the others keep failing meanwhile
+        breaker['opened_at'] = now
+        _write_breakers(breakers, now)
+
+
+def record_failure(management_ip):
+    """
+    Counts a transient failure of a call to the management server, opening
+    its circuit once enough calls have failed.
+    """
+    if _get_threshold() <= 0:
+        return
+    now = time.time()
+    with storage.lock(config.CIRCUIT_BREAKERS_FILE):
+        breakers = _read_breakers()
+        breaker = breakers.get(management_ip)
+        if not breaker or not _is_recent(breaker, now):
+            breaker = breakers[management_ip] = {'failures': 0,
+                                                 'opened_at': None}
+        breaker['failures'] += 1
+        breaker['failed_at'] = now
+        if breaker['opened_at'] is not None or \
+                breaker['failures'] >= _get_threshold():
+            breaker['opened_at'] = now
+        _write_breakers(breakers, now)
+
+
+def record_success(management_ip):
+    """
+    Closes the circuit of the management server, if it had failures.
+    """
+    if management_ip not in _read_breakers():
+        return
+    with storage.lock(config.CIRCUIT_BREAKERS_FILE):
+        breakers = _read_breakers()
+        if breakers.pop(management_ip, None):
+            _write_breakers(breakers, time.time())
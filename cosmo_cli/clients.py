@@ -0,0 +1,192 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# The REST clients of the management servers, created once per manager
+# and process.
+#
+# The requests of the (new) CloudifyClient are all sent through a single
+# requests session, whose connection pools keep connections to the
+# managers alive between requests - and between commands, when run by the
+# cfy daemon. The pool sizes and the timeouts are set in config and may be
+# overridden by environment variables.
+#
+# Responses to GET requests are cached on disk (see http_cache).
+#
+# The rest client modules are imported only when a client is first
+# needed, as importing them is slow.
+
+import functools
+import json
+import os
+
+import config
+import http_cache
+
+__author__ = 'ran'
+
+POOL_SIZE_ENV_VAR = 'CFY_REST_POOL_SIZE'
+CONNECT_TIMEOUT_ENV_VAR = 'CFY_REST_CONNECT_TIMEOUT'
+READ_TIMEOUT_ENV_VAR = 'CFY_REST_READ_TIMEOUT'
+
+# the session shared by all clients, once created
+_session = None
+# the clients created, by their type and management server
+_clients = {}
+# bytes of the request and response bodies sent through the session
+_payload_stats = {'sent_bytes': 0, 'received_bytes': 0}
+
+
+def get_setting(env_var, default, setting_type):
+    """
+    :rtype: the setting's value in the environment variable, or default if
+     it isn't set (or isn't valid).
+    """
+    try:
+        return setting_type(os.environ[env_var])
+    except (KeyError, ValueError):
+        return default
+
+
+def get_timeouts():
+    """
+    :rtype: `tuple` of the connect and read timeouts of requests, in
+     seconds.
+    """
+    return (get_setting(CONNECT_TIMEOUT_ENV_VAR,
+                        config.REST_CONNECT_TIMEOUT, float),
+            get_setting(READ_TIMEOUT_ENV_VAR,
+                        config.REST_READ_TIMEOUT, float))
+
+
+def get_session():
+    """
+    :rtype: `requests.Session` the pooled session shared by all clients.
+    """
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=config.REST_POOL_MANAGERS,
+            pool_maxsize=get_setting(POOL_SIZE_ENV_VAR,
+                                     config.REST_POOL_SIZE, int))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session = session
+    return _session
+
+
+def _do_pooled_request(http_client, requests_method, uri, data=None,
+                       params=None, expected_status_code=200):
+    # HTTPClient.do_request, sending the request through the shared session
+    # rather than through the given requests function (e.g. requests.get),
+    # and answering GET requests from the cache where possible
+    request_url = '{0}{1}'.format(http_client.url, uri)
+    body = json.dumps(data) if data is not None else None
+    headers = {'Content-type': 'application/json'}
+    is_cacheable = requests_method.__name__ == 'get' and \
+        expected_status_code == 200
+    cached = http_cache.get(request_url, params) if is_cacheable else None
+    if cached:
+        if http_cache.is_fresh(cached):
+            return json.loads(cached['body'])
+        headers.update(http_cache.get_validators(cached))
+    session_method = getattr(get_session(), requests_method.__name__)
+    response = session_method(request_url,
+                              data=body,
+                              params=params,
+                              headers=headers,
+                              timeout=get_timeouts())
+    _payload_stats['sent_bytes'] += len(body or '')
+    _payload_stats['received_bytes'] += len(response.content)
+    if cached and response.status_code == 304:
+        # the response is still valid, and may come with new validators
+        http_cache.put(request_url, params, {
+            'ETag': response.headers.get('ETag', cached['etag']),
+            'Last-Modified': response.headers.get('Last-Modified',
+                                                  cached['last_modified'])
+        }, cached['body'])
+        return json.loads(cached['body'])
+    if response.status_code != expected_status_code:
+        http_client._raise_client_error(response, request_url)
+    if is_cacheable:
+        http_cache.put(request_url, params, response.headers, response.text)
+    return response.json()
+
+
+def get_client(management_ip, port=80):
+    """
+    :rtype: `CloudifyClient` the client of the management server, whose
+     requests are sent through the shared session.
+    """
+    key = ('cloudify', management_ip, port)
+    if key not in _clients:
+        from cloudify_rest_client import CloudifyClient
+        client = CloudifyClient(management_ip, port)
+        http_client = client._client
+        http_client.do_request = functools.partial(_do_pooled_request,
+                                                   http_client)
+        _clients[key] = client
+    return _clients[key]
+
+
+def get_legacy_client(management_ip):
+    """
+    :rtype: `CosmoManagerRestClient` the legacy client of the management
+     server.
+    """
+    key = ('cosmo', management_ip)
+    if key not in _clients:
+        from cosmo_manager_rest_client.cosmo_manager_rest_client \
+            import CosmoManagerRestClient
+        _clients[key] = CosmoManagerRestClient(management_ip)
+    return _clients[key]
+
+
+def get_stats():
+    """
+    :rtype: `dict` of the number of requests sent through the shared
+     session, of the connections opened for them and of the bytes sent and
+     received, so far.
+    """
+    stats = dict(_payload_stats, requests=0, connections=0)
+    if _session is None:
+        return stats
+    for adapter in set(_session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is not None:
+                stats['requests'] += pool.num_requests
+                stats['connections'] += pool.num_connections
+    return stats
+
+
+def format_stats(stats, since=None):
+    """
+    :param dict stats: stats returned by get_stats().
+    :param dict since: earlier stats to subtract, if any.
+    :rtype: `string` a summary of the connection reuse.
+    """
+    since = since or {}
+    delta = dict((key, value - since.get(key, 0))
+                 for key, value in stats.iteritems())
+    return 'rest: {0} requests over {1} new connections ({2} reused), ' \
+        '{3} bytes sent, {4} bytes received'.format(
+            delta['requests'], delta['connections'],
+            max(delta['requests'] - delta['connections'], 0),
+            delta['sent_bytes'], delta['received_bytes'])
@@ -0,0 +1,990 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# The declarative description of the cli's commands.
+#
+# Every command is a dictionary with a 'name' and an optional 'help'.
+# A command either has 'sub_commands' (a list of further commands) or it
+# is a leaf command, in which case it has a 'handler' (the name of the
+# function in cosmo_cli which handles it) and a list of 'arguments'.
+# Every argument has its 'flags' and any keyword argument accepted by
+# argparse's add_argument; a callable default is only evaluated when the
+# command's parser is actually built. The COMMON_ARGUMENTS are added to
+# every leaf command.
+#
+# Parsers are built from this registry on demand, only for the command
+# which is being invoked - see cosmo_cli._parse_args.
+
+import argparse
+import os
+
+import batch
+import config
+import formatting
+
+__author__ = 'ran'
+
+DESCRIPTION = 'Manages Cloudify in different Cloud Environments'
+
+
+def _comma_separated_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _age(value):
+    try:
+        return batch.parse_age(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+MANAGEMENT_IP_ARGUMENT = {
+    'flags': ['-t', '--management-ip'],
+    'dest': 'management_ip',
+    'metavar': 'MANAGEMENT_IP',
+    'type': str,
+    'help': 'The cloudify management server ip address'
+}
+
+NO_CACHE_ARGUMENT = {
+    'flags': ['--no-cache'],
+    'dest': 'no_cache',
+    'action': 'store_true',
+    'help': 'A flag for fetching the list from the management server rather '
+            'than from the cache of its responses'
+}
+
+FORMAT_ARGUMENT = {
+    'flags': ['--format'],
+    'dest': 'format',
+    'choices': formatting.FORMATS,
+    'default': formatting.TABLE,
+    'help': 'The output format (defaults to table); progress messages are '
+            'written to stderr with the other formats'
+}
+
+COLUMNS_ARGUMENT = {
+    'flags': ['--columns'],
+    'dest': 'columns',
+    'metavar': 'COLUMNS',
+    'type': _comma_separated_list,
+    'help': 'A comma separated list of the columns to output (defaults to '
+            'the command\'s columns); only these fields are fetched from '
+            'managers which support selecting them'
+}
+
+CONCURRENCY_ARGUMENT = {
+    'flags': ['--concurrency'],
+    'dest': 'concurrency',
+    'metavar': 'CONCURRENCY',
+    'type': int,
+    'default': lambda: config.FLEET_CONCURRENCY,
+    'help': 'The maximal number of management servers called at once '
+            '(defaults to {0})'.format(config.FLEET_CONCURRENCY)
+}
+
+MANAGERS_ARGUMENT = {
+    'flags': ['--managers'],
+    'dest': 'managers',
+    'metavar': 'MANAGERS',
+    'type': _comma_separated_list,
+    'help': 'A comma separated list of the aliases (or addresses) of the '
+            'management servers to list from at once, or \'all\' for every '
+            'registered management server; a manager column is added'
+}
+
+FLEET_TIMEOUT_ARGUMENT = {
+    'flags': ['--timeout'],
+    'dest': 'timeout',
+    'metavar': 'TIMEOUT',
+    'type': float,
+    'default': lambda: config.FLEET_LIST_TIMEOUT,
+    'help': 'Seconds to wait for all the management servers, with '
+            '--managers (defaults to {0})'.format(config.FLEET_LIST_TIMEOUT)
+}
+
+BATCH_CONCURRENCY_ARGUMENT = {
+    'flags': ['--concurrency'],
+    'dest': 'concurrency',
+    'metavar': 'CONCURRENCY',
+    'type': int,
+    'default': lambda: config.BATCH_CONCURRENCY,
+    'help': 'The maximal number of calls made to the management server at '
+            'once (defaults to {0})'.format(config.BATCH_CONCURRENCY)
+}
+
+BATCH_RATE_ARGUMENT = {
+    'flags': ['--rate'],
+    'dest': 'rate',
+    'metavar': 'RATE',
+    'type': float,
+    'default': lambda: config.BATCH_RATE,
+    'help': 'The maximal number of calls made to the management server per '
+            'second, 0 for no limit (defaults to {0})'
+            .format(config.BATCH_RATE)
+}
+
+OLDER_THAN_ARGUMENT = {
+    'flags': ['--older-than'],
+    'dest': 'older_than',
+    'metavar': 'AGE',
+    'type': _age,
+    'help': 'With --match, only delete what was created at least AGE ago, '
+            'e.g. 30m, 12h or 2d'
+}
+
+DRY_RUN_ARGUMENT = {
+    'flags': ['--dry-run'],
+    'dest': 'dry_run',
+    'action': 'store_true',
+    'help': 'A flag for only reporting what --match would delete'
+}
+
+INCLUDE_LOGS_ARGUMENT = {
+    'flags': ['-l', '--include-logs'],
+    'dest': 'include_logs',
+    'action': 'store_true',
+    'help': 'A flag whether to include logs in returned events'
+}
+
+
+COMMON_ARGUMENTS = [
+    {
+        'flags': ['-v', '--verbosity'],
+        'dest': 'verbosity',
+        'action': 'store_true',
+        'help': 'A flag for setting verbose output'
+    },
+    {
+        'flags': ['--profile'],
+        'dest': 'profile',
+        'action': 'store_true',
+        'help': 'A flag for writing the time spent in each phase of the '
+                'command to stderr'
+    },
+    {
+        'flags': ['--profile-dump'],
+        'dest': 'profile_dump',
+        'action': 'store_true',
+        'help': 'A flag for profiling the command, as with --profile, and '
+                'saving its pstats under ~/.cloudify/profiles'
+    }
+]
+
+
+def _match_argument(kind):
+    return {
+        'flags': ['--match'],
+        'dest': 'match',
+        'metavar': 'PATTERN',
+        'type': str,
+        'help': 'A glob pattern (e.g. \'ci-*\') of the ids of the {0} to '
+                'delete, instead of a single id'.format(kind)
+    }
+
+
+def _force_argument(help_message):
+    return {
+        'flags': ['-f', '--force'],
+        'dest': 'force',
+        'action': 'store_true',
+        'help': help_message
+    }
+
+
+COMMANDS = [
+    {
+        'name': 'status',
+        'help': 'Show a management server\'s status',
+        'handler': '_status',
+        'arguments': [
+            MANAGEMENT_IP_ARGUMENT,
+            {
+                'flags': ['--all'],
+                'dest': 'all',
+                'action': 'store_true',
+                'help': 'A flag for showing the status of every registered '
+                        'management server'
+            },
+            {
+                'flags': ['--aliases'],
+                'dest': 'aliases',
+                'metavar': 'ALIASES',
+                'type': _comma_separated_list,
+                'help': 'A comma separated list of the aliases (or '
+                        'addresses) of the management servers to show the '
+                        'status of'
+            },
+            CONCURRENCY_ARGUMENT,
+            {
+                'flags': ['--timeout'],
+                'dest': 'timeout',
+                'metavar': 'TIMEOUT',
+                'type': float,
+                'default': lambda: config.STATUS_PROBE_TIMEOUT,
+                'help': 'Seconds to wait for each management server\'s '
+                        'status, with --all or --aliases (defaults to '
+                        '{0})'.format(config.STATUS_PROBE_TIMEOUT)
+            },
+            FORMAT_ARGUMENT
+        ]
+    },
+    {
+        'name': 'use',
+        'help': 'Use/switch to the specified management server',
+        'handler': '_use_management_server',
+        'arguments': [
+            {
+                'flags': ['management_ip'],
+                'metavar': 'MANAGEMENT_IP',
+                'type': str,
+                'help': 'The cloudify management server ip address'
+            },
+            {
+                'flags': ['-a', '--alias'],
+                'dest': 'alias',
+                'metavar': 'ALIAS',
+                'type': str,
+                'help': 'An alias for the management server'
+            },
+            {
+                'flags': ['--tag'],
+                'dest': 'tags',
+                'metavar': 'TAG',
+                'action': 'append',
+                'help': 'A tag to register the management server with '
+                        '(may be repeated)'
+            },
+            {
+                'flags': ['--refresh'],
+                'dest': 'refresh',
+                'action': 'store_true',
+                'help': 'A flag for fetching the details of a registered '
+                        'management server from the server itself'
+            },
+            _force_argument(
+                'A flag indicating authorization to overwrite the alias if '
+                'it already exists')
+        ]
+    },
+    {
+        'name': 'managers',
+        'help': 'Manages the registry of management servers, shared by all '
+                'working directories',
+        'sub_commands': [
+            {
+                'name': 'list',
+                'help': 'command for listing the registered management '
+                        'servers',
+                'handler': '_list_managers',
+                'arguments': [
+                    {
+                        'flags': ['--tag'],
+                        'dest': 'tag',
+                        'metavar': 'TAG',
+                        'type': str,
+                        'help': 'Only list management servers with this tag'
+                    },
+                    {
+                        'flags': ['--provider'],
+                        'dest': 'provider',
+                        'metavar': 'PROVIDER',
+                        'type': str,
+                        'help': 'Only list management servers of this '
+                                'provider'
+                    },
+                    FORMAT_ARGUMENT,
+                    COLUMNS_ARGUMENT
+                ]
+            },
+            {
+                'name': 'remove',
+                'help': 'command for removing a management server from the '
+                        'registry',
+                'handler': '_remove_manager',
+                'arguments': [
+                    {
+                        'flags': ['management_ip'],
+                        'metavar': 'MANAGEMENT_IP',
+                        'type': str,
+                        'help': 'The management server ip address or alias'
+                    }
+                ]
+            }
+        ]
+    },
+    {
+        'name': 'init',
+        'help': 'Initialize configuration files for a specific cloud provider',
+        'handler': '_init_cosmo',
+        'arguments': [
+            {
+                'flags': ['provider'],
+                'metavar': 'PROVIDER',
+                'type': str,
+                'help': 'Command for initializing configuration files for a'
+                        ' specific provider'
+            },
+            {
+                'flags': ['-t', '--target-dir'],
+                'dest': 'target_dir',
+                'metavar': 'TARGET_DIRECTORY',
+                'type': str,
+                'default': os.getcwd,
+                'help': 'The target directory to be initialized for the '
+                        'given provider'
+            },
+            {
+                'flags': ['-r', '--reset-config'],
+                'dest': 'reset_config',
+                'action': 'store_true',
+                'help': 'A flag indicating overwriting existing configuration '
+                        'is allowed'
+            },
+            {
+                'flags': ['--install'],
+                'dest': 'install',
+                'metavar': 'PROVIDER_MODULE_URL',
+                'type': str,
+                'help': 'url to provider module'
+            },
+            {
+                'flags': ['--creds'],
+                'dest': 'creds',
+                'metavar': 'PROVIDER_CREDENTIALS',
+                'type': str,
+                'help': 'a comma separated list of key=value credentials'
+            }
+        ]
+    },
+    {
+        'name': 'bootstrap',
+        'help': 'Bootstrap Cloudify on the currently active provider',
+        'handler': '_bootstrap_cosmo',
+        'arguments': [
+            {
+                'flags': ['-c', '--config-file'],
+                'dest': 'config_file_path',
+                'metavar': 'CONFIG_FILE',
+                'default': None,
+                'type': str,
+                'help': 'Path to a provider configuration file'
+            },
+            {
+                'flags': ['--keep-up-on-failure'],
+                'dest': 'keep_up',
+                'action': 'store_true',
+                'help': 'A flag indicating that even if bootstrap fails,'
+                        ' the instance will remain running'
+            },
+            {
+                'flags': ['--dev-mode'],
+                'dest': 'dev_mode',
+                'action': 'store_true',
+                'help': 'A flag indicating that bootstrap will be run in '
+                        'dev-mode, allowing to choose specific branches to '
+                        'run with'
+            },
+            {
+                'flags': ['--skip-validations'],
+                'dest': 'skip_validations',
+                'action': 'store_true',
+                'help': 'A flag indicating that bootstrap will be run without,'
+                        ' validating resources prior to bootstrapping the '
+                        'manager'
+            },
+            {
+                'flags': ['--validate-only'],
+                'dest': 'validate_only',
+                'action': 'store_true',
+                'help': 'A flag indicating that validations will run without,'
+                        ' actually performing the bootstrap process.'
+            }
+        ]
+    },
+    {
+        'name': 'teardown',
+        'help': 'Teardown Cloudify',
+        'handler': '_teardown_cosmo',
+        'arguments': [
+            {
+                'flags': ['-c', '--config-file'],
+                'dest': 'config_file_path',
+                'metavar': 'CONFIG_FILE',
+                'default': None,
+                'type': str,
+                'help': 'Path to a provider configuration file'
+            },
+            {
+                'flags': ['--ignore-deployments'],
+                'dest': 'ignore_deployments',
+                'action': 'store_true',
+                'help': 'A flag indicating confirmation for teardown even if '
+                        'there exist active deployments'
+            },
+            {
+                'flags': ['--ignore-validation'],
+                'dest': 'ignore_validation',
+                'action': 'store_true',
+                'help': 'A flag indicating confirmation for teardown even if '
+                        'there are validation conflicts'
+            },
+            _force_argument(
+                'A flag indicating confirmation for the teardown request'),
+            MANAGEMENT_IP_ARGUMENT
+        ]
+    },
+    {
+        'name': 'blueprints',
+        'help': 'Manages Cloudify\'s Blueprints',
+        'sub_commands': [
+            {
+                'name': 'upload',
+                'help': 'command for uploading a blueprint to the management '
+                        'server',
+                'handler': '_upload_blueprint',
+                'arguments': [
+                    {
+                        'flags': ['blueprint_path'],
+                        'metavar': 'BLUEPRINT_FILE',
+                        'type': str,
+                        'help': "Path to the application's blueprint file"
+                    },
+                    {
+                        'flags': ['-b', '--blueprint-id'],
+                        'dest': 'blueprint_id',
+                        'metavar': 'BLUEPRINT_ID',
+                        'type': str,
+                        'default': None,
+                        'required': False,
+                        'help': "Set the id of the uploaded blueprint"
+                    },
+                    MANAGEMENT_IP_ARGUMENT
+                ]
+            },
+            {
+                'name': 'download',
+                'help': 'command for downloading a blueprint from the '
+                        'management server',
+                'handler': '_download_blueprint',
+                'arguments': [
+                    MANAGEMENT_IP_ARGUMENT,
+                    {
+                        'flags': ['-b', '--blueprint-id'],
+                        'dest': 'blueprint_id',
+                        'metavar': 'BLUEPRINT_ID',
+                        'type': str,
+                        'required': True,
+                        'help': "The id fo the blueprint to download"
+                    },
+                    {
+                        'flags': ['-o', '--output'],
+                        'dest': 'output',
+                        'metavar': 'OUTPUT',
+                        'type': str,
+                        'required': False,
+                        'help': "The output file path of the blueprint to be "
+                                "downloaded"
+                    }
+                ]
+            },
+            {
+                'name': 'list',
+                'help': 'command for listing all uploaded blueprints',
+                'handler': '_list_blueprints',
+                'arguments': [
+                    MANAGEMENT_IP_ARGUMENT,
+                    NO_CACHE_ARGUMENT,
+                    FORMAT_ARGUMENT,
+                    COLUMNS_ARGUMENT,
+                    MANAGERS_ARGUMENT,
+                    CONCURRENCY_ARGUMENT,
+                    FLEET_TIMEOUT_ARGUMENT
+                ]
+            },
+            {
+                'name': 'delete',
+                'help': 'command for deleting an uploaded blueprint',
+                'handler': '_delete_blueprint',
+                'arguments': [
+                    {
+                        'flags': ['-b', '--blueprint-id'],
+                        'dest': 'blueprint_id',
+                        'metavar': 'BLUEPRINT_ID',
+                        'type': str,
+                        'help': "The id of the blueprint meant for deletion"
+                    },
+                    _match_argument('blueprints'),
+                    OLDER_THAN_ARGUMENT,
+                    {
+                        'flags': ['-f', '--ignore-live-nodes'],
+                        'dest': 'ignore_live_nodes',
+                        'action': 'store_true',
+                        'default': False,
+                        'help': 'With --match, a flag indicating whether or '
+                                'not to delete the deployments of the '
+                                'matching blueprints even if there exist '
+                                'live nodes for them'
+                    },
+                    DRY_RUN_ARGUMENT,
+                    BATCH_CONCURRENCY_ARGUMENT,
+                    MANAGEMENT_IP_ARGUMENT
+                ]
+            },
+            {
+                'name': 'validate',
+                'help': 'command for validating a blueprint',
+                'handler': '_validate_blueprint',
+                'arguments': [
+                    {
+                        'flags': ['blueprint_file'],
+                        'metavar': 'BLUEPRINT_FILE',
+                        'type': argparse.FileType(),
+                        'help': 'Path to blueprint file to be validated'
+                    }
+                ]
+            }
+        ]
+    },
+    {
+        'name': 'deployments',
+        'help': 'Manages and Executes Cloudify\'s Deployments',
+        'sub_commands': [
+            {
+                'name': 'create',
+                'help': 'command for creating a deployment of a blueprint',
+                'handler': '_create_deployment',
+                'arguments': [
+                    {
+                        'flags': ['-b', '--blueprint-id'],
+                        'dest': 'blueprint_id',
+                        'metavar': 'BLUEPRINT_ID',
+                        'type': str,
+                        'required': True,
+                        'help': "The id of the blueprint meant for deployment"
+                    },
+                    {
+                        'flags': ['-d', '--deployment-id'],
+                        'dest': 'deployment_id',
+                        'metavar': 'DEPLOYMENT_ID',
+                        'type': str,
+                        'required': True,
+                        'help': "A unique id that will be assigned to the "
+                                "created deployment"
+                    },
+                    MANAGEMENT_IP_ARGUMENT
+                ]
+            },
+            {
+                'name': 'create-batch',
+                'help': 'command for creating the deployments of a manifest',
+                'handler': '_create_deployments_batch',
+                'arguments': [
+                    {
+                        'flags': ['-f', '--manifest'],
+                        'dest': 'manifest',
+                        'metavar': 'MANIFEST_FILE',
+                        'type': str,
+                        'required': True,
+                        'help': 'A yaml (or csv) file listing the '
+                                'blueprint_id and deployment_id of every '
+                                'deployment to create'
+                    },
+                    {
+                        'flags': ['--progress-file'],
+                        'dest': 'progress_file',
+                        'metavar': 'PROGRESS_FILE',
+                        'type': str,
+                        'help': 'The file recording the deployments created, '
+                                'which are skipped when the manifest is run '
+                                'again (defaults to MANIFEST_FILE.progress)'
+                    },
+                    {
+                        'flags': ['--report-file'],
+                        'dest': 'report_file',
+                        'metavar': 'REPORT_FILE',
+                        'type': str,
+                        'help': 'The json file reporting the result of every '
+                                'deployment (defaults to '
+                                'MANIFEST_FILE.report.json)'
+                    },
+                    BATCH_CONCURRENCY_ARGUMENT,
+                    BATCH_RATE_ARGUMENT,
+                    MANAGEMENT_IP_ARGUMENT
+                ]
+            },
+            {
+                'name': 'delete',
+                'help': 'command for deleting a deployment',
+                'handler': '_delete_deployment',
+                'arguments': [
+                    {
+                        'flags': ['-d', '--deployment-id'],
+                        'dest': 'deployment_id',
+                        'metavar': 'DEPLOYMENT_ID',
+                        'type': str,
+                        'help': "The deployment's id"
+                    },
+                    _match_argument('deployments'),
+                    OLDER_THAN_ARGUMENT,
+                    {
+                        'flags': ['-f', '--ignore-live-nodes'],
+                        'dest': 'ignore_live_nodes',
+                        'action': 'store_true',
+                        'default': False,
+                        'help': 'A flag indicating whether or not to delete '
+                                'the deployment even if there exist live '
+                                'nodes for it'
+                    },
+                    DRY_RUN_ARGUMENT,
+                    BATCH_CONCURRENCY_ARGUMENT,
+                    MANAGEMENT_IP_ARGUMENT
+                ]
+            },
+            {
+                'name': 'execute',
+                'help': 'command for executing a deployment of a blueprint',
+                'handler': '_execute_deployment_operation',
+                'arguments': [
+                    {
+                        'flags': ['operation'],
+                        'metavar': 'OPERATION',
+                        'type': str,
+                        'help': 'The operation to execute'
+                    },
+                    {
+                        'flags': ['-d', '--deployment-id'],
+                        'dest': 'deployment_id',
+                        'metavar': 'DEPLOYMENT_ID',
+                        'type': str,
+                        'required': True,
+                        'help': 'The id of the deployment to execute the '
+                                'operation on'
+                    },
+                    {
+                        'flags': ['--timeout'],
+                        'dest': 'timeout',
+                        'metavar': 'TIMEOUT',
+                        'type': int,
+                        'required': False,
+                        'default': 900,
+                        'help': 'Operation timeout in seconds (The execution '
+                                'itself will keep going, it is the CLI that '
+                                'will stop waiting for it to terminate)'
+                    },
+                    {
+                        'flags': ['--force'],
+                        'dest': 'force',
+                        'action': 'store_true',
+                        'default': False,
+                        'help': 'Whether the workflow should execute even if '
+                                'there is an ongoing execution for the '
+                                'provided deployment'
+                    },
+                    MANAGEMENT_IP_ARGUMENT,
+                    INCLUDE_LOGS_ARGUMENT
+                ]
+            },
+            {
+                'name': 'execute-batch',
+                'help': 'command for executing an operation on many '
+                        'deployments at once',
+                'handler': '_execute_deployments_batch',
+                'arguments': [
+                    {
+                        'flags': ['operation'],
+                        'metavar': 'OPERATION',
+                        'type': str,
+                        'help': 'The operation to execute'
+                    },
+                    {
+                        'flags': ['--deployments'],
+                        'dest': 'deployment_ids',
+                        'metavar': 'DEPLOYMENT_IDS',
+                        'type': _comma_separated_list,
+                        'help': 'A comma separated list of the ids of the '
+                                'deployments to execute the operation on'
+                    },
+                    {
+                        'flags': ['-b', '--blueprint-id'],
+                        'dest': 'blueprint_id',
+                        'metavar': 'BLUEPRINT_ID',
+                        'type': str,
+                        'help': 'The id of a blueprint to execute the '
+                                'operation on all the deployments of'
+                    },
+                    {
+                        'flags': ['--timeout'],
+                        'dest': 'timeout',
+                        'metavar': 'TIMEOUT',
+                        'type': int,
+                        'default': lambda: config.BATCH_EXECUTION_TIMEOUT,
+                        'help': 'Seconds to wait for all the executions '
+                                '(defaults to {0}); the executions '
+                                'themselves keep going, it is the CLI that '
+                                'stops waiting for them'
+                                .format(config.BATCH_EXECUTION_TIMEOUT)
+                    },
+                    {
+                        'flags': ['--force'],
+                        'dest': 'force',
+                        'action': 'store_true',
+                        'default': False,
+                        'help': 'Whether the workflow should execute even if '
+                                'there is an ongoing execution for a '
+                                'deployment'
+                    },
+                    BATCH_CONCURRENCY_ARGUMENT,
+                    MANAGEMENT_IP_ARGUMENT,
+                    INCLUDE_LOGS_ARGUMENT
+                ]
+            },
+            {
+                'name': 'list',
+                'help': 'command for listing all deployments or all '
+                        'deployments of a blueprint',
+                'handler': '_list_blueprint_deployments',
+                'arguments': [
+                    {
+                        'flags': ['-b', '--blueprint-id'],
+                        'dest': 'blueprint_id',
+                        'metavar': 'BLUEPRINT_ID',
+                        'type': str,
+                        'required': False,
+                        'help': 'The id of a blueprint to list deployments '
+                                'for'
+                    },
+                    {
+                        'flags': ['--page-size'],
+                        'dest': 'page_size',
+                        'metavar': 'PAGE_SIZE',
+                        'type': int,
+                        'help': 'The number of deployments to fetch per '
+                                'request (defaults to {0})'
+                                .format(config.DEPLOYMENTS_PAGE_SIZE)
+                    },
+                    {
+                        'flags': ['--limit'],
+                        'dest': 'limit',
+                        'metavar': 'LIMIT',
+                        'type': int,
+                        'help': 'The maximal number of deployments to list'
+                    },
+                    MANAGEMENT_IP_ARGUMENT,
+                    NO_CACHE_ARGUMENT,
+                    FORMAT_ARGUMENT,
+                    COLUMNS_ARGUMENT,
+                    MANAGERS_ARGUMENT,
+                    CONCURRENCY_ARGUMENT,
+                    FLEET_TIMEOUT_ARGUMENT
+                ]
+            }
+        ]
+    },
+    {
+        'name': 'executions',
+        'help': 'Manages Cloudify Executions',
+        'sub_commands': [
+            {
+                'name': 'list',
+                'help': 'command for listing all executions of a deployment',
+                'handler': '_list_deployment_executions',
+                'arguments': [
+                    {
+                        'flags': ['-d', '--deployment-id'],
+                        'dest': 'deployment_id',
+                        'metavar': 'DEPLOYMENT_ID',
+                        'type': str,
+                        'required': True,
+                        'help': 'The id of the deployment whose executions '
+                                'to list'
+                    },
+                    MANAGEMENT_IP_ARGUMENT,
+                    NO_CACHE_ARGUMENT,
+                    FORMAT_ARGUMENT,
+                    COLUMNS_ARGUMENT,
+                    MANAGERS_ARGUMENT,
+                    CONCURRENCY_ARGUMENT,
+                    FLEET_TIMEOUT_ARGUMENT
+                ]
+            },
+            {
+                'name': 'cancel',
+                'help': 'Cancel an execution by its id',
+                'handler': '_cancel_execution',
+                'arguments': [
+                    {
+                        'flags': ['-e', '--execution-id'],
+                        'dest': 'execution_id',
+                        'metavar': 'EXECUTION_ID',
+                        'type': str,
+                        'required': True,
+                        'help': 'The id of the execution to cancel'
+                    },
+                    MANAGEMENT_IP_ARGUMENT
+                ]
+            }
+        ]
+    },
+    {
+        'name': 'workflows',
+        'help': 'Manages Deployment Workflows',
+        'sub_commands': [
+            {
+                'name': 'list',
+                'help': 'command for listing workflows for a deployment',
+                'handler': '_list_workflows',
+                'arguments': [
+                    {
+                        'flags': ['-d', '--deployment-id'],
+                        'dest': 'deployment_id',
+                        'metavar': 'DEPLOYMENT_ID',
+                        'type': str,
+                        'required': True,
+                        'help': 'The id of the deployment whose workflows to '
+                                'list'
+                    },
+                    MANAGEMENT_IP_ARGUMENT,
+                    NO_CACHE_ARGUMENT,
+                    FORMAT_ARGUMENT,
+                    COLUMNS_ARGUMENT,
+                    MANAGERS_ARGUMENT,
+                    CONCURRENCY_ARGUMENT,
+                    FLEET_TIMEOUT_ARGUMENT
+                ]
+            }
+        ]
+    },
+    {
+        'name': 'events',
+        'help': 'Displays Events for different executions',
+        'handler': '_get_events',
+        'arguments': [
+            {
+                'flags': ['-e', '--execution-id'],
+                'dest': 'execution_id',
+                'metavar': 'EXECUTION_ID',
+                'type': str,
+                'required': True,
+                'help': 'The id of the execution to get events for'
+            },
+            INCLUDE_LOGS_ARGUMENT,
+            MANAGEMENT_IP_ARGUMENT,
+            FORMAT_ARGUMENT
+        ]
+    },
+    {
+        'name': 'dev',
+        'handler': '_run_dev',
+        'arguments': [
+            {
+                'flags': ['run'],
+                'metavar': 'RUN',
+                'type': str,
+                'help': 'Command for running tasks.'
+            },
+            {
+                'flags': ['--tasks'],
+                'dest': 'tasks',
+                'metavar': 'TASKS_LIST',
+                'type': str,
+                'help': 'A comma separated list of fabric tasks to run.'
+            },
+            {
+                'flags': ['--tasks-file'],
+                'dest': 'tasks_file',
+                'metavar': 'TASKS_FILE',
+                'type': str,
+                'help': 'Path to a tasks file'
+            },
+            MANAGEMENT_IP_ARGUMENT
+        ]
+    },
+    {
+        'name': 'completion',
+        'help': 'Generate the static shell completion index',
+        'handler': '_generate_completion_index',
+        'arguments': [
+            {
+                'flags': ['-o', '--output'],
+                'dest': 'output',
+                'metavar': 'OUTPUT',
+                'type': str,
+                'default': None,
+                'help': 'The path of the generated completion index file '
+                        '(defaults to ~/.cloudify/completion-index.json)'
+            }
+        ]
+    },
+    {
+        'name': 'daemon',
+        'help': 'Manages the cfy daemon, which runs commands in a '
+                'long-lived background process',
+        'sub_commands': [
+            {
+                'name': 'start',
+                'help': 'command for starting the cfy daemon',
+                'handler': '_start_daemon',
+                'arguments': [
+                    {
+                        'flags': ['--idle-timeout'],
+                        'dest': 'idle_timeout',
+                        'metavar': 'SECONDS',
+                        'type': int,
+                        'default': None,
+                        'help': 'Seconds without commands after which the '
+                                'daemon exits; 0 means never (defaults to '
+                                '3600)'
+                    }
+                ]
+            },
+            {
+                'name': 'stop',
+                'help': 'command for stopping the cfy daemon',
+                'handler': '_stop_daemon',
+                'arguments': []
+            },
+            {
+                'name': 'status',
+                'help': 'command for showing whether the cfy daemon is '
+                        'running',
+                'handler': '_get_daemon_status',
+                'arguments': []
+            }
+        ]
+    },
+    {
+        'name': 'ssh',
+        'help': 'SSH to management server',
+        'handler': '_run_ssh',
+        'arguments': [
+            {
+                'flags': ['-c', '--command'],
+                'dest': 'ssh_command',
+                'metavar': 'COMMAND',
+                'default': None,
+                'type': str,
+                'help': 'Execute command over SSH'
+            },
+            {
+                'flags': ['-p', '--plain'],
+                'dest': 'ssh_plain_mode',
+                'action': 'store_true',
+                'help': 'Leave authentication to user'
+            }
+        ]
+    }
+]
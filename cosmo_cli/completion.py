@@ -0,0 +1,204 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# Shell completion served from a static index of the cli's commands.
+#
+# The index is generated from the commands registry (by "cfy completion"
+# or by activate_cfy_bash_completion) and answers argcomplete's shell hook
+# without importing the cli itself, its logger or any of its dependencies.
+
+import json
+import os
+import shlex
+import sys
+
+import config
+
+__author__ = 'ran'
+
+INDEX_VERSION = 1
+VALUELESS_ACTIONS = ('store_true', 'store_false', 'store_const', 'count',
+                     'help', 'version')
+HELP_OPTIONS = {'-h': None, '--help': None}
+
+
+def _get_registry_mtime():
+    # the index is stale once the commands registry has been modified
+    # (e.g. by upgrading the cli)
+    registry_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'commands.py')
+    try:
+        return os.stat(registry_path).st_mtime
+    except OSError:
+        return None
+
+
+def _build_commands_index(command_specs, common_argument_specs):
+    index = {}
+    for spec in command_specs:
+        node = {'options': dict(HELP_OPTIONS)}
+        if 'sub_commands' in spec:
+            node['commands'] = _build_commands_index(spec['sub_commands'],
+                                                     common_argument_specs)
+        else:
+            positionals = 0
+            for argument_spec in spec['arguments'] + common_argument_specs:
+                flags = argument_spec['flags']
+                if not flags[0].startswith('-'):
+                    positionals += 1
+                    continue
+                takes_value = \
+                    argument_spec.get('action') not in VALUELESS_ACTIONS
+                for flag in flags:
+                    node['options'][flag] = argument_spec['dest'] \
+                        if takes_value else None
+            node['positionals'] = positionals
+        index[spec['name']] = node
+    return index
+
+
+def build_index():
+    """
+    Builds the completion index out of the commands registry.
+
+    :rtype: `dict` describing every command, its sub commands and options.
+     options which take a value are mapped to their destination name.
+    """
+    import commands
+    return {
+        'version': INDEX_VERSION,
+        'registry_mtime': _get_registry_mtime(),
+        'options': dict(HELP_OPTIONS),
+        'commands': _build_commands_index(commands.COMMANDS,
+                                          commands.COMMON_ARGUMENTS)
+    }
+
+
+def generate_index(index_file_path=None):
+    """
+    Generates the completion index file.
+
+    :param string index_file_path: path of the index file; defaults to
+     config.COMPLETION_INDEX_FILE.
+    :rtype: `string` path of the generated index file.
+    """
+    index_file_path = index_file_path or config.COMPLETION_INDEX_FILE
+    index_dir = os.path.dirname(index_file_path)
+    if index_dir and not os.path.isdir(index_dir):
+        os.makedirs(index_dir)
+    with open(index_file_path, 'w') as f:
+        json.dump(build_index(), f, indent=2, sort_keys=True)
+    return index_file_path
+
+
+def load_index(index_file_path=None):
+    """
+    Loads the completion index file, regenerating it if it's missing, out
+    of date or unreadable.
+
+    :rtype: `dict` the completion index.
+    """
+    index_file_path = index_file_path or config.COMPLETION_INDEX_FILE
+    try:
+        with open(index_file_path, 'r') as f:
+            index = json.load(f)
+        if index.get('version') == INDEX_VERSION and \
+                index.get('registry_mtime') == _get_registry_mtime():
+            return index
+    except (IOError, ValueError):
+        pass
+    try:
+        generate_index(index_file_path)
+    except (IOError, OSError):
+        # completion should work even when the index can't be stored
+        pass
+    return build_index()
+
+
+def _split_line(line):
+    try:
+        words = shlex.split(line)
+    except ValueError:
+        # unterminated quote in the word being completed
+        words = line.split()
+    if not line or line[-1].isspace():
+        words.append('')
+    return words[:-1], words[-1]
+
+
+def get_completions(index, comp_line, comp_point=None,
+                    value_completer=None):
+    """
+    Returns the completions for a command line.
+
+    :param dict index: the completion index.
+    :param string comp_line: the command line, including the program name.
+    :param int comp_point: the cursor's position in the command line.
+    :param value_completer: a callable completing an option's value, given
+     the option's destination name, the value's prefix and the words of
+     the command line. option values aren't completed if not given.
+    :rtype: `list` of completions for the word at the cursor.
+    """
+    if comp_point is None:
+        comp_point = len(comp_line)
+    words, prefix = _split_line(comp_line[:comp_point])
+    node = index
+    option_dest = None
+    for word in words[1:]:
+        if option_dest:
+            option_dest = None
+        elif word.startswith('-'):
+            option_dest = node['options'].get(word)
+        elif word in node.get('commands', {}):
+            node = node['commands'][word]
+
+    if option_dest:
+        return value_completer(option_dest, prefix, words) \
+            if value_completer else []
+    if 'commands' in node and not prefix.startswith('-'):
+        candidates = node['commands'].keys()
+    elif not prefix.startswith('-') and node.get('positionals'):
+        # leave positional arguments (paths, mostly) to the shell's default
+        # completion
+        return []
+    else:
+        used = set(words)
+        candidates = [option for option in node['options']
+                      if option not in used]
+    return sorted(c for c in candidates if c.startswith(prefix))
+
+
+def autocomplete():
+    """
+    Answers argcomplete's shell hook (when running under it) from the
+    completion index and exits; returns otherwise.
+    """
+    if '_ARGCOMPLETE' not in os.environ:
+        return
+    try:
+        output_stream = os.fdopen(8, 'wb')
+    except OSError:
+        os._exit(1)
+    ifs = os.environ.get('_ARGCOMPLETE_IFS', '\013')
+    comp_line = os.environ.get('COMP_LINE', '')
+    comp_point = int(os.environ.get('COMP_POINT', len(comp_line)))
+    import inventory
+    completions = get_completions(load_index(), comp_line, comp_point,
+                                  inventory.complete_value)
+    output_stream.write(ifs.join(completions))
+    output_stream.flush()
+    sys.stdout.flush()
+    os._exit(0)
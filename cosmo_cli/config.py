@@ -14,9 +14,88 @@
 #    * See the License for the specific language governing permissions and
 #    * limitations under the License.
 
-# logger configuration
 from os import path
-LOG_DIR = path.expanduser('~/.cloudify')
+USER_DIR = path.expanduser('~/.cloudify')
+
+# shell completion
+COMPLETION_INDEX_FILE = path.join(USER_DIR, 'completion-index.json')
+# cached ids of blueprints, deployments and executions, per manager
+INVENTORY_DIR = path.join(USER_DIR, 'inventory')
+# seconds after which cached ids are refreshed in the background
+INVENTORY_TTL = 300
+# minimal seconds between two background refreshes of the same manager
+INVENTORY_REFRESH_INTERVAL = 30
+
+# pstats of profiled commands (see --profile-dump)
+PROFILES_DIR = path.join(USER_DIR, 'profiles')
+
+# the registry of management servers, shared by all working directories
+MANAGERS_REGISTRY_FILE = path.join(USER_DIR, 'managers.json')
+
+# the REST clients' connection pools: connections kept alive per
+# management server, and management servers to keep connections to
+REST_POOL_SIZE = 10
+REST_POOL_MANAGERS = 100
+# seconds to wait for a connection, and for a response
+REST_CONNECT_TIMEOUT = 10
+REST_READ_TIMEOUT = 120
+# retries of idempotent calls failing transiently, the seconds to wait
+# before the first retry (doubled for every further retry, up to the
+# maximum, and randomized)
+REST_RETRIES = 2
+REST_RETRY_BACKOFF = 0.5
+REST_RETRY_BACKOFF_MAX = 10
+# the circuit breakers of the management servers: calls failing in a row
+# (0 disables the breakers), seconds to fail calls at once once they did,
+# and seconds after which a failure is forgotten
+CIRCUIT_BREAKERS_FILE = path.join(USER_DIR, 'circuit-breakers.json')
+CIRCUIT_BREAKER_THRESHOLD = 5
+CIRCUIT_BREAKER_RESET = 30
+CIRCUIT_BREAKER_WINDOW = 60
+
+# the cache of the management servers' responses: seconds to use
+# responses which can't be revalidated, and the cache's size in bytes
+CACHE_DIR = path.join(USER_DIR, 'cache')
+CACHE_TTL = 15
+CACHE_SIZE_LIMIT = 20 * 1024 * 1024
+
+# management servers called at once by commands which call many of them,
+# seconds to wait for a management server's status, and seconds to wait
+# for all the management servers' lists
+FLEET_CONCURRENCY = 50
+STATUS_PROBE_TIMEOUT = 10
+FLEET_LIST_TIMEOUT = 60
+
+# calls made at once by the batch commands (no more than the connections
+# kept alive per management server), and calls per second (0 means no
+# limit)
+BATCH_CONCURRENCY = 10
+BATCH_RATE = 20
+# seconds to wait for all the executions of a workflow on many deployments
+BATCH_EXECUTION_TIMEOUT = 3600
+# seconds given to executions which time out to report their execution id
+# before they're cut off
+BATCH_EXECUTION_GRACE = 30
+
+# deployments fetched per request when listing deployments
+DEPLOYMENTS_PAGE_SIZE = 1000
+
+# rows setting the widths of a table's columns
+TABLE_SAMPLE_ROWS = 1000
+# lines written to stdout at once
+OUTPUT_CHUNK_LINES = 256
+
+# the cfy daemon
+DAEMON_SOCKET = path.join(USER_DIR, 'daemon.sock')
+# seconds without commands after which the daemon exits (0 means never)
+DAEMON_IDLE_TIMEOUT = 3600
+# seconds to wait for a starting daemon to accept connections
+DAEMON_START_TIMEOUT = 10
+# seconds to wait for a command's output once it has returned
+DAEMON_OUTPUT_DRAIN_TIMEOUT = 5
+
+# logger configuration
+LOG_DIR = USER_DIR
 MODULE = 'cli'
 LOGGER = {
     "version": 1,
@@ -30,7 +109,7 @@ LOGGER = {
     },
     "handlers": {
         "file": {
-            "class": "logging.handlers.RotatingFileHandler",
+            "class": "cosmo_cli.log_handlers.QueuedRotatingFileHandler",
             "formatter": "file",
             "level": "DEBUG",
             "filename": "{0}/cloudify-{1}.log".format(LOG_DIR, MODULE),
@@ -20,12 +20,12 @@ __author__ = 'ran'
 
 # Standard
 import argparse
-import argcomplete
 import imp
+import itertools
 import sys
 import os
+import time
 import traceback
-import yaml
 import json
 import urlparse
 import urllib
@@ -33,28 +33,36 @@ import shutil
 from copy import deepcopy
 from contextlib import contextmanager
 import logging
-import logging.config
 import config
+import batch
+import circuit_breaker
+import clients
+import commands
 import formatting
-from fabric.api import env, local
-from fabric.context_managers import settings
+import profiling
+import storage
+import transport
+import inventory
+import managers
+import parallel
 from platform import system
 from distutils.spawn import find_executable
 from subprocess import call
 
-# Project
-from cosmo_manager_rest_client.cosmo_manager_rest_client \
-    import CosmoManagerRestClient
-from cosmo_manager_rest_client.cosmo_manager_rest_client \
-    import (CosmoManagerRestCallError,
-            CosmoManagerRestCallTimeoutError,
-            CosmoManagerRestCallHTTPError)
-from dsl_parser.parser import parse_from_path, DSLParsingException
-from cloudify_rest_client import CloudifyClient
+# Project modules (fabric, dsl_parser and the REST clients) are imported
+# by the command handlers which need them rather than here, so that a
+# command only pays for the dependencies it actually uses.
 
 
 output_level = logging.INFO
 CLOUDIFY_WD_SETTINGS_FILE_NAME = '.cloudify'
+# the version of the working directory settings file's format
+WD_SETTINGS_VERSION = 1
+# the yaml tag of the settings files written before the format was versioned
+LEGACY_WD_SETTINGS_YAML_TAG = u'!WD_Settings'
+# the working directory settings loaded (or dumped) by this process, by
+# the absolute path of their file, along with the file's signature
+_wd_settings_session = {}
 
 CONFIG_FILE_NAME = 'cloudify-config.yaml'
 DEFAULTS_CONFIG_FILE_NAME = 'cloudify-config.defaults.yaml'
@@ -64,20 +72,46 @@ AGENT_MAX_WORKERS = 5
 AGENT_KEY_PATH = '~/.ssh/cloudify-agents-kp.pem'
 REMOTE_EXECUTION_PORT = 22
 
+# the results of the items of batches
+CREATED = 'created'
+ALREADY_EXISTS = 'already exists'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+TIMED_OUT = 'timed out'
+DELETED = 'deleted'
+SKIPPED = 'skipped'
+
+# stands for every registered management server (see --managers)
+ALL_MANAGERS = 'all'
+# the column of the management server of records listed from many of them
+MANAGER_COLUMN = 'manager'
+
+# the columns of events in csv and tsv output (see _get_event_record)
+EVENT_COLUMNS = ['timestamp', 'type', 'level', 'deploymentId', 'nodeId',
+                 'operation', 'message']
+
 # http://stackoverflow.com/questions/8144545/turning-off-logging-in-paramiko
 logging.getLogger("paramiko").setLevel(logging.WARNING)
 logging.getLogger("requests.packages.urllib3.connectionpool").setLevel(
     logging.ERROR)
 
 
+# the loggers configured by init_logger, once it has been called
+_loggers = None
+
+
 def init_logger():
     """
     initializes a logger to be used throughout the cli
     can be used by provider codes.
+    the logging configuration is applied on the first call only.
 
     :rtype: `tupel` with 2 loggers, one for users (writes to console and file),
      and the other for archiving (writes to file only).
     """
+    global _loggers
+    if _loggers:
+        return _loggers
     if os.path.isfile(config.LOG_DIR):
         sys.exit('file {0} exists - cloudify log directory cannot be created '
                  'there. please remove the file and try again.'
@@ -87,24 +121,31 @@ def init_logger():
         d = os.path.dirname(logfile)
         if not os.path.exists(d):
             os.makedirs(d)
+        import logging.config
         logging.config.dictConfig(config.LOGGER)
         lgr = logging.getLogger('main')
         lgr.setLevel(logging.INFO)
         flgr = logging.getLogger('file')
         flgr.setLevel(logging.DEBUG)
-        return (lgr, flgr)
+        _loggers = (lgr, flgr)
+        return _loggers
     except ValueError:
         sys.exit('could not initialize logger.'
                  ' verify your logger config'
                  ' and permissions to write to {0}'
                  .format(logfile))
 
-# initialize logger
-lgr, flgr = init_logger()
+# the loggers are configured lazily, when a command is run
+lgr = logging.getLogger('main')
+flgr = logging.getLogger('file')
 
 
 def main():
+    profiling.mark(profiling.IMPORTED)
+    init_logger()
+    profiling.mark(profiling.LOGGING_INITIALIZED)
     args = _parse_args(sys.argv[1:])
+    profiling.mark(profiling.PARSED)
     args.handler(args)
 
 
@@ -113,488 +154,92 @@ def _parse_args(args):
     Parses the arguments using the Python argparse library.
     Generates shell autocomplete using the argcomplete library.
 
+    Parsers are built from the commands registry only for the command
+    being invoked; the other commands are merely listed in the help output.
+
     :param list args: arguments from cli
     :rtype: `python argument parser`
     """
-    # main parser
-    parser = argparse.ArgumentParser(
-        description='Manages Cloudify in different Cloud Environments')
-
-    subparsers = parser.add_subparsers()
-    parser_status = subparsers.add_parser(
-        'status',
-        help='Show a management server\'s status'
-    )
-    parser_use = subparsers.add_parser(
-        'use',
-        help='Use/switch to the specified management server'
-    )
-    parser_init = subparsers.add_parser(
-        'init',
-        help='Initialize configuration files for a specific cloud provider'
+    if '_ARGCOMPLETE' in os.environ:
+        # completion needs to know about the entire command tree
+        import argcomplete
+        parser = _build_parser()
+        argcomplete.autocomplete(parser)
+    else:
+        parser = _build_parser(args)
+    return parser.parse_args(args)
 
-    )
-    parser_bootstrap = subparsers.add_parser(
-        'bootstrap',
-        help='Bootstrap Cloudify on the currently active provider'
-    )
-    parser_teardown = subparsers.add_parser(
-        'teardown',
-        help='Teardown Cloudify'
-    )
-    parser_blueprints = subparsers.add_parser(
-        'blueprints',
-        help='Manages Cloudify\'s Blueprints'
-    )
-    parser_deployments = subparsers.add_parser(
-        'deployments',
-        help='Manages and Executes Cloudify\'s Deployments'
-    )
-    parser_executions = subparsers.add_parser(
-        'executions',
-        help='Manages Cloudify Executions'
-    )
-    parser_workflows = subparsers.add_parser(
-        'workflows',
-        help='Manages Deployment Workflows'
-    )
-    parser_events = subparsers.add_parser(
-        'events',
-        help='Displays Events for different executions'
-    )
-    parser_dev = subparsers.add_parser(
-        'dev'
-    )
-    parser_ssh = subparsers.add_parser(
-        'ssh',
-        help='SSH to management server'
-    )
 
-    # status subparser
-    _add_management_ip_optional_argument_to_parser(parser_status)
-    _set_handler_for_command(parser_status, _status)
+def _build_parser(args=None):
+    """
+    Builds the cli's argument parser out of the commands registry.
 
-    # use subparser
-    parser_use.add_argument(
-        'management_ip',
-        metavar='MANAGEMENT_IP',
-        type=str,
-        help='The cloudify management server ip address'
-    )
-    parser_use.add_argument(
-        '-a', '--alias',
-        dest='alias',
-        metavar='ALIAS',
-        type=str,
-        help='An alias for the management server'
-    )
-    _add_force_optional_argument_to_parser(
-        parser_use,
-        'A flag indicating authorization to overwrite the alias if it '
-        'already exists'
-    )
-    _set_handler_for_command(parser_use, _use_management_server)
-
-    # init subparser
-    parser_init.add_argument(
-        'provider',
-        metavar='PROVIDER',
-        type=str,
-        help='Command for initializing configuration files for a'
-             ' specific provider'
-    )
-    parser_init.add_argument(
-        '-t', '--target-dir',
-        dest='target_dir',
-        metavar='TARGET_DIRECTORY',
-        type=str,
-        default=os.getcwd(),
-        help='The target directory to be initialized for the given provider'
-    )
-    parser_init.add_argument(
-        '-r', '--reset-config',
-        dest='reset_config',
-        action='store_true',
-        help='A flag indicating overwriting existing configuration is allowed'
-    )
-    parser_init.add_argument(
-        '--install',
-        dest='install',
-        metavar='PROVIDER_MODULE_URL',
-        type=str,
-        help='url to provider module'
-    )
-    parser_init.add_argument(
-        '--creds',
-        dest='creds',
-        metavar='PROVIDER_CREDENTIALS',
-        type=str,
-        help='a comma separated list of key=value credentials'
-    )
-    _set_handler_for_command(parser_init, _init_cosmo)
-
-    # bootstrap subparser
-    parser_bootstrap.add_argument(
-        '-c', '--config-file',
-        dest='config_file_path',
-        metavar='CONFIG_FILE',
-        default=None,
-        type=str,
-        help='Path to a provider configuration file'
-    )
-    parser_bootstrap.add_argument(
-        '--keep-up-on-failure',
-        dest='keep_up',
-        action='store_true',
-        help='A flag indicating that even if bootstrap fails,'
-        ' the instance will remain running'
-    )
-    parser_bootstrap.add_argument(
-        '--dev-mode',
-        dest='dev_mode',
-        action='store_true',
-        help='A flag indicating that bootstrap will be run in dev-mode,'
-        ' allowing to choose specific branches to run with'
-    )
-    parser_bootstrap.add_argument(
-        '--skip-validations',
-        dest='skip_validations',
-        action='store_true',
-        help='A flag indicating that bootstrap will be run without,'
-        ' validating resources prior to bootstrapping the manager'
-    )
-    parser_bootstrap.add_argument(
-        '--validate-only',
-        dest='validate_only',
-        action='store_true',
-        help='A flag indicating that validations will run without,'
-        ' actually performing the bootstrap process.'
-    )
-    _set_handler_for_command(parser_bootstrap, _bootstrap_cosmo)
-
-    # teardown subparser
-    parser_teardown.add_argument(
-        '-c', '--config-file',
-        dest='config_file_path',
-        metavar='CONFIG_FILE',
-        default=None,
-        type=str,
-        help='Path to a provider configuration file'
-    )
-    parser_teardown.add_argument(
-        '--ignore-deployments',
-        dest='ignore_deployments',
-        action='store_true',
-        help='A flag indicating confirmation for teardown even if there '
-             'exist active deployments'
-    )
-    parser_teardown.add_argument(
-        '--ignore-validation',
-        dest='ignore_validation',
-        action='store_true',
-        help='A flag indicating confirmation for teardown even if there '
-             'are validation conflicts'
-    )
-    _add_force_optional_argument_to_parser(
-        parser_teardown,
-        'A flag indicating confirmation for the teardown request')
-    _add_management_ip_optional_argument_to_parser(parser_teardown)
-    _set_handler_for_command(parser_teardown, _teardown_cosmo)
-
-    # blueprints subparser
-    blueprints_subparsers = parser_blueprints.add_subparsers()
-
-    parser_blueprints_upload = blueprints_subparsers.add_parser(
-        'upload',
-        help='command for uploading a blueprint to the management server'
-    )
-    parser_blueprints_download = blueprints_subparsers.add_parser(
-        'download',
-        help='command for downloading a blueprint from the management server'
-    )
-    parser_blueprints_list = blueprints_subparsers.add_parser(
-        'list',
-        help='command for listing all uploaded blueprints'
-    )
-    parser_blueprints_delete = blueprints_subparsers.add_parser(
-        'delete',
-        help='command for deleting an uploaded blueprint'
-    )
-    parser_blueprints_validate = blueprints_subparsers.add_parser(
-        'validate',
-        help='command for validating a blueprint'
-    )
-    parser_blueprints_validate.add_argument(
-        'blueprint_file',
-        metavar='BLUEPRINT_FILE',
-        type=argparse.FileType(),
-        help='Path to blueprint file to be validated'
-    )
-    _set_handler_for_command(parser_blueprints_validate, _validate_blueprint)
+    :param list args: arguments from cli; when given, only the parsers
+     needed for parsing these arguments are built. when None, the parsers
+     for the entire command tree are built.
+    :rtype: `python argument parser`
+    """
+    parser = argparse.ArgumentParser(description=commands.DESCRIPTION)
+    _add_commands_to_parser(parser, commands.COMMANDS, args)
+    return parser
+
+
+def _add_commands_to_parser(parser, command_specs, args):
+    metavar = '{{{0}}}'.format(
+        ','.join(spec['name'] for spec in command_specs))
+    if args is not None:
+        invoked = [spec for spec in command_specs
+                   if args and spec['name'] == args[0]]
+        if not invoked:
+            # no command (or help) was requested at this level - list the
+            # available commands without building their parsers
+            _add_commands_listing_to_parser(parser, command_specs, metavar)
+            return
+        command_specs, args = invoked, args[1:]
+
+    subparsers = parser.add_subparsers(metavar=metavar)
+    for spec in command_specs:
+        command_parser = subparsers.add_parser(spec['name'],
+                                               **_get_help_kwargs(spec))
+        if 'sub_commands' in spec:
+            _add_commands_to_parser(command_parser,
+                                    spec['sub_commands'],
+                                    args)
+        else:
+            for argument_spec in spec['arguments']:
+                _add_argument_to_parser(command_parser, argument_spec)
+            _set_handler_for_command(command_parser,
+                                     globals()[spec['handler']])
 
-    parser_blueprints_upload.add_argument(
-        'blueprint_path',
-        metavar='BLUEPRINT_FILE',
-        type=str,
-        help="Path to the application's blueprint file"
-    )
-    parser_blueprints_upload.add_argument(
-        '-b', '--blueprint-id',
-        dest='blueprint_id',
-        metavar='BLUEPRINT_ID',
-        type=str,
-        default=None,
-        required=False,
-        help="Set the id of the uploaded blueprint"
-    )
-    _add_management_ip_optional_argument_to_parser(parser_blueprints_upload)
-    _set_handler_for_command(parser_blueprints_upload, _upload_blueprint)
-
-    _add_management_ip_optional_argument_to_parser(parser_blueprints_list)
-    _set_handler_for_command(parser_blueprints_list, _list_blueprints)
-
-    _add_management_ip_optional_argument_to_parser(parser_blueprints_download)
-    _set_handler_for_command(parser_blueprints_download, _download_blueprint)
-
-    parser_blueprints_download.add_argument(
-        '-b', '--blueprint-id',
-        dest='blueprint_id',
-        metavar='BLUEPRINT_ID',
-        type=str,
-        required=True,
-        help="The id fo the blueprint to download"
-    )
-    parser_blueprints_download.add_argument(
-        '-o', '--output',
-        dest='output',
-        metavar='OUTPUT',
-        type=str,
-        required=False,
-        help="The output file path of the blueprint to be downloaded"
-    )
 
-    parser_blueprints_delete.add_argument(
-        '-b', '--blueprint-id',
-        dest='blueprint_id',
-        metavar='BLUEPRINT_ID',
-        type=str,
-        required=True,
-        help="The id of the blueprint meant for deletion"
-    )
-    _add_management_ip_optional_argument_to_parser(parser_blueprints_delete)
-    _set_handler_for_command(parser_blueprints_delete, _delete_blueprint)
-
-    # deployments subparser
-    deployments_subparsers = parser_deployments.add_subparsers()
-    parser_deployments_create = deployments_subparsers.add_parser(
-        'create',
-        help='command for creating a deployment of a blueprint'
-    )
-    parser_deployments_delete = deployments_subparsers.add_parser(
-        'delete',
-        help='command for deleting a deployment'
-    )
-    parser_deployments_execute = deployments_subparsers.add_parser(
-        'execute',
-        help='command for executing a deployment of a blueprint'
-    )
-    parser_deployments_list = deployments_subparsers.add_parser(
-        'list',
-        help='command for listing all deployments or all deployments'
-             'of a blueprint'
-    )
-    parser_deployments_create.add_argument(
-        '-b', '--blueprint-id',
-        dest='blueprint_id',
-        metavar='BLUEPRINT_ID',
-        type=str,
-        required=True,
-        help="The id of the blueprint meant for deployment"
-    )
-    parser_deployments_create.add_argument(
-        '-d', '--deployment-id',
-        dest='deployment_id',
-        metavar='DEPLOYMENT_ID',
-        type=str,
-        required=True,
-        help="A unique id that will be assigned to the created deployment"
-    )
-    _add_management_ip_optional_argument_to_parser(parser_deployments_create)
-    _set_handler_for_command(parser_deployments_create, _create_deployment)
-
-    parser_deployments_delete.add_argument(
-        '-d', '--deployment-id',
-        dest='deployment_id',
-        metavar='DEPLOYMENT_ID',
-        type=str,
-        required=True,
-        help="The deployment's id"
-    )
-    parser_deployments_delete.add_argument(
-        '-f', '--ignore-live-nodes',
-        dest='ignore_live_nodes',
-        action='store_true',
-        default=False,
-        help='A flag indicating whether or not to delete the deployment even '
-             'if there exist live nodes for it'
-    )
-    _add_management_ip_optional_argument_to_parser(parser_deployments_delete)
-    _set_handler_for_command(parser_deployments_delete, _delete_deployment)
-
-    parser_deployments_execute.add_argument(
-        'operation',
-        metavar='OPERATION',
-        type=str,
-        help='The operation to execute'
-    )
-    parser_deployments_execute.add_argument(
-        '-d', '--deployment-id',
-        dest='deployment_id',
-        metavar='DEPLOYMENT_ID',
-        type=str,
-        required=True,
-        help='The id of the deployment to execute the operation on'
-    )
-    parser_deployments_execute.add_argument(
-        '--timeout',
-        dest='timeout',
-        metavar='TIMEOUT',
-        type=int,
-        required=False,
-        default=900,
-        help='Operation timeout in seconds (The execution itself will keep '
-             'going, it is the CLI that will stop waiting for it to terminate)'
-    )
-    parser_deployments_execute.add_argument(
-        '--force',
-        dest='force',
-        action='store_true',
-        default=False,
-        help='Whether the workflow should execute even if there is an ongoing'
-             ' execution for the provided deployment'
-    )
-    _add_management_ip_optional_argument_to_parser(parser_deployments_execute)
-    _add_include_logs_argument_to_parser(parser_deployments_execute)
-    _set_handler_for_command(parser_deployments_execute,
-                             _execute_deployment_operation)
-
-    parser_deployments_list.add_argument(
-        '-b', '--blueprint-id',
-        dest='blueprint_id',
-        metavar='BLUEPRINT_ID',
-        type=str,
-        required=False,
-        help='The id of a blueprint to list deployments for'
-    )
-    _add_management_ip_optional_argument_to_parser(parser_deployments_list)
-    _set_handler_for_command(parser_deployments_list,
-                             _list_blueprint_deployments)
-
-    # workflows subparser
-    workflows_subparsers = parser_workflows.add_subparsers()
-    parser_workflows_list = workflows_subparsers.add_parser(
-        'list',
-        help='command for listing workflows for a deployment')
-    parser_workflows_list.add_argument(
-        '-d', '--deployment-id',
-        dest='deployment_id',
-        metavar='DEPLOYMENT_ID',
-        type=str,
-        required=True,
-        help='The id of the deployment whose workflows to list'
-    )
-    _add_management_ip_optional_argument_to_parser(parser_workflows_list)
-    _set_handler_for_command(parser_workflows_list, _list_workflows)
-
-    # Executions list sub parser
-    executions_subparsers = parser_executions.add_subparsers()
-    parser_executions_list = executions_subparsers.add_parser(
-        'list',
-        help='command for listing all executions of a deployment'
+def _add_commands_listing_to_parser(parser, command_specs, metavar):
+    parser.formatter_class = argparse.RawDescriptionHelpFormatter
+    parser.epilog = 'commands:\n{0}'.format('\n'.join(
+        '  {0:<22}{1}'.format(spec['name'], spec.get('help', '')).rstrip()
+        for spec in command_specs))
+    parser.add_argument(
+        'command',
+        metavar=metavar,
+        choices=[spec['name'] for spec in command_specs],
+        help='One of the commands listed below'
     )
-    parser_executions_list.add_argument(
-        '-d', '--deployment-id',
-        dest='deployment_id',
-        metavar='DEPLOYMENT_ID',
-        type=str,
-        required=True,
-        help='The id of the deployment whose executions to list'
+    parser.add_argument(
+        'command_args',
+        nargs=argparse.REMAINDER,
+        help=argparse.SUPPRESS
     )
-    _add_management_ip_optional_argument_to_parser(parser_executions_list)
-    _set_handler_for_command(parser_executions_list,
-                             _list_deployment_executions)
 
-    parser_executions_cancel = executions_subparsers.add_parser(
-        'cancel',
-        help='Cancel an execution by its id'
-    )
-    parser_executions_cancel.add_argument(
-        '-e', '--execution-id',
-        dest='execution_id',
-        metavar='EXECUTION_ID',
-        type=str,
-        required=True,
-        help='The id of the execution to cancel'
-    )
-    _add_management_ip_optional_argument_to_parser(parser_executions_cancel)
-    _set_handler_for_command(parser_executions_cancel,
-                             _cancel_execution)
-
-    parser_events.add_argument(
-        '-e', '--execution-id',
-        dest='execution_id',
-        metavar='EXECUTION_ID',
-        type=str,
-        required=True,
-        help='The id of the execution to get events for'
-    )
-    _add_include_logs_argument_to_parser(parser_events)
-    _add_management_ip_optional_argument_to_parser(parser_events)
-    _set_handler_for_command(parser_events, _get_events)
-
-    # dev subparser
-    parser_dev.add_argument(
-        'run',
-        metavar='RUN',
-        type=str,
-        help='Command for running tasks.'
-    )
-    parser_dev.add_argument(
-        '--tasks',
-        dest='tasks',
-        metavar='TASKS_LIST',
-        type=str,
-        help='A comma separated list of fabric tasks to run.'
-    )
-    parser_dev.add_argument(
-        '--tasks-file',
-        dest='tasks_file',
-        metavar='TASKS_FILE',
-        type=str,
-        help='Path to a tasks file'
-    )
-    _add_management_ip_optional_argument_to_parser(parser_dev)
-    _set_handler_for_command(parser_dev, _run_dev)
-
-    # ssh subparser
-    parser_ssh.add_argument(
-        '-c', '--command',
-        dest='ssh_command',
-        metavar='COMMAND',
-        default=None,
-        type=str,
-        help='Execute command over SSH'
-    )
-    parser_ssh.add_argument(
-        '-p', '--plain',
-        dest='ssh_plain_mode',
-        action='store_true',
-        help='Leave authentication to user'
-    )
-    _set_handler_for_command(parser_ssh, _run_ssh)
 
-    argcomplete.autocomplete(parser)
-    return parser.parse_args(args)
+def _get_help_kwargs(command_spec):
+    return {'help': command_spec['help']} if 'help' in command_spec else {}
+
+
+def _add_argument_to_parser(parser, argument_spec):
+    kwargs = dict((key, value) for key, value in argument_spec.iteritems()
+                  if key != 'flags')
+    if callable(kwargs.get('default')):
+        kwargs['default'] = kwargs['default']()
+    parser.add_argument(*argument_spec['flags'], **kwargs)
 
 
 def _get_provider_module(provider_name, is_verbose_output=False):
@@ -626,54 +271,41 @@ def _get_provider_module(provider_name, is_verbose_output=False):
         raise CosmoCliError(str(ex)) if is_verbose_output else sys.exit(msg)
 
 
-def _add_include_logs_argument_to_parser(parser):
-    parser.add_argument(
-        '-l', '--include-logs',
-        dest='include_logs',
-        action='store_true',
-        help='A flag whether to include logs in returned events'
-    )
-
-
-def _add_force_optional_argument_to_parser(parser, help_message):
-    parser.add_argument(
-        '-f', '--force',
-        dest='force',
-        action='store_true',
-        help=help_message
-    )
-
-
-def _add_management_ip_optional_argument_to_parser(parser):
-    parser.add_argument(
-        '-t', '--management-ip',
-        dest='management_ip',
-        metavar='MANAGEMENT_IP',
-        type=str,
-        help='The cloudify management server ip address'
-    )
-
-
 def _set_handler_for_command(parser, handler):
-    _add_verbosity_argument_to_parser(parser)
+    for argument_spec in commands.COMMON_ARGUMENTS:
+        _add_argument_to_parser(parser, argument_spec)
+
+    def output_aware_handler(args):
+        if getattr(args, 'format', formatting.TABLE) == formatting.TABLE:
+            return handler(args)
+        with _console_output_to_stderr():
+            handler(args)
 
     def verbosity_aware_handler(args):
         global output_level
-        if args.verbosity:
-            lgr.setLevel(logging.DEBUG)
-            output_level = logging.DEBUG
-        handler(args)
-
-    parser.set_defaults(handler=verbosity_aware_handler)
+        if not args.verbosity:
+            return output_aware_handler(args)
+        lgr.setLevel(logging.DEBUG)
+        output_level = logging.DEBUG
+        connection_stats = clients.get_stats()
+        call_stats = transport.get_stats()
+        try:
+            output_aware_handler(args)
+        finally:
+            lgr.debug(transport.format_stats(transport.get_stats(),
+                                             call_stats))
+            lgr.debug(clients.format_stats(clients.get_stats(),
+                                           connection_stats))
 
+    def profiling_aware_handler(args):
+        is_profile, is_dump = profiling.get_mode(args.profile,
+                                                 args.profile_dump)
+        if not is_profile:
+            return verbosity_aware_handler(args)
+        with profiling.profile(handler.__name__.lstrip('_'), is_dump):
+            verbosity_aware_handler(args)
 
-def _add_verbosity_argument_to_parser(parser):
-    parser.add_argument(
-        '-v', '--verbosity',
-        dest='verbosity',
-        action='store_true',
-        help='A flag for setting verbose output'
-    )
+    parser.set_defaults(handler=profiling_aware_handler)
 
 
 def set_global_verbosity_level(is_verbose_output=False):
@@ -724,6 +356,7 @@ def _read_config(config_file_path, provider_dir, is_verbose_output=False):
         raise ValueError('Missing the configuration file; expected to find '
                          'it at {0}'.format(config_file_path))
 
+    import yaml
     lgr.debug('reading provider config files')
     with open(config_file_path, 'r') as config_file, \
             open(defaults_config_file_path, 'r') as defaults_config_file:
@@ -824,6 +457,7 @@ def init(provider, target_directory, reset_config, install=False,
             provider_module_name, provider = _get_provider_by_name()
         except:
             if install:
+                from fabric.api import local
                 local('pip install {0} --process-dependency-links'
                       .format(install))
             provider_module_name, provider = _get_provider_by_name()
@@ -849,6 +483,7 @@ def init(provider, target_directory, reset_config, install=False,
             shutil.copy(files_path, target_directory)
 
         if creds:
+            import yaml
             src_config_file = '{}/{}'.format(provider_dir,
                                              DEFAULTS_CONFIG_FILE_NAME)
             dst_config_file = '{}/{}'.format(target_directory,
@@ -936,8 +571,12 @@ def _bootstrap_cosmo(args):
             wd_settings.set_provider_context(provider_context)
 
         # storing provider context on management server
-        _get_rest_client(mgmt_ip).post_provider_context(provider_name,
-                                                        provider_context)
+        _get_transport(mgmt_ip).post_provider_context(provider_name,
+                                                      provider_context)
+        with _update_managers(args.verbosity) as registry:
+            registry.register(mgmt_ip, provider=provider_name,
+                              provider_context=provider_context,
+                              status=managers.RUNNING)
 
         lgr.info(
             "management server is up at {0} (is now set as the default "
@@ -991,7 +630,7 @@ def _teardown_cosmo(args):
 
     mgmt_ip = _get_management_server_ip(args)
     if not args.ignore_deployments and \
-            len(_get_rest_client(mgmt_ip).list_deployments()) > 0:
+            len(_get_transport(mgmt_ip).list_deployments()) > 0:
         msg = ("Management server {0} has active deployments. Add the "
                "'--ignore-deployments' flag to your command to ignore "
                "these deployments and execute topology teardown."
@@ -1019,6 +658,8 @@ def _teardown_cosmo(args):
     with _update_wd_settings(args.verbosity) as wd_settings:
         # wd_settings.set_provider_context(provider_context)
         wd_settings.remove_management_server_context(mgmt_ip)
+    with _update_managers(args.verbosity) as registry:
+        registry.remove(mgmt_ip)
 
     lgr.info("teardown complete")
 
@@ -1067,11 +708,13 @@ def _get_mgmt_key(is_verbose_output=False):
 
 
 def _get_provider_name_and_context(mgmt_ip, is_verbose_output=False):
+    from cosmo_manager_rest_client.cosmo_manager_rest_client \
+        import CosmoManagerRestCallError
     # trying to retrieve provider context from server
     try:
-        response = _get_rest_client(mgmt_ip).get_provider_context()
+        response = _get_transport(mgmt_ip).get_provider_context()
         return response['name'], response['context']
-    except CosmoManagerRestCallError as e:
+    except (CosmoManagerRestCallError, transport.NotFoundError) as e:
         lgr.warn('Failed to get provider context from server: {0}'.format(
             str(e)))
 
@@ -1097,11 +740,17 @@ def _get_provider_name_and_context(mgmt_ip, is_verbose_output=False):
 
 
 def _status(args):
+    if args.all or args.aliases:
+        return _status_of_managers(args)
     management_ip = _get_management_server_ip(args)
     lgr.info(
         'querying management server {0}'.format(management_ip))
 
     status_result = _get_management_server_status(management_ip)
+    if managers.load().get(management_ip):
+        with _update_managers(args.verbosity) as registry:
+            registry.set_status(management_ip, managers.RUNNING
+                                if status_result else managers.NOT_RESPONDING)
     if status_result:
         lgr.info(
             "REST service at management server {0} is up and running"
@@ -1121,11 +770,81 @@ def _status(args):
         return False
 
 
+def _get_management_server_ips(addresses_or_aliases, is_verbose_output):
+    # the ips of the management servers, where 'all' stands for every
+    # registered management server
+    registry = managers.load()
+    management_ips = []
+    for address_or_alias in addresses_or_aliases:
+        if address_or_alias == ALL_MANAGERS:
+            management_ips.extend(manager['ip']
+                                  for manager in registry.find())
+        else:
+            management_ips.append(registry.translate(address_or_alias))
+    if not management_ips:
+        msg = ("No management servers are registered; run 'cfy use' or "
+               "'cfy bootstrap' first")
+        flgr.error(msg)
+        raise CosmoCliError(msg) if is_verbose_output else sys.exit(msg)
+    # (in their given order, without duplicates)
+    return sorted(set(management_ips), key=management_ips.index)
+
+
+def _status_of_managers(args):
+    registry = managers.load()
+    management_ips = _get_management_server_ips(
+        args.aliases or [ALL_MANAGERS], args.verbosity)
+    lgr.info('querying {0} management servers'.format(len(management_ips)))
+
+    statuses = {}
+
+    def rows():
+        with profiling.phase(profiling.REST):
+            results = parallel.run(
+                lambda management_ip: _get_transport(management_ip).status(),
+                management_ips, args.concurrency, args.timeout)
+            for result in results:
+                manager = registry.get(result.item) or {}
+                row = {'ip': result.item,
+                       'aliases': ','.join(manager.get('aliases', [])),
+                       'latencyMs': int(result.seconds * 1000),
+                       'services': '',
+                       'error': ''}
+                if result.is_success:
+                    row['status'] = managers.RUNNING
+                    row['services'] = ', '.join(
+                        '{0}: {1}'.format(service.display_name,
+                                          service.instances[0]['state']
+                                          if service.instances else
+                                          'Unknown')
+                        for service in result.value.services)
+                elif result.is_timed_out:
+                    row['status'] = managers.NOT_RESPONDING
+                    row['error'] = 'timed out'
+                else:
+                    row['status'] = managers.NOT_RESPONDING
+                    row['error'] = str(result.error)
+                statuses[result.item] = row['status']
+                yield row
+
+    _output_list(args, 'Management servers:',
+                 ['ip', 'aliases', 'status', 'latencyMs', 'services',
+                  'error'], rows())
+    with _update_managers(args.verbosity) as updated_registry:
+        for management_ip, status in statuses.iteritems():
+            updated_registry.set_status(management_ip, status)
+    return all(status == managers.RUNNING for status in statuses.values())
+
+
 def _get_management_server_status(management_ip):
-    client = _get_rest_client(management_ip)
+    from cosmo_manager_rest_client.cosmo_manager_rest_client \
+        import CosmoManagerRestCallError
     try:
-        return client.status()
-    except CosmoManagerRestCallError:
+        return _get_transport(management_ip).status()
+    except (CosmoManagerRestCallError, transport.NotFoundError,
+            circuit_breaker.CircuitOpenError) as e:
+        lgr.debug('failed getting the status of management server {0}: {1}'
+                  .format(management_ip, e))
         return None
 
 
@@ -1135,68 +854,225 @@ def _use_management_server(args):
         # even if "init" wasn't called prior to this.
         _dump_cosmo_working_dir_settings(CosmoWorkingDirectorySettings())
 
-    if not _get_management_server_status(args.management_ip):
-        msg = ("Can't use management server {0}: No response.".format(
-            args.management_ip))
-        flgr.error(msg)
-        raise CosmoCliError(msg) if args.verbosity else sys.exit(msg)
+    management_ip = _load_cosmo_working_dir_settings(args.verbosity)\
+        .translate_management_alias(args.management_ip)
+    registry = managers.load()
+    if registry.get(management_ip) and not args.refresh:
+        # switching to a registered manager needs no calls to it
+        lgr.debug('using the registration of management server {0}'
+                  .format(management_ip))
+        provider_name = registry.get(management_ip)['provider']
+        provider_context = registry.get_provider_context(management_ip)
+    else:
+        from cosmo_manager_rest_client.cosmo_manager_rest_client \
+            import CosmoManagerRestCallError
+        if not _get_management_server_status(management_ip):
+            msg = ("Can't use management server {0}: No response.".format(
+                args.management_ip))
+            flgr.error(msg)
+            raise CosmoCliError(msg) if args.verbosity else sys.exit(msg)
 
+        try:
+            response = _get_transport(management_ip)\
+                .get_provider_context()
+            provider_name = response['name']
+            provider_context = response['context']
+        except (CosmoManagerRestCallError, transport.NotFoundError):
+            provider_name = None
+            provider_context = None
+
+    # the registry and the working directory settings are only written
+    # once neither of them has rejected the alias
     try:
-        response = _get_rest_client(args.management_ip)\
-            .get_provider_context()
-        provider_name = response['name']
-        provider_context = response['context']
-    except CosmoManagerRestCallError:
-        provider_name = None
-        provider_context = None
+        with managers.update() as registry:
+            registry.register(management_ip, alias=args.alias,
+                              tags=args.tags, provider=provider_name,
+                              provider_context=provider_context,
+                              is_allow_overwrite=args.force)
+            if args.refresh or not registry.get(management_ip)['status']:
+                registry.set_status(management_ip, managers.RUNNING)
+            with _update_wd_settings(args.verbosity) as wd_settings:
+                wd_settings.set_management_server(management_ip)
+                wd_settings.set_provider_context(provider_context)
+                wd_settings.set_provider(provider_name)
+                if args.alias:
+                    wd_settings.save_management_alias(args.alias,
+                                                      management_ip,
+                                                      args.force,
+                                                      args.verbosity)
+    except managers.ManagerRegistryError as ex:
+        msg = str(ex)
+        flgr.error(msg)
+        raise CosmoCliError(msg) if args.verbosity else sys.exit(msg)
 
-    with _update_wd_settings(args.verbosity) as wd_settings:
-        wd_settings.set_management_server(
-            wd_settings.translate_management_alias(args.management_ip))
-        wd_settings.set_provider_context(provider_context)
-        wd_settings.set_provider(provider_name)
-        if args.alias:
-            wd_settings.save_management_alias(args.alias,
-                                              args.management_ip,
-                                              args.force,
-                                              args.verbosity)
-            lgr.info(
-                'Using management server {0} (alias {1})'.format(
-                    args.management_ip, args.alias))
-        else:
-            lgr.info('Using management server {0}'.format(
-                     args.management_ip))
+    if args.alias:
+        lgr.info('Using management server {0} (alias {1})'.format(
+            management_ip, args.alias))
+    else:
+        lgr.info('Using management server {0}'.format(management_ip))
+
+
+def _list_managers(args):
+    registry = managers.load()
+    registrations = registry.find(tag=args.tag, provider=args.provider)
+    cols, _ = _get_columns(args, ['ip', 'aliases', 'tags', 'provider',
+                                  'status', 'statusUpdatedAt'])
+    _output_list(args, 'Management servers:', cols,
+                 data=[{
+                     'ip': manager['ip'],
+                     'aliases': ','.join(manager['aliases']),
+                     'tags': ','.join(manager['tags']),
+                     'provider': manager['provider'] or '',
+                     'status': manager['status'] or '',
+                     'statusUpdatedAt': _format_timestamp(
+                         manager['status_updated_at'])
+                 } for manager in registrations])
+
+
+def _format_timestamp(timestamp):
+    import datetime
+    return datetime.datetime.utcfromtimestamp(int(timestamp)).isoformat() \
+        if timestamp else ''
+
+
+def _remove_manager(args):
+    with _update_managers(args.verbosity) as registry:
+        manager = registry.remove(args.management_ip)
+    if manager:
+        lgr.info('Removed management server {0} from the registry'
+                 .format(manager['ip']))
+    else:
+        msg = ('Management server {0} is not registered'
+               .format(args.management_ip))
+        flgr.error(msg)
+        raise CosmoCliError(msg) if args.verbosity else sys.exit(msg)
 
 
 def _list_blueprints(args):
+    cols, fields = _get_columns(args, ['id', 'createdAt', 'updatedAt'],
+                                ['id'])
+
+    def list_blueprints(management_ip):
+        client = _get_transport(management_ip, not args.no_cache)
+        blueprints = client.list_blueprints(**_include(fields))
+        inventory.update(management_ip, inventory.BLUEPRINTS,
+                         [blueprint['id'] for blueprint in blueprints])
+        return blueprints
+
+    if args.managers:
+        return _list_from_managers(args, 'Blueprints:', cols,
+                                   list_blueprints)
     management_ip = _get_management_server_ip(args)
-    client = _get_new_rest_client(management_ip)
 
     lgr.info('Getting blueprints list... [manager={0}]'.format(management_ip))
 
-    pt = formatting.table(['id', 'createdAt', 'updatedAt'],
-                          data=client.blueprints.list())
+    _output_list(args, 'Blueprints:', cols,
+                 data=list_blueprints(management_ip))
+
+
+def _get_columns(args, default_cols, required_fields=()):
+    # the columns to output, and the fields to fetch for them along with
+    # those the handler relies on (None for all the fields, which json
+    # output holds unless the columns are given)
+    cols = args.columns or default_cols
+    if not args.columns and args.format in (formatting.JSON,
+                                            formatting.JSONL):
+        return cols, None
+    fields = [col for col in cols if col != MANAGER_COLUMN]
+    fields.extend(field for field in required_fields if field not in cols)
+    return cols, fields
+
+
+def _list_from_managers(args, title, cols, list_records):
+    # lists the records of many management servers at once (by calling
+    # list_records with every management server's ip), as a single list
+    # with a column of the management server of every record. Management
+    # servers which fail to list their records are reported once the list
+    # is output.
+    management_ips = _get_management_server_ips(args.managers,
+                                                args.verbosity)
+    lgr.info('Listing from {0} management servers...'
+             .format(len(management_ips)))
+    if not args.columns and MANAGER_COLUMN not in cols:
+        cols = [MANAGER_COLUMN] + cols
+    failures = []
+
+    def records():
+        with profiling.phase(profiling.REST):
+            results = parallel.run(list_records, management_ips,
+                                   args.concurrency,
+                                   total_timeout=args.timeout)
+            for result in results:
+                if not result.is_success:
+                    failures.append(result)
+                    continue
+                for record in result.value:
+                    record = dict(record)
+                    record[MANAGER_COLUMN] = result.item
+                    yield record
+
+    _output_list(args, title, cols, records())
+    for failure in failures:
+        lgr.error('Failed listing from management server {0}: {1}'
+                  .format(failure.item, 'timed out' if failure.is_timed_out
+                          else failure.error))
+    if failures:
+        msg = ('Failed listing from {0} of {1} management servers'
+               .format(len(failures), len(management_ips)))
+        flgr.error(msg)
+        raise CosmoCliError(msg) if args.verbosity else sys.exit(msg)
 
-    _output_table('Blueprints:', pt)
 
+def _include(fields):
+    # the keyword arguments selecting the fields of a listing, if any
+    return {'_include': fields} if fields else {}
 
-def _output_table(title, table):
-    lgr.info('{0}{1}{0}{2}{0}'.format(os.linesep, title, table))
+
+@profiling.timed(profiling.RENDER)
+def _output_list(args, title, cols, data, defaults=None):
+    # the rows are written as they're formatted, rather than logged as a
+    # single message
+    if args.format == formatting.TABLE:
+        lines = itertools.chain(['', title],
+                                formatting.table(cols, data, defaults), [''])
+    else:
+        lines = formatting.records(args.format, cols, data, defaults,
+                                   bool(getattr(args, 'columns', None)))
+    sys.stdout.flush()
+    formatting.write_lines(sys.stdout, lines)
+
+
+@contextmanager
+def _console_output_to_stderr():
+    # keeps the progress messages out of machine-readable output
+    console_handlers = [handler for handler in lgr.handlers
+                        if getattr(handler, 'stream', None) is sys.stdout]
+    for handler in console_handlers:
+        handler.stream = sys.stderr
+    try:
+        yield
+    finally:
+        for handler in console_handlers:
+            handler.stream = sys.stdout
 
 
 def _delete_blueprint(args):
+    if _is_matching(args, args.blueprint_id, '--blueprint-id'):
+        return _delete_matching(args, is_blueprints=True)
     management_ip = _get_management_server_ip(args)
     blueprint_id = args.blueprint_id
 
     lgr.info(
         'Deleting blueprint {0} from management server {1}'.format(
             blueprint_id, management_ip))
-    client = _get_rest_client(management_ip)
+    client = _get_transport(management_ip)
     client.delete_blueprint(blueprint_id)
     lgr.info("Deleted blueprint successfully")
 
 
 def _delete_deployment(args):
+    if _is_matching(args, args.deployment_id, '--deployment-id'):
+        return _delete_matching(args, is_blueprints=False)
     management_ip = _get_management_server_ip(args)
     deployment_id = args.deployment_id
     ignore_live_nodes = args.ignore_live_nodes
@@ -1204,11 +1080,113 @@ def _delete_deployment(args):
     lgr.info(
         'Deleting deployment {0} from management server {1}'.format(
             deployment_id, management_ip))
-    client = _get_rest_client(management_ip)
+    client = _get_transport(management_ip)
     client.delete_deployment(deployment_id, ignore_live_nodes)
     lgr.info("Deleted deployment successfully")
 
 
+def _is_matching(args, item_id, id_flag):
+    # whether the items to delete are selected by --match rather than by
+    # their id
+    msg = None
+    if bool(item_id) == bool(args.match):
+        msg = 'Either {0} or --match must be given'.format(id_flag)
+    elif not args.match and (args.older_than is not None or args.dry_run):
+        msg = '--older-than and --dry-run may only be given with --match'
+    if msg:
+        flgr.error(msg)
+        raise CosmoCliError(msg) if args.verbosity else sys.exit(msg)
+    return bool(args.match)
+
+
+def _delete_matching(args, is_blueprints):
+    # deletes the deployments (or the blueprints, along with their
+    # deployments) whose ids match the pattern, as selected from a single
+    # listing: the plan is reported first, and then the deployments are
+    # deleted concurrently, followed by the blueprints all of whose
+    # deployments were deleted
+    management_ip = _get_management_server_ip(args)
+    kind = 'blueprints' if is_blueprints else 'deployments'
+    lgr.info("Getting the {0} matching '{1}'... [manager={2}]"
+             .format(kind, args.match, management_ip))
+    client = _get_transport(management_ip, is_cache_used=False)
+    deployments = list(client.iter_deployments(
+        fields=['id', 'blueprintId', 'createdAt']))
+    if is_blueprints:
+        blueprints = batch.select(
+            client.list_blueprints(_include=['id', 'createdAt']),
+            args.match, args.older_than)
+        blueprint_ids = set(blueprint['id'] for blueprint in blueprints)
+        deployments = [deployment for deployment in deployments
+                       if deployment['blueprintId'] in blueprint_ids]
+    else:
+        blueprints = []
+        deployments = batch.select(deployments, args.match, args.older_than)
+    if not blueprints and not deployments:
+        lgr.info("No {0} match '{1}'".format(kind, args.match))
+        return
+
+    lgr.info('Deletion plan: {0} deployments{1}'.format(
+        len(deployments),
+        ' and {0} blueprints'.format(len(blueprints)) if is_blueprints
+        else ''))
+    for deployment in deployments:
+        lgr.info('  deployment {0} [blueprint={1}, created at {2}]'.format(
+            deployment['id'], deployment['blueprintId'],
+            deployment.get('createdAt')))
+    for blueprint in blueprints:
+        lgr.info('  blueprint {0} [created at {1}]'.format(
+            blueprint['id'], blueprint.get('createdAt')))
+    if args.dry_run:
+        lgr.info('Dry run: nothing was deleted')
+        return
+
+    statuses = []
+    # blueprints with deployments which weren't deleted are skipped
+    kept_blueprint_ids = set()
+    with profiling.phase(profiling.REST):
+        for result in parallel.run(
+                lambda deployment: client.delete_deployment(
+                    deployment['id'], args.ignore_live_nodes),
+                deployments, args.concurrency):
+            status = DELETED if result.is_success else FAILED
+            if not result.is_success:
+                kept_blueprint_ids.add(result.item['blueprintId'])
+            statuses.append(status)
+            lgr.info("Deployment '{0}' {1}{2}".format(
+                result.item['id'], status,
+                ' [error={0}]'.format(result.error) if result.error else ''))
+        for blueprint in blueprints:
+            if blueprint['id'] in kept_blueprint_ids:
+                statuses.append(SKIPPED)
+                lgr.info("Blueprint '{0}' {1}, as some of its deployments "
+                         "weren't deleted".format(blueprint['id'], SKIPPED))
+        for result in parallel.run(
+                lambda blueprint: client.delete_blueprint(blueprint['id']),
+                [blueprint for blueprint in blueprints
+                 if blueprint['id'] not in kept_blueprint_ids],
+                args.concurrency):
+            status = DELETED if result.is_success else FAILED
+            statuses.append(status)
+            lgr.info("Blueprint '{0}' {1}{2}".format(
+                result.item['id'], status,
+                ' [error={0}]'.format(result.error) if result.error else ''))
+
+    counts = batch.count([{'status': item_status}
+                          for item_status in statuses])
+    lgr.info('Deleted {0}, failed deleting {1} and skipped {2} of {3} '
+             'deployments and blueprints'.format(counts.get(DELETED, 0),
+                                                 counts.get(FAILED, 0),
+                                                 counts.get(SKIPPED, 0),
+                                                 len(statuses)))
+    if len(statuses) > counts.get(DELETED, 0):
+        msg = ("Failed deleting {0} of the {1} deployments and blueprints "
+               "matching '{2}'".format(len(statuses) - counts.get(DELETED, 0),
+                                       len(statuses), args.match))
+        flgr.error(msg)
+        raise CosmoCliError(msg) if args.verbosity else sys.exit(msg)
+
+
 def _upload_blueprint(args):
     is_verbose_output = args.verbosity
     blueprint_id = args.blueprint_id
@@ -1224,8 +1202,8 @@ def _upload_blueprint(args):
     lgr.info(
         'Uploading blueprint {0} to management server {1}'.format(
             blueprint_path, management_ip))
-    client = _get_rest_client(management_ip)
-    blueprint_state = client.publish_blueprint(blueprint_path, blueprint_id)
+    client = _get_transport(management_ip)
+    blueprint_state = client.upload_blueprint(blueprint_path, blueprint_id)
 
     lgr.info(
         "Uploaded blueprint, blueprint's id is: {0}".format(
@@ -1239,13 +1217,83 @@ def _create_deployment(args):
 
     lgr.info('Creating new deployment from blueprint {0} at '
              'management server {1}'.format(blueprint_id, management_ip))
-    client = _get_rest_client(management_ip)
+    client = _get_transport(management_ip)
     deployment = client.create_deployment(blueprint_id, deployment_id)
     lgr.info(
         "Deployment created, deployment's id is: {0}".format(
             deployment.id))
 
 
+def _create_deployments_batch(args):
+    is_verbose_output = args.verbosity
+    management_ip = _get_management_server_ip(args)
+    try:
+        deployments = batch.load_manifest(
+            args.manifest, ['blueprint_id', 'deployment_id'],
+            'deployment_id')
+    except batch.ManifestError as e:
+        msg = str(e)
+        flgr.error(msg)
+        raise CosmoCliError(msg) if is_verbose_output else sys.exit(msg)
+    journal = batch.Journal(args.progress_file or
+                            '{0}.progress'.format(args.manifest),
+                            'deployment_id')
+    results = journal.load()
+    pending = [deployment for deployment in deployments
+               if results.get(deployment['deployment_id'], {}).get('status')
+               not in (CREATED, ALREADY_EXISTS)]
+    lgr.info('Creating {0} deployments at management server {1} ({2} of '
+             'the manifest\'s deployments were already created)'
+             .format(len(pending), management_ip,
+                     len(deployments) - len(pending)))
+    client = _get_transport(management_ip)
+    bucket = parallel.TokenBucket(args.rate)
+
+    def create_deployment(deployment):
+        bucket.acquire()
+        try:
+            client.create_deployment(deployment['blueprint_id'],
+                                     deployment['deployment_id'])
+        except Exception as e:
+            if getattr(e, 'status_code', None) == 409:
+                # e.g. created by an interrupted run of the manifest
+                return ALREADY_EXISTS
+            raise
+        return CREATED
+
+    with profiling.phase(profiling.REST):
+        for index, result in enumerate(parallel.run(
+                create_deployment, pending, args.concurrency)):
+            deployment = result.item
+            entry = {
+                'blueprint_id': deployment['blueprint_id'],
+                'deployment_id': deployment['deployment_id'],
+                'status': result.value if result.is_success else FAILED,
+                'error': None if result.is_success else str(result.error),
+                'seconds': round(result.seconds, 3)
+            }
+            journal.record(entry)
+            results[deployment['deployment_id']] = entry
+            lgr.info('[{0}/{1}] {2}: {3}'.format(
+                index + 1, len(pending), deployment['deployment_id'],
+                entry['error'] or entry['status']))
+
+    report = [results[item['deployment_id']] for item in deployments]
+    counts = batch.count(report)
+    report_file = args.report_file or \
+        '{0}.report.json'.format(args.manifest)
+    batch.write_report(report_file, report, counts)
+    lgr.info('{0} deployments created, {1} already existed and {2} failed '
+             '(see {3})'.format(counts.get(CREATED, 0),
+                                counts.get(ALREADY_EXISTS, 0),
+                                counts.get(FAILED, 0), report_file))
+    if counts.get(FAILED):
+        msg = ('Failed creating {0} deployments; run the manifest again to '
+               'retry them'.format(counts[FAILED]))
+        flgr.error(msg)
+        raise CosmoCliError(msg) if is_verbose_output else sys.exit(msg)
+
+
 def _create_event_message_prefix(event):
     context = event['context']
     deployment_id = context['deployment_id']
@@ -1270,6 +1318,20 @@ def _create_event_message_prefix(event):
                                          message)
 
 
+def _get_event_record(event):
+    # the event's fields as a flat record of EVENT_COLUMNS
+    context = event['context']
+    return {
+        'timestamp': event['@timestamp'],
+        'type': event['type'],
+        'level': event.get('level'),
+        'deploymentId': context.get('deployment_id'),
+        'nodeId': context.get('node_id'),
+        'operation': context.get('operation'),
+        'message': event['message']['text']
+    }
+
+
 def _get_events_logger(args):
     def verbose_events_logger(events):
         for event in events:
@@ -1285,6 +1347,8 @@ def _get_events_logger(args):
 
 
 def _execute_deployment_operation(args):
+    from cosmo_manager_rest_client.cosmo_manager_rest_client \
+        import CosmoManagerRestCallTimeoutError
     management_ip = _get_management_server_ip(args)
     operation = args.operation
     deployment_id = args.deployment_id
@@ -1298,7 +1362,7 @@ def _execute_deployment_operation(args):
                      timeout))
 
     events_logger = _get_events_logger(args)
-    client = _get_rest_client(management_ip)
+    client = _get_transport(management_ip)
 
     events_message = "* Run 'cfy events --include-logs "\
                      "--execution-id {0}' for retrieving the "\
@@ -1331,12 +1395,108 @@ def _execute_deployment_operation(args):
         raise SuppressedCosmoCliError()
 
 
-# TODO implement blueprint deployments on server side
-# because it is currently filter by the CLI
+def _execute_deployments_batch(args):
+    from cosmo_manager_rest_client.cosmo_manager_rest_client \
+        import CosmoManagerRestCallTimeoutError
+    is_verbose_output = args.verbosity
+    management_ip = _get_management_server_ip(args)
+    operation = args.operation
+    if bool(args.deployment_ids) == bool(args.blueprint_id):
+        msg = 'Either --deployments or --blueprint-id must be given'
+        flgr.error(msg)
+        raise CosmoCliError(msg) if is_verbose_output else sys.exit(msg)
+    client = _get_transport(management_ip)
+    deployment_ids = args.deployment_ids or \
+        [deployment['id'] for deployment in client.iter_deployments(
+            args.blueprint_id, fields=['id'])]
+
+    lgr.info("Executing workflow '{0}' on {1} deployments at management "
+             "server {2} [concurrency={3}, timeout={4} seconds]"
+             .format(operation, len(deployment_ids), management_ip,
+                     args.concurrency, args.timeout))
+
+    # the events of all the executions are logged as they arrive, every
+    # event naming its deployment
+    events_logger = _get_events_logger(args)
+    deadline = time.time() + args.timeout
+
+    def execute(deployment_id):
+        # the status, execution id and error of the deployment's execution
+        if time.time() >= deadline:
+            # not started in time (the batch waits past the deadline only
+            # for the executions which time out to report)
+            return TIMED_OUT, None, None
+        try:
+            execution_id, error = client.execute_deployment(
+                deployment_id,
+                operation,
+                events_logger,
+                include_logs=args.include_logs,
+                timeout=max(int(deadline - time.time()), 1),
+                force=args.force)
+        except CosmoManagerRestCallTimeoutError as e:
+            return TIMED_OUT, e.execution_id, None
+        return SUCCEEDED if error is None else FAILED, execution_id, error
+
+    results = {}
+    with profiling.phase(profiling.REST):
+        for result in parallel.run(
+                execute, deployment_ids, args.concurrency,
+                total_timeout=args.timeout + config.BATCH_EXECUTION_GRACE):
+            if result.is_success:
+                status, execution_id, error = result.value
+            elif result.is_timed_out:
+                status, execution_id, error = TIMED_OUT, None, None
+            else:
+                status, execution_id, error = FAILED, None, result.error
+            results[result.item] = (status, execution_id, error)
+            lgr.info("Workflow '{0}' {1} on deployment '{2}'{3}".format(
+                operation, status, result.item,
+                ' [error={0}]'.format(error) if status == FAILED else ''))
+
+    counts = batch.count([{'status': deployment_status}
+                          for deployment_status, _, _ in results.itervalues()])
+    lgr.info("Workflow '{0}' succeeded on {1} deployments, failed on {2} "
+             "and timed out on {3}".format(operation,
+                                           counts.get(SUCCEEDED, 0),
+                                           counts.get(FAILED, 0),
+                                           counts.get(TIMED_OUT, 0)))
+    for deployment_id in deployment_ids:
+        status, execution_id, _ = results[deployment_id]
+        if status != SUCCEEDED and execution_id:
+            lgr.info("* Run 'cfy events --include-logs --execution-id {0}' "
+                     "for retrieving the events/logs of deployment '{1}'"
+                     .format(execution_id, deployment_id))
+    if len(deployment_ids) > counts.get(SUCCEEDED, 0):
+        msg = ("Workflow '{0}' didn't succeed on {1} of {2} deployments"
+               .format(operation,
+                       len(deployment_ids) - counts.get(SUCCEEDED, 0),
+                       len(deployment_ids)))
+        flgr.error(msg)
+        raise CosmoCliError(msg) if is_verbose_output else sys.exit(msg)
+
+
 def _list_blueprint_deployments(args):
     blueprint_id = args.blueprint_id
+    cols, fields = _get_columns(args, ['id', 'blueprintId', 'createdAt',
+                                       'updatedAt'], ['id'])
+    is_partial = bool(blueprint_id) or args.limit is not None
+
+    if args.managers:
+        def list_deployments(management_ip):
+            deployments = list(
+                _get_transport(management_ip, not args.no_cache)
+                .iter_deployments(blueprint_id, args.page_size, args.limit,
+                                  fields))
+            inventory.update(management_ip, inventory.DEPLOYMENTS,
+                             [deployment['id'] for deployment in deployments],
+                             partial=is_partial)
+            return deployments
+
+        return _list_from_managers(args, 'Deployments:', cols,
+                                   list_deployments)
     management_ip = _get_management_server_ip(args)
-    client = _get_new_rest_client(management_ip)
+    client = _get_transport(management_ip, not args.no_cache)
     if blueprint_id:
         lgr.info('Getting deployments list for blueprint: '
                  '\'{0}\'... [manager={1}]'.format(blueprint_id,
@@ -1344,43 +1504,60 @@ def _list_blueprint_deployments(args):
     else:
         lgr.info('Getting deployments list... '
                  '[manager={0}]'.format(management_ip))
-    deployments = client.deployments.list()
-    if blueprint_id:
-        deployments = filter(lambda deployment:
-                             deployment['blueprintId'] == blueprint_id,
-                             deployments)
+    deployment_ids = []
+
+    def deployments():
+        for deployment in client.iter_deployments(blueprint_id,
+                                                  args.page_size,
+                                                  args.limit, fields):
+            deployment_ids.append(deployment['id'])
+            yield deployment
 
-    pt = formatting.table(['id', 'blueprintId', 'createdAt', 'updatedAt'],
-                          deployments)
-    _output_table('Deployments:', pt)
+    _output_list(args, 'Deployments:', cols, deployments())
+    inventory.update(management_ip, inventory.DEPLOYMENTS, deployment_ids,
+                     partial=is_partial)
 
 
 def _list_workflows(args):
-    management_ip = _get_management_server_ip(args)
     deployment_id = args.deployment_id
-    client = _get_new_rest_client(management_ip)
-
-    lgr.info('Getting workflows list for deployment: '
-             '\'{0}\'... [manager={1}]'.format(deployment_id, management_ip))
+    # workflows are listed along with their deployment, so their fields
+    # are picked once listed
+    cols, _ = _get_columns(args, ['blueprintId', 'deploymentId', 'name',
+                                  'createdAt'])
 
-    workflows = client.deployments.list_workflows(deployment_id)
+    def list_workflows(management_ip):
+        client = _get_transport(management_ip, not args.no_cache)
+        try:
+            workflows = client.list_workflows(deployment_id)
+        except transport.NotFoundError:
+            if not args.managers:
+                raise
+            # listing from many management servers, not all of which have
+            # the deployment
+            return []
+        defaults = {
+            'blueprintId': workflows['blueprintId'] if
+            'blueprintId' in workflows else None,
+            'deploymentId': workflows['deploymentId'] if
+            'deploymentId' in workflows else None
+        }
+        return [dict(defaults, **workflow)
+                for workflow in workflows.workflows]
 
-    blueprint_id = workflows['blueprintId'] if \
-        'blueprintId' in workflows else None
-    deployment_id = workflows['deploymentId'] if \
-        'deploymentId' in workflows else None
+    if args.managers:
+        return _list_from_managers(args, 'Workflows:', cols, list_workflows)
+    management_ip = _get_management_server_ip(args)
 
-    pt = formatting.table(['blueprintId', 'deploymentId', 'name', 'createdAt'],
-                          data=workflows.workflows,
-                          defaults={'blueprintId': blueprint_id,
-                                    'deploymentId': deployment_id})
+    lgr.info('Getting workflows list for deployment: '
+             '\'{0}\'... [manager={1}]'.format(deployment_id, management_ip))
 
-    _output_table('Workflows:', pt)
+    _output_list(args, 'Workflows:', cols,
+                 data=list_workflows(management_ip))
 
 
 def _cancel_execution(args):
     management_ip = _get_management_server_ip(args)
-    client = _get_rest_client(management_ip)
+    client = _get_transport(management_ip)
     execution_id = args.execution_id
     lgr.info(
         'Canceling execution {0} on management server {1}'
@@ -1393,25 +1570,42 @@ def _cancel_execution(args):
 
 def _list_deployment_executions(args):
     is_verbose_output = args.verbosity
-    management_ip = _get_management_server_ip(args)
-    client = _get_new_rest_client(management_ip)
     deployment_id = args.deployment_id
+    cols, fields = _get_columns(args, ['status', 'workflowId',
+                                       'deploymentId', 'blueprintId',
+                                       'error', 'id', 'createdAt'], ['id'])
+
+    def list_executions(management_ip):
+        client = _get_transport(management_ip, not args.no_cache)
+        try:
+            executions = client.list_executions(deployment_id,
+                                                **_include(fields))
+        except transport.NotFoundError:
+            if not args.managers:
+                raise
+            # listing from many management servers, not all of which have
+            # the deployment
+            return []
+        inventory.update(management_ip, inventory.EXECUTIONS,
+                         [execution['id'] for execution in executions],
+                         deployment_id=deployment_id)
+        return executions
+
+    if args.managers:
+        return _list_from_managers(args, 'Executions:', cols,
+                                   list_executions)
+    management_ip = _get_management_server_ip(args)
     try:
         lgr.info('Getting executions list for deployment: '
                  '\'{0}\' [manager={1}]'.format(deployment_id, management_ip))
-        executions = client.executions.list(deployment_id)
-    except CosmoManagerRestCallHTTPError, e:
-        if not e.status_code == 404:
-            raise
+        executions = list_executions(management_ip)
+    except transport.NotFoundError:
         msg = ('Deployment {0} does not exist on management server'
                .format(deployment_id))
         flgr.error(msg)
         raise CosmoCliError(msg) if is_verbose_output else sys.exit(msg)
 
-    pt = formatting.table(['status', 'workflowId', 'deploymentId',
-                           'blueprintId', 'error', 'id', 'createdAt'],
-                          executions)
-    _output_table('Executions:', pt)
+    _output_list(args, 'Executions:', cols, executions)
 
 
 def _get_events(args):
@@ -1421,17 +1615,21 @@ def _get_events(args):
              "[include_logs={2}]".format(management_ip,
                                          args.execution_id,
                                          args.include_logs))
-    client = _get_rest_client(management_ip)
+    client = _get_transport(management_ip)
     try:
-        events = client.get_all_execution_events(
+        events = client.get_execution_events(
             args.execution_id,
             include_logs=args.include_logs)
-        events_logger = _get_events_logger(args)
-        events_logger(events)
+        if args.format == formatting.TABLE:
+            events_logger = _get_events_logger(args)
+            events_logger(events)
+        elif args.format in (formatting.JSON, formatting.JSONL):
+            _output_list(args, 'Events:', EVENT_COLUMNS, events)
+        else:
+            _output_list(args, 'Events:', EVENT_COLUMNS,
+                         itertools.imap(_get_event_record, events))
         lgr.info('\nTotal events: {0}'.format(len(events)))
-    except CosmoManagerRestCallHTTPError, e:
-        if e.status_code != 404:
-            raise
+    except transport.NotFoundError:
         msg = ("Execution '{0}' not found on management server"
                .format(args.execution_id))
         flgr.error(msg)
@@ -1439,6 +1637,8 @@ def _get_events(args):
 
 
 def _run_dev(args):
+    from fabric.api import env
+    from fabric.context_managers import settings
     # TODO: allow passing username and key path as params.
     # env.user = args.user if args.user else _get_mgmt_user()
     # env.key_filename = args.key if args.key else _get_mgmt_key()
@@ -1508,6 +1708,45 @@ def _run_ssh(args, is_verbose_output=False):
         _ssh(ssh_path, args)
 
 
+def _generate_completion_index(args):
+    import completion
+    index_file_path = completion.generate_index(args.output)
+    lgr.info('Generated the shell completion index at {0}'
+             .format(index_file_path))
+
+
+def _start_daemon(args):
+    import daemon
+    is_verbose_output = args.verbosity
+    if daemon.is_running():
+        lgr.info('cfy daemon is already running')
+        return
+    lgr.info('starting cfy daemon...')
+    if not daemon.start(idle_timeout=args.idle_timeout):
+        msg = ('cfy daemon did not start within {0} seconds'
+               .format(config.DAEMON_START_TIMEOUT))
+        flgr.error(msg)
+        raise CosmoCliError(msg) if is_verbose_output else sys.exit(msg)
+    lgr.info('cfy daemon started; listening on {0}'
+             .format(config.DAEMON_SOCKET))
+
+
+def _stop_daemon(args):
+    import daemon
+    try:
+        lgr.info(daemon.send_control(daemon.STOP))
+    except daemon.DaemonConnectionError as ex:
+        lgr.info(str(ex))
+
+
+def _get_daemon_status(args):
+    import daemon
+    try:
+        lgr.info(daemon.send_control(daemon.STATUS))
+    except daemon.DaemonConnectionError as ex:
+        lgr.info(str(ex))
+
+
 def _ssh(path, args):
     command = [path]
     command.append('{0}@{1}'.format(_get_mgmt_user(),
@@ -1532,7 +1771,7 @@ def _set_cli_except_hook():
             if output_level <= logging.DEBUG:
                 print("Stack trace:")
                 traceback.print_tb(the_traceback)
-        elif type == CosmoManagerRestCallError:
+        elif transport.is_rest_error(type):
             lgr.error("Failed making a call to REST service: {0}".format(
                       str(value)))
             if output_level <= logging.DEBUG:
@@ -1548,10 +1787,30 @@ def _set_cli_except_hook():
     sys.excepthook = new_excepthook
 
 
+def _get_wd_settings_file_signature(stat):
+    return stat.st_mtime, stat.st_size, stat.st_ino
+
+
+@profiling.timed(profiling.SETTINGS)
 def _load_cosmo_working_dir_settings(is_verbose_output=False):
+    """
+    loads the working directory settings, parsing their file only if it
+    has changed since this process last loaded or dumped it.
+    the settings are shared by the whole process and must not be modified;
+    use _update_wd_settings to change them.
+
+    :rtype: `CosmoWorkingDirectorySettings`
+    """
+    settings_file_path = os.path.abspath(CLOUDIFY_WD_SETTINGS_FILE_NAME)
     try:
-        with open('{0}'.format(CLOUDIFY_WD_SETTINGS_FILE_NAME), 'r') as f:
-            return yaml.load(f.read())
+        with open(settings_file_path, 'r') as f:
+            signature = _get_wd_settings_file_signature(
+                os.fstat(f.fileno()))
+            session_signature, cosmo_wd_settings = \
+                _wd_settings_session.get(settings_file_path, (None, None))
+            if signature == session_signature:
+                return cosmo_wd_settings
+            content = f.read()
     except IOError:
         msg = ('You must first initialize by running the '
                'command "cfy init", or choose to work with '
@@ -1560,26 +1819,118 @@ def _load_cosmo_working_dir_settings(is_verbose_output=False):
         flgr.error(msg)
         raise CosmoCliError(msg) if is_verbose_output else sys.exit(msg)
 
-
+    if content.lstrip().startswith('{'):
+        try:
+            cosmo_wd_settings = \
+                CosmoWorkingDirectorySettings.from_dict(json.loads(content))
+        except ValueError as ex:
+            msg = ('Failed reading the working directory settings from '
+                   '{0}: {1}'.format(settings_file_path, str(ex)))
+            flgr.error(msg)
+            raise CosmoCliError(msg) if is_verbose_output else sys.exit(msg)
+    else:
+        cosmo_wd_settings = _load_legacy_wd_settings(content)
+        try:
+            # migrating the file, so that it's only parsed as yaml once
+            _dump_cosmo_working_dir_settings(cosmo_wd_settings)
+            lgr.debug('migrated {0} to version {1} of its format'
+                      .format(settings_file_path, WD_SETTINGS_VERSION))
+            return cosmo_wd_settings
+        except IOError as ex:
+            lgr.debug('could not migrate {0}: {1}'
+                      .format(settings_file_path, str(ex)))
+    _wd_settings_session[settings_file_path] = (signature, cosmo_wd_settings)
+    return cosmo_wd_settings
+
+
+def _load_legacy_wd_settings(content):
+    # settings files were once yaml documents, mapping the attributes of a
+    # CosmoWorkingDirectorySettings yaml object
+    import yaml
+
+    class LegacyWorkingDirectorySettingsLoader(yaml.Loader):
+        pass
+
+    def construct_wd_settings(loader, node):
+        cosmo_wd_settings = CosmoWorkingDirectorySettings()
+        cosmo_wd_settings.__dict__.update(
+            loader.construct_mapping(node, deep=True))
+        return cosmo_wd_settings
+
+    LegacyWorkingDirectorySettingsLoader.add_constructor(
+        LEGACY_WD_SETTINGS_YAML_TAG, construct_wd_settings)
+    return yaml.load(content, Loader=LegacyWorkingDirectorySettingsLoader)
+
+
+@profiling.timed(profiling.SETTINGS)
 def _dump_cosmo_working_dir_settings(cosmo_wd_settings, target_dir=None):
     target_file_path = '{0}'.format(CLOUDIFY_WD_SETTINGS_FILE_NAME) if \
         not target_dir else os.path.join(target_dir,
                                          CLOUDIFY_WD_SETTINGS_FILE_NAME)
-    with open(target_file_path, 'w') as f:
-        f.write(yaml.dump(cosmo_wd_settings))
+    target_file_path = os.path.abspath(target_file_path)
+    # the lock is only held by writers; readers never need it, since the
+    # settings file is replaced atomically
+    with storage.lock(target_file_path):
+        _write_wd_settings(cosmo_wd_settings, target_file_path)
+
+
+def _write_wd_settings(cosmo_wd_settings, settings_file_path):
+    # (called with the settings file's lock held)
+    storage.write_json(settings_file_path, cosmo_wd_settings.to_dict(),
+                       mode=0644)
+    # the process' settings are now the ones in the file
+    _wd_settings_session[settings_file_path] = \
+        (_get_wd_settings_file_signature(os.stat(settings_file_path)),
+         deepcopy(cosmo_wd_settings))
+
+
+def _merge_wd_settings(base_wd_settings, updated_wd_settings,
+                       current_wd_settings):
+    """
+    merges an update of the working directory settings into their current
+    state, which may have been updated by others since the update's base
+    state was loaded.
+
+    :param base_wd_settings: the settings the update started from.
+    :param updated_wd_settings: the updated settings.
+    :param current_wd_settings: the settings currently in the file.
+    :rtype: `CosmoWorkingDirectorySettings` the current settings, with the
+     fields the update changed (and, for the alias maps, the aliases it
+     added, changed or removed) replaced by the update's.
+    """
+    base_dict = base_wd_settings.to_dict()
+    merged_dict = current_wd_settings.to_dict()
+    for field, value in updated_wd_settings.to_dict().iteritems():
+        base_value = base_dict.get(field)
+        if value == base_value:
+            continue
+        current_value = merged_dict.get(field)
+        if not all(isinstance(v, dict)
+                   for v in (value, base_value, current_value)):
+            merged_dict[field] = value
+            continue
+        merged_value = dict(current_value)
+        for key in set(base_value) | set(value):
+            if key not in value:
+                merged_value.pop(key, None)
+            elif key not in base_value or value[key] != base_value[key]:
+                merged_value[key] = value[key]
+        merged_dict[field] = merged_value
+    return CosmoWorkingDirectorySettings.from_dict(merged_dict)
 
 
 def _download_blueprint(args):
     lgr.info(messages.DOWNLOADING_BLUEPRINT.format(args.blueprint_id))
-    rest_client = _get_rest_client(_get_management_server_ip(args))
-    target_file = rest_client.download_blueprint(args.blueprint_id,
-                                                 args.output)
+    client = _get_transport(_get_management_server_ip(args))
+    target_file = client.download_blueprint(args.blueprint_id,
+                                            args.output)
     lgr.info(messages.DOWNLOADING_BLUEPRINT_SUCCEEDED.format(
         args.blueprint_id,
         target_file))
 
 
 def _validate_blueprint(args):
+    from dsl_parser.parser import parse_from_path, DSLParsingException
     is_verbose_output = args.verbosity
     target_file = args.blueprint_file
 
@@ -1614,18 +1965,64 @@ def _get_resource_base():
 
 
 def _get_rest_client(management_ip):
-    return CosmoManagerRestClient(management_ip)
+    with profiling.phase(profiling.IMPORTS):
+        return clients.get_legacy_client(management_ip)
 
 
 def _get_new_rest_client(management_ip):
-    return CloudifyClient(management_ip)
+    with profiling.phase(profiling.IMPORTS):
+        return clients.get_client(management_ip)
+
+
+def _get_transport(management_ip, is_cache_used=False):
+    # the clients are looked up on every call, so that they can be replaced
+    # (e.g. by tests). Only the list commands use the cached responses;
+    # other calls (e.g. teardown's check for deployments, or the selection
+    # of a batch's deployments) act on the server's current state.
+    return transport.Transport(
+        management_ip,
+        lambda: _get_rest_client(management_ip),
+        lambda: _get_new_rest_client(management_ip),
+        is_cache_used)
 
 
 @contextmanager
 def _update_wd_settings(is_verbose_output=False):
+    """
+    yields a copy of the working directory settings to be modified, and
+    writes back the changes made to it. the settings file is read again
+    under lock before it's written, and only the changed fields are merged
+    into it (see _merge_wd_settings), so that concurrent updates of other
+    fields by other processes aren't lost.
+    """
     cosmo_wd_settings = _load_cosmo_working_dir_settings(is_verbose_output)
-    yield cosmo_wd_settings
-    _dump_cosmo_working_dir_settings(cosmo_wd_settings)
+    updated_wd_settings = deepcopy(cosmo_wd_settings)
+    yield updated_wd_settings
+    if updated_wd_settings == cosmo_wd_settings:
+        return
+    settings_file_path = os.path.abspath(CLOUDIFY_WD_SETTINGS_FILE_NAME)
+    with storage.lock(settings_file_path):
+        current_wd_settings = \
+            _load_cosmo_working_dir_settings(is_verbose_output)
+        _write_wd_settings(_merge_wd_settings(cosmo_wd_settings,
+                                              updated_wd_settings,
+                                              current_wd_settings),
+                           settings_file_path)
+
+
+@contextmanager
+def _update_managers(is_verbose_output=False):
+    """
+    yields the registry of management servers to be modified (see
+    managers.update), failing the command if the registry can't be read.
+    """
+    try:
+        with managers.update() as registry:
+            yield registry
+    except managers.ManagerRegistryError as ex:
+        msg = str(ex)
+        flgr.error(msg)
+        raise CosmoCliError(msg) if is_verbose_output else sys.exit(msg)
 
 
 @contextmanager
@@ -1641,9 +2038,12 @@ def _protected_provider_call(is_verbose_output=False):
             else sys.exit(msg)
 
 
-class CosmoWorkingDirectorySettings(yaml.YAMLObject):
-    yaml_tag = u'!WD_Settings'
-    yaml_loader = yaml.Loader
+class CosmoWorkingDirectorySettings(object):
+    """
+    the settings of a working directory, stored in its .cloudify file as a
+    json object (see to_dict). the provider context is stored as a json
+    string of its own, which is decoded only once the context is needed.
+    """
 
     def __init__(self):
         self._management_ip = None
@@ -1651,9 +2051,65 @@ class CosmoWorkingDirectorySettings(yaml.YAMLObject):
         self._management_user = None
         self._provider = None
         self._provider_context = None
+        # the encoded provider context, until it's decoded
+        self._provider_context_json = None
         self._mgmt_aliases = {}
         self._mgmt_to_contextual_aliases = {}
 
+    def __eq__(self, other):
+        return isinstance(other, CosmoWorkingDirectorySettings) and \
+            self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def to_dict(self):
+        """
+        :rtype: `dict` the settings' json representation, of version
+         WD_SETTINGS_VERSION.
+        """
+        return {
+            'version': WD_SETTINGS_VERSION,
+            'management_ip': self._management_ip,
+            'management_key': self._management_key,
+            'management_user': self._management_user,
+            'provider': self._provider,
+            'provider_context': self._get_provider_context_json(),
+            'mgmt_aliases': self._mgmt_aliases,
+            'mgmt_to_contextual_aliases': self._mgmt_to_contextual_aliases
+        }
+
+    @classmethod
+    def from_dict(cls, settings_dict):
+        """
+        :param dict settings_dict: the settings' json representation.
+        :rtype: `CosmoWorkingDirectorySettings`
+        :raises ValueError: if the representation is of a newer version.
+        """
+        version = settings_dict.get('version')
+        if version > WD_SETTINGS_VERSION:
+            raise ValueError('version {0} of the settings format is not '
+                             'supported by this version of cfy'
+                             .format(version))
+        settings = cls()
+        settings._management_ip = settings_dict.get('management_ip')
+        settings._management_key = settings_dict.get('management_key')
+        settings._management_user = settings_dict.get('management_user')
+        settings._provider = settings_dict.get('provider')
+        settings._provider_context_json = \
+            settings_dict.get('provider_context')
+        settings._mgmt_aliases = settings_dict.get('mgmt_aliases', {})
+        settings._mgmt_to_contextual_aliases = \
+            settings_dict.get('mgmt_to_contextual_aliases', {})
+        return settings
+
+    def _get_provider_context_json(self):
+        if self._provider_context_json is not None:
+            return self._provider_context_json
+        if self._provider_context is None:
+            return None
+        return json.dumps(self._provider_context, sort_keys=True)
+
     def get_management_server(self):
         return self._management_ip
 
@@ -1673,10 +2129,14 @@ class CosmoWorkingDirectorySettings(yaml.YAMLObject):
         self._management_user = _management_user
 
     def get_provider_context(self):
+        if self._provider_context_json is not None:
+            self._provider_context = json.loads(self._provider_context_json)
+            self._provider_context_json = None
         return self._provider_context
 
     def set_provider_context(self, provider_context):
         self._provider_context = provider_context
+        self._provider_context_json = None
 
     def remove_management_server_context(self, management_ip):
         # Clears management server context data.
@@ -1690,9 +2150,10 @@ class CosmoWorkingDirectorySettings(yaml.YAMLObject):
         self._provider = provider
 
     def translate_management_alias(self, management_address_or_alias):
+        # aliases of the working directory come before the registry's
         return self._mgmt_aliases[management_address_or_alias] if \
             management_address_or_alias in self._mgmt_aliases \
-            else management_address_or_alias
+            else managers.translate(management_address_or_alias)
 
     def save_management_alias(self, management_alias, management_address,
                               is_allow_overwrite, is_verbose_output=False):
@@ -0,0 +1,437 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# A background process running cli commands on behalf of the cfy
+# executable, which saves the commands the startup of the interpreter and
+# the import of the cli's modules.
+#
+# The cfy executable forwards its argv, working directory and environment
+# over a unix socket (config.DAEMON_SOCKET) and the daemon streams back
+# the command's stdout and stderr, followed by its exit code. Every command
+# is run in a child process forked for it, so that commands run side by
+# side and don't share their state (working directory, environment, file
+# descriptors). A command whose client goes away (e.g. on Ctrl-C) is
+# interrupted, as it would be if it were run by the client itself.
+#
+# Frames, in both directions, are a channel byte and a payload length
+# (struct format FRAME_HEADER) followed by the payload.
+
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+
+import config
+
+__author__ = 'ran'
+
+FRAME_HEADER = '!cI'
+REQUEST = 'r'
+CONTROL = 'c'
+STDOUT = 'o'
+STDERR = 'e'
+EXIT = 'x'
+
+STOP = 'stop'
+STATUS = 'status'
+
+# commands which are always run by the cfy executable itself: interactive
+# ones, ones loading provider code from the working directory, and the
+# daemon's own commands
+LOCAL_COMMANDS = ('bootstrap', 'completion', 'daemon', 'dev', 'init', 'ssh',
+                  'teardown')
+
+# set to run the cfy executable without the daemon
+NO_DAEMON_ENV_VAR = 'CFY_NO_DAEMON'
+
+
+class DaemonConnectionError(Exception):
+    pass
+
+
+def _send_frame(connection, channel, payload=''):
+    connection.sendall(struct.pack(FRAME_HEADER, channel, len(payload)) +
+                       payload)
+
+
+def _receive_exactly(connection, size):
+    chunks = []
+    while size:
+        chunk = connection.recv(size)
+        if not chunk:
+            raise DaemonConnectionError('connection closed by the peer')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+
+def _receive_frame(connection):
+    channel, size = struct.unpack(
+        FRAME_HEADER,
+        _receive_exactly(connection, struct.calcsize(FRAME_HEADER)))
+    return channel, _receive_exactly(connection, size)
+
+
+def _to_str(value):
+    # json decodes strings to unicode, while the cli expects the byte
+    # strings it gets on a normal run
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [_to_str(item) for item in value]
+    if isinstance(value, dict):
+        return dict((_to_str(key), _to_str(item))
+                    for key, item in value.iteritems())
+    return value
+
+
+def _connect(socket_path=None):
+    socket_path = socket_path or config.DAEMON_SOCKET
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except socket.error:
+        connection.close()
+        raise DaemonConnectionError('cfy daemon is not running')
+    return connection
+
+
+def _relay_output(connection):
+    # writes the command's output as it arrives, and returns its exit code
+    while True:
+        channel, payload = _receive_frame(connection)
+        if channel == STDOUT:
+            sys.stdout.write(payload)
+            sys.stdout.flush()
+        elif channel == STDERR:
+            sys.stderr.write(payload)
+            sys.stderr.flush()
+        elif channel == EXIT:
+            return int(payload)
+
+
+def run_command(argv, socket_path=None):
+    """
+    Runs a cli command in the daemon, if one is running, writing its output
+    to this process' stdout and stderr.
+
+    :param list argv: the command line, including the program name.
+    :param string socket_path: the daemon's socket; defaults to
+     config.DAEMON_SOCKET.
+    :rtype: `int` the command's exit code, or None if the command should be
+     run locally (the daemon isn't running or doesn't run this command).
+    """
+    socket_path = socket_path or config.DAEMON_SOCKET
+    if NO_DAEMON_ENV_VAR in os.environ or \
+            (len(argv) > 1 and argv[1] in LOCAL_COMMANDS) or \
+            not os.path.exists(socket_path):
+        return None
+    try:
+        request = json.dumps({
+            'argv': argv,
+            'cwd': os.getcwd(),
+            'env': dict(os.environ)
+        })
+    except (UnicodeDecodeError, OSError):
+        # not representable in a request; leaving it to a local run
+        return None
+    try:
+        connection = _connect(socket_path)
+    except DaemonConnectionError:
+        return None
+    try:
+        _send_frame(connection, REQUEST, request)
+        return _relay_output(connection)
+    except (DaemonConnectionError, socket.error) as ex:
+        # the command may have been partially run, so it mustn't be run
+        # again locally
+        sys.stderr.write('lost connection to the cfy daemon: {0}\n'
+                         .format(str(ex)))
+        return 1
+    finally:
+        connection.close()
+
+
+def send_control(command, socket_path=None):
+    """
+    Sends a control command (STOP or STATUS) to the daemon.
+
+    :rtype: `string` the daemon's reply.
+    :raises DaemonConnectionError: if the daemon isn't running.
+    """
+    connection = _connect(socket_path)
+    try:
+        _send_frame(connection, CONTROL, command)
+        channel, payload = _receive_frame(connection)
+        return payload
+    except socket.error as ex:
+        raise DaemonConnectionError(str(ex))
+    finally:
+        connection.close()
+
+
+def is_running(socket_path=None):
+    try:
+        send_control(STATUS, socket_path)
+        return True
+    except DaemonConnectionError:
+        return False
+
+
+def start(socket_path=None, idle_timeout=None):
+    """
+    Starts the daemon in a detached background process, and waits for it to
+    accept connections.
+
+    :rtype: `bool` whether the daemon has started within
+     config.DAEMON_START_TIMEOUT.
+    """
+    import subprocess
+    socket_path = socket_path or config.DAEMON_SOCKET
+    idle_timeout = config.DAEMON_IDLE_TIMEOUT if idle_timeout is None \
+        else idle_timeout
+    socket_dir = os.path.dirname(socket_path)
+    if not os.path.isdir(socket_dir):
+        os.makedirs(socket_dir)
+    with open(os.devnull, 'r+') as devnull:
+        subprocess.Popen(
+            [sys.executable, '-c',
+             'from cosmo_cli import daemon; '
+             'daemon.serve({0!r}, {1!r})'.format(socket_path, idle_timeout)],
+            stdin=devnull, stdout=devnull, stderr=devnull, cwd=socket_dir,
+            close_fds=True, preexec_fn=os.setsid)
+    deadline = time.time() + config.DAEMON_START_TIMEOUT
+    while time.time() < deadline:
+        if is_running(socket_path):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def _pump_output(read_fd, channel, connection, send_lock):
+    # reads until all the pipe's write ends have been closed; keeps on
+    # reading after the client has gone away, so that writers never block
+    is_connected = True
+    try:
+        while True:
+            data = os.read(read_fd, 65536)
+            if not data:
+                return
+            if not is_connected:
+                continue
+            try:
+                with send_lock:
+                    _send_frame(connection, channel, data)
+            except socket.error:
+                is_connected = False
+    finally:
+        os.close(read_fd)
+
+
+def _reset_cli_state(cli):
+    import logging
+    # undoing what a previous command may have changed in the cli module
+    cli.output_level = logging.INFO
+    cli.verbose_output = False
+    cli.lgr.setLevel(logging.INFO)
+
+
+def _run_cli(cli, argv):
+    _reset_cli_state(cli)
+    cli.profiling.mark(cli.profiling.STARTED)
+    sys.argv = argv
+    try:
+        cli.main()
+        return 0
+    except SystemExit as ex:
+        # exiting just like the interpreter would
+        if ex.code is None:
+            return 0
+        if isinstance(ex.code, int):
+            return ex.code
+        sys.stderr.write('{0}\n'.format(ex.code))
+        return 1
+    except Exception:
+        # reporting the exception just like the interpreter would, leaving
+        # out the daemon's own frame
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        sys.excepthook(exc_type, exc_value, exc_traceback.tb_next)
+        return 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def _run_request(cli, connection, request, done):
+    try:
+        os.chdir(request['cwd'])
+    except OSError as ex:
+        done.set()
+        _send_frame(connection, STDERR, '{0}\n'.format(str(ex)))
+        _send_frame(connection, EXIT, '1')
+        return
+    os.environ.clear()
+    os.environ.update(request['env'])
+
+    # redirecting the file descriptors rather than sys.stdout and
+    # sys.stderr, to capture the output of the loggers' handlers and of
+    # subprocesses as well
+    send_lock = threading.Lock()
+    saved_fds = {}
+    pumps = []
+    try:
+        for fd, channel in ((1, STDOUT), (2, STDERR)):
+            read_fd, write_fd = os.pipe()
+            saved_fds[fd] = os.dup(fd)
+            os.dup2(write_fd, fd)
+            os.close(write_fd)
+            pump = threading.Thread(
+                target=_pump_output,
+                args=(read_fd, channel, connection, send_lock))
+            pump.daemon = True
+            pump.start()
+            pumps.append(pump)
+        exit_code = _run_cli(cli, request['argv'])
+    finally:
+        for fd, saved_fd in saved_fds.iteritems():
+            os.dup2(saved_fd, fd)
+            os.close(saved_fd)
+    for pump in pumps:
+        # a subprocess left running in the background may keep the pipe
+        # open indefinitely
+        pump.join(config.DAEMON_OUTPUT_DRAIN_TIMEOUT)
+    # the client closes the connection once it has the exit code
+    done.set()
+    with send_lock:
+        _send_frame(connection, EXIT, str(exit_code))
+
+
+def _interrupt_on_disconnection(connection, done):
+    # the client sends nothing after its request, so the connection is
+    # only readable once the client has gone away
+    try:
+        connection.recv(1)
+    except socket.error:
+        pass
+    if not done.is_set():
+        os.kill(os.getpid(), signal.SIGINT)
+
+
+def _run_request_in_child(cli, server, connection, request):
+    # runs in the child process forked for the request, never returning
+    exit_code = 1
+    try:
+        server.close()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        done = threading.Event()
+        watcher = threading.Thread(target=_interrupt_on_disconnection,
+                                   args=(connection, done))
+        watcher.daemon = True
+        watcher.start()
+        _run_request(cli, connection, request, done)
+        exit_code = 0
+    except KeyboardInterrupt:
+        # the client has gone away
+        exit_code = 130
+    finally:
+        try:
+            import logging
+            logging.shutdown()
+        finally:
+            os._exit(exit_code)
+
+
+def _preload_rest_clients():
+    try:
+        import cloudify_rest_client  # NOQA
+        import cosmo_manager_rest_client.cosmo_manager_rest_client  # NOQA
+    except ImportError:
+        pass
+
+
+def serve(socket_path=None, idle_timeout=None):
+    """
+    Runs the daemon: accepts connections on the socket, and runs every
+    requested command in a child process, until stopped or idle for
+    idle_timeout seconds (0 means never). Commands still running when the
+    daemon exits are left to complete.
+    """
+    from contextlib import closing
+    socket_path = socket_path or config.DAEMON_SOCKET
+    idle_timeout = config.DAEMON_IDLE_TIMEOUT if idle_timeout is None \
+        else idle_timeout
+    # imports mustn't be resolved relative to the commands' working
+    # directories
+    while '' in sys.path:
+        sys.path.remove('')
+
+    import cosmo_cli as cli
+    cli.init_logger()
+    _preload_rest_clients()
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(077)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    server.listen(64)
+    server.settimeout(idle_timeout or None)
+    # the children forked for the commands are reaped by the system
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    started_at = time.time()
+    commands_run = 0
+    try:
+        while True:
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                return
+            connection.settimeout(None)
+            with closing(connection):
+                try:
+                    channel, payload = _receive_frame(connection)
+                    if channel == REQUEST:
+                        request = _to_str(json.loads(payload))
+                        commands_run += 1
+                        if os.fork() == 0:
+                            _run_request_in_child(cli, server, connection,
+                                                  request)
+                    elif channel == CONTROL and payload == STATUS:
+                        _send_frame(
+                            connection, STDOUT,
+                            'cfy daemon is running (pid {0}, up {1}s, '
+                            '{2} commands run)'.format(
+                                os.getpid(), int(time.time() - started_at),
+                                commands_run))
+                    elif channel == CONTROL and payload == STOP:
+                        _send_frame(connection, STDOUT, 'cfy daemon stopped')
+                        return
+                except (DaemonConnectionError, socket.error, ValueError):
+                    # a client which went away, or a malformed request
+                    pass
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
@@ -16,9 +16,21 @@
 
 __author__ = 'elip'
 
+import itertools
+import os
 from json import dumps
 
-from prettytable import PrettyTable
+import config
+
+TABLE = 'table'
+JSON = 'json'
+JSONL = 'jsonl'
+CSV = 'csv'
+TSV = 'tsv'
+FORMATS = (TABLE, JSON, JSONL, CSV, TSV)
+
+# ends the values truncated to fit their table column
+ELLIPSIS = u'\u2026'
 
 
 def json(data):
@@ -34,10 +46,11 @@ def json(data):
     return dumps(data)
 
 
-def table(cols, data, defaults=None):
+def table(cols, data, defaults=None, widths=None):
 
     """
-    Return a new PrettyTable instance representing the list.
+    Return a new Table representing the list, whose lines are laid out
+    as they're iterated over.
 
     Arguments:
 
@@ -47,7 +60,8 @@ def table(cols, data, defaults=None):
                for example: ['id','name']
 
         data - An iterable of dictionaries, each dictionary must
-               have key's corresponding to the cols items.
+               have key's corresponding to the cols items. It's only
+               iterated over as the table's lines are.
 
                for example: [{'id':'123', 'name':'Pete']
 
@@ -57,11 +71,173 @@ def table(cols, data, defaults=None):
                    for example: {'deploymentId':'123'} will set the
                    deploymentId value for all rows to '123'.
 
+        widths - A dictionary specifying the width of columns. The
+                 width of other columns is that of their widest
+                 value among the first config.TABLE_SAMPLE_ROWS rows.
+                 Wider values are truncated, ending with an ellipsis.
+
+                 for example: {'id': 36}
+
     """
+    return Table(cols, data, defaults, widths)
 
-    pt = PrettyTable([col for col in cols])
 
-    for d in data:
-        pt.add_row(map(lambda c: d[c] if c in d else defaults[c], cols))
+class Table(object):
+
+    """
+    A table laid out like a PrettyTable, which never holds more than
+    config.TABLE_SAMPLE_ROWS rows: the column widths are set by the first
+    rows, and a value wider than its column is truncated, so that the
+    cells stay aligned with the header.
+    """
+
+    def __init__(self, cols, data, defaults=None, widths=None):
+        self.cols = list(cols)
+        self._data = data
+        self._defaults = defaults or {}
+        self._widths = widths or {}
+
+    def _get_cells(self, row):
+        cells = []
+        for col in self.cols:
+            value = row[col] if col in row else self._defaults.get(col, '')
+            if isinstance(value, str):
+                value = value.decode('utf-8')
+            elif not isinstance(value, unicode):
+                value = unicode(value)
+            cells.append(value)
+        return cells
+
+    @staticmethod
+    def _fit(cell, width):
+        if len(cell) <= width:
+            return cell.center(width)
+        return cell[:width - 1] + ELLIPSIS
+
+    def _format_row(self, cells, widths):
+        return u'| {0} |'.format(u' | '.join(
+            self._fit(cell, width) for cell, width in zip(cells, widths)))
+
+    def __iter__(self):
+        """
+        Yields the lines of the table.
+        """
+        rows = iter(self._data)
+        sample = [self._get_cells(row) for row in
+                  itertools.islice(rows, config.TABLE_SAMPLE_ROWS)]
+        widths = []
+        for index, col in enumerate(self.cols):
+            widths.append(self._widths.get(col) or max(
+                [len(col)] + [len(cells[index]) for cells in sample]))
+        border = u'+{0}+'.format(u'+'.join(u'-' * (width + 2)
+                                           for width in widths))
+        yield border
+        yield self._format_row(self.cols, widths)
+        yield border
+        for cells in sample:
+            yield self._format_row(cells, widths)
+        del sample
+        for row in rows:
+            yield self._format_row(self._get_cells(row), widths)
+        yield border
+
+
+def records(output_format, cols, data, defaults=None, is_projected=False):
 
-    return pt
+    """
+    Return an iterator over the lines representing the list in a
+    machine-readable format, which are formatted a record at a time.
+
+    Arguments:
+
+        output_format - One of JSON (a json list), JSONL (a json object
+                        per line), CSV or TSV (with a header line).
+
+        cols - An iterable of strings that specify the columns of
+               CSV and TSV lines. JSON and JSONL records hold all of
+               the dictionaries' keys, unless is_projected.
+
+        data - An iterable of dictionaries.
+
+        defaults - A dictionary specifying default values for
+                   key's that don't exist in the data itself.
+
+        is_projected - Whether JSON and JSONL records hold only the
+                       cols (those the dictionaries have).
+
+    """
+    defaults = defaults or {}
+    cols = list(cols)
+    if output_format in (CSV, TSV):
+        return _delimited_lines(',' if output_format == CSV else '\t',
+                                cols, data, defaults)
+    records = (dict(defaults, **record) for record in data)
+    if is_projected:
+        records = (dict((col, record[col]) for col in cols if col in record)
+                   for record in records)
+    lines = (dumps(record, sort_keys=True) for record in records)
+    return _json_list_lines(lines) if output_format == JSON else lines
+
+
+def _json_list_lines(record_lines):
+    yield '['
+    previous = None
+    for line in record_lines:
+        if previous is not None:
+            yield previous + ','
+        previous = line
+    if previous is not None:
+        yield previous
+    yield ']'
+
+
+def _delimited_lines(delimiter, cols, data, defaults):
+    import csv
+    import StringIO
+    buf = StringIO.StringIO()
+    writer = csv.writer(buf, delimiter=delimiter, lineterminator='')
+
+    def format_line(cells):
+        writer.writerow([_to_utf8(cell) for cell in cells])
+        line = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return line
+
+    yield format_line(cols)
+    for record in data:
+        yield format_line(record[col] if col in record else defaults.get(col)
+                          for col in cols)
+
+
+def _to_utf8(value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def write_lines(stream, lines):
+
+    """
+    Write lines to a stream (utf-8 encoded), a chunk of
+    config.OUTPUT_CHUNK_LINES lines at a time, and flush it.
+
+    Arguments:
+
+        stream - A file-like object, e.g. sys.stdout.
+
+        lines - An iterable of strings, without line separators.
+
+    """
+    chunk = []
+    for line in lines:
+        chunk.append(line.encode('utf-8') if isinstance(line, unicode)
+                     else line)
+        if len(chunk) >= config.OUTPUT_CHUNK_LINES:
+            stream.write(os.linesep.join(chunk) + os.linesep)
+            chunk = []
+    if chunk:
+        stream.write(os.linesep.join(chunk) + os.linesep)
+    stream.flush()
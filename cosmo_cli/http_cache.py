@@ -0,0 +1,168 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# An on-disk cache of the responses to GET requests sent to the
+# management servers (see clients), under config.CACHE_DIR.
+#
+# Every management server has a directory of its own, holding a file per
+# request (by url and query parameters). Responses with an ETag or a
+# Last-Modified header are revalidated with a conditional request every
+# time they're used; other responses are used as they are for
+# config.CACHE_TTL seconds. Calls which may change a server's state drop
+# all its cached responses (see transport). Once the cache grows beyond
+# config.CACHE_SIZE_LIMIT bytes, the least recently used responses are
+# evicted.
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import urlparse
+from contextlib import contextmanager
+
+import config
+import storage
+
+__author__ = 'ran'
+
+# whether cached responses are currently bypassed (see bypass()), by
+# thread
+_state = threading.local()
+
+
+@contextmanager
+def bypass(is_bypassed=True):
+    """
+    Within the context, responses are always fetched from the servers
+    (and cached for later use).
+    """
+    was_bypassed = getattr(_state, 'is_bypassed', False)
+    _state.is_bypassed = is_bypassed or was_bypassed
+    try:
+        yield
+    finally:
+        _state.is_bypassed = was_bypassed
+
+
+def _get_server_dir_name(host, port=None):
+    # a directory name which is valid on windows as well
+    return '{0}_{1}'.format(host, port or 80)
+
+
+def _get_entry_path(url, params):
+    parsed_url = urlparse.urlparse(url)
+    request_key = json.dumps([url, sorted((params or {}).items())])
+    return os.path.join(
+        config.CACHE_DIR,
+        _get_server_dir_name(parsed_url.hostname, parsed_url.port),
+        hashlib.sha1(request_key).hexdigest() + '.json')
+
+
+def get(url, params=None):
+    """
+    :rtype: `dict` the cached response to the request (with its 'body',
+     'etag', 'last_modified' and 'stored_at'), or None if there's none or
+     cached responses are bypassed.
+    """
+    if getattr(_state, 'is_bypassed', False):
+        return None
+    path = _get_entry_path(url, params)
+    entry = storage.read_json(path)
+    if entry is None:
+        return None
+    try:
+        # marking the entry as recently used
+        os.utime(path, None)
+    except OSError:
+        pass
+    return entry
+
+
+def is_fresh(entry):
+    """
+    :rtype: `bool` whether the cached response may be used without
+     revalidating it.
+    """
+    if entry['etag'] or entry['last_modified']:
+        return False
+    return time.time() - entry['stored_at'] < config.CACHE_TTL
+
+
+def get_validators(entry):
+    """
+    :rtype: `dict` of the headers for revalidating the cached response.
+    """
+    headers = {}
+    if entry['etag']:
+        headers['If-None-Match'] = entry['etag']
+    if entry['last_modified']:
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def put(url, params, response_headers, body):
+    """
+    Caches the response to a request. Failing to do so never fails the
+    request.
+    """
+    entry = {
+        'url': url,
+        'etag': response_headers.get('ETag'),
+        'last_modified': response_headers.get('Last-Modified'),
+        'stored_at': time.time(),
+        'body': body
+    }
+    if not (entry['etag'] or entry['last_modified'] or config.CACHE_TTL):
+        return
+    try:
+        storage.write_json(_get_entry_path(url, params), entry)
+        _evict()
+    except (IOError, OSError):
+        pass
+
+
+def _evict():
+    entries = []
+    total_size = 0
+    for dir_name in os.listdir(config.CACHE_DIR):
+        server_dir = os.path.join(config.CACHE_DIR, dir_name)
+        for file_name in os.listdir(server_dir):
+            path = os.path.join(server_dir, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+    entries.sort()
+    while entries and total_size > config.CACHE_SIZE_LIMIT:
+        _, size, path = entries.pop(0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total_size -= size
+
+
+def invalidate(management_ip, port=None):
+    """
+    Drops all the cached responses of a management server.
+    """
+    shutil.rmtree(os.path.join(config.CACHE_DIR,
+                               _get_server_dir_name(management_ip, port)),
+                  ignore_errors=True)
@@ -0,0 +1,217 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# A local cache of the blueprint, deployment and execution ids known to
+# exist on each management server.
+#
+# The cache is populated as a side effect of the list commands, and is
+# used for completing ids in the shell without making REST calls. Once
+# the cached ids are older than config.INVENTORY_TTL, completion triggers
+# a refresh in a background process and keeps answering from the cache.
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import config
+import managers
+import storage
+
+__author__ = 'ran'
+
+BLUEPRINTS = 'blueprints'
+DEPLOYMENTS = 'deployments'
+EXECUTIONS = 'executions'
+
+# argument destinations whose values may be completed from the inventory
+KIND_BY_DEST = {
+    'blueprint_id': BLUEPRINTS,
+    'deployment_id': DEPLOYMENTS,
+    'execution_id': EXECUTIONS
+}
+
+MANAGEMENT_IP_OPTIONS = ('-t', '--management-ip')
+
+# the list commands a background refresh runs (executions are listed per
+# deployment, and are therefore only cached by "cfy executions list")
+REFRESH_COMMANDS = [['blueprints', 'list'], ['deployments', 'list']]
+
+
+def _get_inventory_path(management_ip):
+    return os.path.join(config.INVENTORY_DIR,
+                        '{0}.json'.format(management_ip))
+
+
+def load(management_ip):
+    """
+    Loads the cached inventory of a management server.
+
+    :rtype: `dict` mapping each kind to its ids and update time; empty if
+     nothing is cached.
+    """
+    try:
+        with open(_get_inventory_path(management_ip), 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _store(management_ip, inventory):
+    storage.write_json(_get_inventory_path(management_ip), inventory)
+
+
+def update(management_ip, kind, ids, deployment_id=None, partial=False):
+    """
+    Updates the cached ids of one kind for a management server. Failing to
+    update the cache never fails the command which lists the ids.
+
+    :param string management_ip: the management server the ids belong to.
+    :param string kind: one of BLUEPRINTS, DEPLOYMENTS or EXECUTIONS.
+    :param ids: an iterable of the ids listed.
+    :param string deployment_id: the deployment of the listed executions.
+    :param bool partial: whether the ids are only a subset of the ids of
+     this kind (e.g. a filtered listing), in which case they're added to
+     the cached ids rather than replacing them.
+    """
+    try:
+        inventory = load(management_ip)
+        entry = inventory.get(kind, {})
+        if kind == EXECUTIONS:
+            ids_by_deployment = entry.get('ids', {})
+            ids_by_deployment[deployment_id] = sorted(set(ids))
+            cached_ids = ids_by_deployment
+        elif partial:
+            cached_ids = sorted(set(entry.get('ids', [])) | set(ids))
+        else:
+            cached_ids = sorted(set(ids))
+        inventory[kind] = {'ids': cached_ids, 'updated_at': time.time()}
+        _store(management_ip, inventory)
+    except (IOError, OSError):
+        pass
+
+
+def get_ids(management_ip, kind):
+    """
+    Returns the cached ids of one kind for a management server.
+
+    :rtype: `tuple` of the cached ids and whether they're stale.
+    """
+    entry = load(management_ip).get(kind)
+    if not entry:
+        return [], True
+    ids = entry['ids']
+    if kind == EXECUTIONS:
+        ids = [execution_id for execution_ids in ids.values()
+               for execution_id in execution_ids]
+    is_stale = time.time() - entry['updated_at'] > config.INVENTORY_TTL
+    return ids, is_stale
+
+
+def _get_active_management_ip():
+    try:
+        with open('.cloudify', 'r') as f:
+            content = f.read()
+    except IOError:
+        return None
+    if content.lstrip().startswith('{'):
+        try:
+            return json.loads(content).get('management_ip')
+        except ValueError:
+            return None
+    # settings files of the legacy yaml format are read without yaml
+    # (which is too slow to import for every completion); they store the
+    # management server as a plain "_management_ip: <ip>" line
+    for line in content.splitlines():
+        if line.startswith('_management_ip:'):
+            management_ip = line.split(':', 1)[1].strip()
+            return management_ip if management_ip != 'null' else None
+    return None
+
+
+def _get_management_ip(words):
+    for option, value in zip(words, words[1:]):
+        if option in MANAGEMENT_IP_OPTIONS:
+            return managers.translate(value)
+    return _get_active_management_ip()
+
+
+def refresh_in_background(management_ip):
+    """
+    Refreshes the inventory of a management server by running the list
+    commands in a detached background process, at most once per
+    config.INVENTORY_REFRESH_INTERVAL.
+    """
+    marker_path = _get_inventory_path(management_ip) + '.refresh'
+    try:
+        if time.time() - os.stat(marker_path).st_mtime < \
+                config.INVENTORY_REFRESH_INTERVAL:
+            return
+    except OSError:
+        pass
+    try:
+        if not os.path.isdir(config.INVENTORY_DIR):
+            os.makedirs(config.INVENTORY_DIR)
+        open(marker_path, 'w').close()
+        # the refresh shouldn't think it's answering the shell's completion
+        env = dict((key, value) for key, value in os.environ.iteritems()
+                   if key not in ('_ARGCOMPLETE', 'COMP_LINE', 'COMP_POINT'))
+        with open(os.devnull, 'r+') as devnull:
+            subprocess.Popen(
+                [sys.executable, '-c',
+                 'from cosmo_cli import inventory; '
+                 'inventory.refresh({0!r})'.format(management_ip)],
+                stdin=devnull, stdout=devnull, stderr=devnull, env=env,
+                close_fds=True, preexec_fn=os.setsid)
+    except (IOError, OSError):
+        pass
+
+
+def refresh(management_ip):
+    """
+    Refreshes the inventory of a management server by running the list
+    commands, which update the inventory as a side effect.
+    """
+    from cosmo_cli import main as cli_main
+    for command in REFRESH_COMMANDS:
+        sys.argv = ['cfy'] + command + ['-t', management_ip]
+        try:
+            cli_main()
+        except SystemExit:
+            pass
+
+
+def complete_value(dest, prefix, words):
+    """
+    Completes the value of an option from the inventory of the management
+    server the command line refers to.
+
+    :param string dest: the destination name of the option.
+    :param string prefix: the part of the value typed so far.
+    :param list words: the words of the command line before the value.
+    :rtype: `list` of completions.
+    """
+    kind = KIND_BY_DEST.get(dest)
+    if not kind:
+        return []
+    management_ip = _get_management_ip(words)
+    if not management_ip:
+        return []
+    ids, is_stale = get_ids(management_ip, kind)
+    if is_stale:
+        refresh_in_background(management_ip)
+    return sorted(item_id for item_id in ids if item_id.startswith(prefix))
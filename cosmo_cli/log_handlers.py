@@ -0,0 +1,103 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+import copy
+import logging
+import logging.handlers
+import os
+import Queue
+import threading
+
+__author__ = 'ran'
+
+# queued in place of a record to stop the writer thread
+_STOP = object()
+
+
+class QueuedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    A rotating file handler which leaves the writing of its records to a
+    background thread, so that logging a record costs the caller no more
+    than putting it on a queue.
+
+    The queue is drained when the handler is flushed or closed, which the
+    logging module does for every handler on exit.
+    """
+
+    def __init__(self, *args, **kwargs):
+        logging.handlers.RotatingFileHandler.__init__(self, *args, **kwargs)
+        self._start_writer()
+
+    def _start_writer(self):
+        self._pid = os.getpid()
+        self._queue = Queue.Queue()
+        self._writer = threading.Thread(target=self._write_records,
+                                        name='cfy-log-writer')
+        self._writer.daemon = True
+        self._writer.start()
+
+    def _write_records(self):
+        while True:
+            record = self._queue.get()
+            try:
+                if record is _STOP:
+                    return
+                logging.handlers.RotatingFileHandler.emit(self, record)
+            finally:
+                self._queue.task_done()
+
+    def _prepare(self, record):
+        # the message is merged with its arguments (and the exception is
+        # formatted) by the caller, since they may change once the record
+        # has been queued. a copy is queued, as the record is still passed
+        # on to the logger's other handlers
+        prepared = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            formatter = self.formatter or logging._defaultFormatter
+            prepared.exc_text = formatter.formatException(record.exc_info)
+        prepared.msg = record.getMessage()
+        prepared.args = None
+        prepared.exc_info = None
+        return prepared
+
+    def emit(self, record):
+        if os.getpid() != self._pid:
+            # the writer thread doesn't survive a fork
+            self._start_writer()
+        if not self._writer.is_alive():
+            # records logged after the handler has been closed
+            logging.handlers.RotatingFileHandler.emit(self, record)
+            return
+        try:
+            self._queue.put_nowait(self._prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        if threading.current_thread() is self._writer:
+            # flushing the stream after each record the writer writes
+            if self.stream and hasattr(self.stream, 'flush'):
+                self.stream.flush()
+            return
+        if self._writer.is_alive() and os.getpid() == self._pid:
+            self._queue.join()
+        logging.handlers.RotatingFileHandler.flush(self)
+
+    def close(self):
+        if self._writer.is_alive() and os.getpid() == self._pid:
+            self._queue.put(_STOP)
+            self._writer.join()
+        logging.handlers.RotatingFileHandler.close(self)
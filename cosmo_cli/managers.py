@@ -0,0 +1,235 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# The user's registry of management servers, shared by all working
+# directories (config.MANAGERS_REGISTRY_FILE).
+#
+# Every manager is registered by its ip, along with its aliases, tags,
+# provider, provider context and last known status. Aliases are indexed
+# in the registry file itself; tags and providers are indexed when first
+# looked up. Provider contexts are stored as json strings of their own,
+# which are decoded only when needed.
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import config
+import storage
+
+__author__ = 'ran'
+
+REGISTRY_VERSION = 1
+
+RUNNING = 'running'
+NOT_RESPONDING = 'not responding'
+
+
+class ManagerRegistryError(Exception):
+    pass
+
+
+class ManagerRegistry(object):
+
+    def __init__(self, registry_dict=None):
+        registry_dict = registry_dict or {}
+        if registry_dict.get('version', REGISTRY_VERSION) > REGISTRY_VERSION:
+            raise ManagerRegistryError(
+                'version {0} of the managers registry is not supported by '
+                'this version of cfy'.format(registry_dict['version']))
+        # managers by ip
+        self._managers = registry_dict.get('managers', {})
+        # manager ips by alias
+        self._aliases = registry_dict.get('aliases', {})
+        # manager ips by tag and by provider, once first looked up
+        self._indexes = {}
+
+    def to_dict(self):
+        return {
+            'version': REGISTRY_VERSION,
+            'managers': self._managers,
+            'aliases': self._aliases
+        }
+
+    def translate(self, address_or_alias):
+        """
+        :rtype: `string` the ip of the manager registered with the alias,
+         or address_or_alias itself if it's not a registered alias.
+        """
+        return self._aliases.get(address_or_alias, address_or_alias)
+
+    def get(self, address_or_alias):
+        """
+        :rtype: `dict` the registration of the manager, or None.
+        """
+        return self._managers.get(self.translate(address_or_alias))
+
+    def get_provider_context(self, address_or_alias):
+        manager = self.get(address_or_alias)
+        if not manager or manager.get('provider_context') is None:
+            return None
+        return json.loads(manager['provider_context'])
+
+    def _get_index(self, field):
+        if field not in self._indexes:
+            index = {}
+            for ip, manager in self._managers.iteritems():
+                values = manager.get(field) or []
+                if not isinstance(values, list):
+                    values = [values]
+                for value in values:
+                    index.setdefault(value, set()).add(ip)
+            self._indexes[field] = index
+        return self._indexes[field]
+
+    def find(self, tag=None, provider=None):
+        """
+        :rtype: `list` of the registrations of the managers having the tag
+         and the provider (of all managers, if neither is given), by ip.
+        """
+        ips = set(self._managers)
+        if tag:
+            ips &= self._get_index('tags').get(tag, set())
+        if provider:
+            ips &= self._get_index('provider').get(provider, set())
+        return [self._managers[ip] for ip in sorted(ips)]
+
+    def register(self, ip, alias=None, tags=None, provider=None,
+                 provider_context=None, status=None,
+                 is_allow_overwrite=False):
+        """
+        Registers a manager, or updates its registration with the given
+        details.
+
+        :raises ManagerRegistryError: if the alias is of another manager,
+         and overwriting it isn't allowed.
+        """
+        if alias and self._aliases.get(alias, ip) != ip and \
+                not is_allow_overwrite:
+            raise ManagerRegistryError(
+                'management-server alias {0} is already in use by {1}; '
+                'use -f flag to allow overwrite.'
+                .format(alias, self._aliases[alias]))
+        self._indexes = {}
+        manager = self._managers.setdefault(ip, {
+            'ip': ip,
+            'aliases': [],
+            'tags': [],
+            'provider': None,
+            'provider_context': None,
+            'status': None,
+            'status_updated_at': None,
+            'registered_at': time.time()
+        })
+        if alias:
+            previous_ip = self._aliases.get(alias)
+            if previous_ip and previous_ip != ip:
+                self._managers[previous_ip]['aliases'].remove(alias)
+            if alias not in manager['aliases']:
+                manager['aliases'].append(alias)
+            self._aliases[alias] = ip
+        for tag in tags or []:
+            if tag not in manager['tags']:
+                manager['tags'].append(tag)
+        if provider is not None:
+            manager['provider'] = provider
+        if provider_context is not None:
+            manager['provider_context'] = json.dumps(provider_context,
+                                                     sort_keys=True)
+        if status is not None:
+            self.set_status(ip, status)
+        return manager
+
+    def set_status(self, ip, status):
+        manager = self._managers.get(ip)
+        if manager:
+            manager['status'] = status
+            manager['status_updated_at'] = time.time()
+
+    def remove(self, address_or_alias):
+        """
+        :rtype: `dict` the registration of the removed manager, or None if
+         it wasn't registered.
+        """
+        manager = self._managers.pop(self.translate(address_or_alias), None)
+        if manager:
+            self._indexes = {}
+            for alias in manager['aliases']:
+                self._aliases.pop(alias, None)
+        return manager
+
+
+# the registry loaded by this process, along with the signature of its file
+_loaded = (None, None)
+
+
+def _get_signature(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime, stat.st_size, stat.st_ino
+    except OSError:
+        return None
+
+
+def load():
+    """
+    Loads the registry, reading its file only if it has changed since this
+    process last loaded it. The registry mustn't be modified; use update().
+
+    :rtype: `ManagerRegistry`
+    """
+    global _loaded
+    path = config.MANAGERS_REGISTRY_FILE
+    signature = _get_signature(path)
+    loaded_signature, registry = _loaded
+    if registry is None or signature != loaded_signature:
+        registry = ManagerRegistry(storage.read_json(path, {}))
+        _loaded = (signature, registry)
+    return registry
+
+
+@contextmanager
+def update():
+    """
+    Yields the registry to be modified, writing it once the context exits
+    (unless it raises). The registry is locked against other processes'
+    updates meanwhile.
+
+    :raises ManagerRegistryError: if the registry file can't be decoded,
+     rather than overwriting it with an empty registry.
+    """
+    global _loaded
+    path = config.MANAGERS_REGISTRY_FILE
+    with storage.lock(path):
+        try:
+            registry_dict = storage.read_json(path, {}, is_strict=True)
+        except ValueError:
+            raise ManagerRegistryError(
+                'the managers registry {0} is corrupt; fix or remove it '
+                'before registering or updating management servers'
+                .format(path))
+        registry = ManagerRegistry(registry_dict)
+        yield registry
+        storage.write_json(path, registry.to_dict())
+        _loaded = (_get_signature(path), registry)
+
+
+def translate(address_or_alias):
+    """
+    :rtype: `string` the ip of a registered alias, or address_or_alias.
+    """
+    return load().translate(address_or_alias)
@@ -0,0 +1,174 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# Runs a function over many items (e.g. management servers) on a bounded
+# number of threads, yielding the results as they complete.
+#
+# Calls which don't return within their timeout are reported as timed out
+# and left to finish in the background (as daemon threads, whose results
+# are dropped), so that a hanging call never holds up the others - nor
+# the process once it's done.
+#
+# A TokenBucket limits the rate of calls made by many threads, e.g. to
+# protect a management server from a batch of calls.
+
+import Queue
+import sys
+import threading
+import time
+
+__author__ = 'ran'
+
+# seconds between checks for an interrupt while waiting for results
+_POLL_INTERVAL = 1
+
+
+class Result(object):
+
+    def __init__(self, item, value=None, error=None, seconds=0,
+                 is_timed_out=False):
+        """
+        :param item: the item the function was called with.
+        :param value: the value the function returned.
+        :param error: the exception the function raised, if it did.
+        :param float seconds: seconds the call took (or had taken, if it
+         timed out).
+        :param bool is_timed_out: whether the call didn't return in time
+         (or wasn't started before the overall timeout).
+        """
+        self.item = item
+        self.value = value
+        self.error = error
+        self.seconds = seconds
+        self.is_timed_out = is_timed_out
+
+    @property
+    def is_success(self):
+        return self.error is None and not self.is_timed_out
+
+
+def run(func, items, concurrency, timeout=None, total_timeout=None):
+    """
+    Calls the function with every item, on up to concurrency threads at a
+    time, in the order of the items.
+
+    :param func: the function to call with every item.
+    :param items: an iterable of the items.
+    :param int concurrency: the maximal number of calls at a time.
+    :param float timeout: seconds after which a call is timed out.
+    :param float total_timeout: seconds after which the calls still running
+     and those not yet started are timed out.
+    :rtype: an iterator over the `Result`s, in the order they completed.
+    """
+    results = Queue.Queue()
+    pending = iter(enumerate(items))
+    # started at, and item, by the index of the item
+    running = {}
+    deadline = time.time() + total_timeout if total_timeout else None
+
+    def call(index, item):
+        started_at = time.time()
+        try:
+            value = func(item)
+        except Exception:
+            results.put((index, None, sys.exc_info()[1],
+                         time.time() - started_at))
+        else:
+            results.put((index, value, None, time.time() - started_at))
+
+    is_pending = True
+    while is_pending or running:
+        while is_pending and len(running) < max(concurrency, 1):
+            try:
+                index, item = next(pending)
+            except StopIteration:
+                is_pending = False
+                break
+            running[index] = (time.time(), item)
+            thread = threading.Thread(target=call, args=(index, item))
+            thread.daemon = True
+            thread.start()
+        if not running:
+            break
+        expirations = [started_at + timeout
+                       for started_at, _ in running.itervalues()] \
+            if timeout else []
+        if deadline:
+            expirations.append(deadline)
+        wait = max(min(expirations) - time.time(), 0) if expirations \
+            else _POLL_INTERVAL
+        try:
+            index, value, error, seconds = results.get(
+                timeout=min(wait, _POLL_INTERVAL))
+        except Queue.Empty:
+            now = time.time()
+            if deadline and now >= deadline:
+                for started_at, item in _pop_all(running):
+                    yield Result(item, seconds=now - started_at,
+                                 is_timed_out=True)
+                for _, item in pending:
+                    yield Result(item, is_timed_out=True)
+                return
+            for index, (started_at, item) in running.items():
+                if timeout and now - started_at >= timeout:
+                    del running[index]
+                    yield Result(item, seconds=now - started_at,
+                                 is_timed_out=True)
+            continue
+        if index in running:
+            # (results of calls which timed out are dropped)
+            _, item = running.pop(index)
+            yield Result(item, value, error, seconds)
+
+
+def _pop_all(running):
+    for index in sorted(running):
+        yield running.pop(index)
+
+
+class TokenBucket(object):
+
+    def __init__(self, rate, capacity=None):
+        """
+        :param float rate: tokens added per second (no limit, if 0).
+        :param float capacity: the maximal number of tokens, i.e. of calls
+         which may be made at once after a pause; defaults to the rate
+         (and at least 1).
+        """
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, waiting for one to be added if there are none.
+        """
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,197 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# Per-phase timing of a command, enabled by the --profile flag or the
+# CFY_PROFILE environment variable.
+#
+# The startup phases (imports, logging setup and argument parsing) are
+# derived from the marks the entry points leave along the way. The phases
+# of the command itself are timed by the code they're spent in, using
+# phase() and timed() (REST calls are timed by the transport); a phase's
+# time excludes the time of other phases nested within it. Everything
+# else is accounted as 'other'.
+#
+# Timing is a no-op unless a profile is running, so that the instrumented
+# code pays next to nothing for it otherwise. Only the thread which started
+# the profile is timed; the time it spends waiting for other threads (see
+# parallel) is accounted to the phase it waits in.
+
+import functools
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+__author__ = 'ran'
+
+# CFY_PROFILE=1 profiles phases; CFY_PROFILE=dump also dumps pstats
+PROFILE_ENV_VAR = 'CFY_PROFILE'
+DUMP = 'dump'
+
+IMPORTS = 'imports'
+LOGGING = 'logging setup'
+PARSE = 'parse'
+SETTINGS = 'settings'
+REST = 'rest'
+RENDER = 'render'
+OTHER = 'other'
+
+STARTED = 'started'
+IMPORTED = 'imported'
+LOGGING_INITIALIZED = 'logging initialized'
+PARSED = 'parsed'
+# pairs of consecutive marks, and the phase spent between them
+STARTUP_MARKS = ((STARTED, IMPORTED, IMPORTS),
+                 (IMPORTED, LOGGING_INITIALIZED, LOGGING),
+                 (LOGGING_INITIALIZED, PARSED, PARSE))
+
+# the startup marks left by the entry points, by name
+_marks = {}
+# the running profile, if any
+_profile = None
+
+
+def mark(name):
+    """
+    Marks a point in the startup of the cli (see STARTUP_MARKS).
+    """
+    _marks[name] = time.time()
+
+
+def get_mode(is_profile, is_dump):
+    """
+    :rtype: `tuple` of whether to profile and whether to dump pstats,
+     by the command's flags and the CFY_PROFILE environment variable.
+    """
+    env_mode = os.environ.get(PROFILE_ENV_VAR, '').lower()
+    is_dump = is_dump or env_mode == DUMP
+    is_profile = is_profile or is_dump or env_mode not in ('', '0')
+    return is_profile, is_dump
+
+
+class _Profile(object):
+
+    def __init__(self):
+        self.durations = {}
+        self.thread = threading.current_thread()
+        # the running phases, as lists of name, start time and the time
+        # spent in phases nested within
+        self._stack = []
+
+    def enter(self, name):
+        self._stack.append([name, time.time(), 0])
+
+    def exit(self):
+        name, started_at, nested_duration = self._stack.pop()
+        duration = time.time() - started_at
+        self.durations[name] = self.durations.get(name, 0) + \
+            duration - nested_duration
+        if self._stack:
+            self._stack[-1][2] += duration
+
+
+@contextmanager
+def phase(name):
+    """
+    Accounts the time spent within the context to a phase.
+    """
+    if not _profile or _profile.thread is not threading.current_thread():
+        yield
+        return
+    _profile.enter(name)
+    try:
+        yield
+    finally:
+        _profile.exit()
+
+
+def timed(name):
+    """
+    A decorator accounting the time spent in the function to a phase.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _profile:
+                return func(*args, **kwargs)
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _format_summary(command_name, durations, total):
+    lines = ['profile of {0}:'.format(command_name),
+             '  {0:<16} {1:>11} {2:>7}'.format('phase', 'time', '%')]
+    for name, duration in sorted(durations.items(),
+                                 key=lambda item: item[1], reverse=True):
+        lines.append('  {0:<16} {1:>9.1f}ms {2:>6.1f}%'.format(
+            name, duration * 1000, 100.0 * duration / total if total else 0))
+    lines.append('  {0:<16} {1:>9.1f}ms'.format('total', total * 1000))
+    return '\n'.join(lines)
+
+
+def _dump_stats(profiler, command_name):
+    if not os.path.isdir(config.PROFILES_DIR):
+        os.makedirs(config.PROFILES_DIR)
+    stats_path = os.path.join(config.PROFILES_DIR, '{0}-{1}-{2}.pstats'.format(
+        time.strftime('%Y%m%d-%H%M%S'), command_name, os.getpid()))
+    profiler.dump_stats(stats_path)
+    return stats_path
+
+
+@contextmanager
+def profile(command_name, is_dump=False):
+    """
+    Profiles the command run within the context, writing a summary of its
+    phases to stderr, and dumping pstats under config.PROFILES_DIR when
+    requested.
+    """
+    global _profile
+    _profile = _Profile()
+    profiler = None
+    if is_dump:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    started_at = time.time()
+    try:
+        yield
+    finally:
+        ended_at = time.time()
+        if profiler:
+            profiler.disable()
+        durations = _profile.durations
+        _profile = None
+
+        command_duration = ended_at - started_at
+        durations[OTHER] = max(command_duration - sum(durations.values()), 0)
+        total = command_duration
+        for start_mark, end_mark, name in STARTUP_MARKS:
+            if start_mark in _marks and end_mark in _marks:
+                duration = _marks[end_mark] - _marks[start_mark]
+                durations[name] = durations.get(name, 0) + duration
+                total += duration
+        summary = _format_summary(command_name, durations, total)
+        if profiler:
+            summary += '\npstats saved to {0}'.format(
+                _dump_stats(profiler, command_name))
+        sys.stdout.flush()
+        sys.stderr.write(summary + '\n')
+        sys.stderr.flush()
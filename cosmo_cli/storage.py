@@ -0,0 +1,108 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# Helpers for the json files the cli keeps under ~/.cloudify, which may be
+# read and written by several cfy processes at once.
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+__author__ = 'ran'
+
+# the files whose lock is held, by thread (see lock)
+_held_locks = threading.local()
+
+
+def read_json(path, default=None, is_strict=False):
+    """
+    :param bool is_strict: whether to raise ValueError for a file that
+     can't be decoded, rather than returning default.
+    :rtype: the json document in the file, or default if there's no file
+     (or it can't be decoded).
+    """
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except IOError:
+        return default
+    except ValueError:
+        if is_strict:
+            raise
+        return default
+
+
+def write_json(path, document, mode=None):
+    """
+    Writes a json document to a temporary file and renames it over the
+    file, so that readers never see it partially written.
+
+    :param int mode: the permissions of the file, if it doesn't exist yet
+     (an existing file's are kept); defaults to 0600.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    try:
+        mode = os.stat(path).st_mode & 0777
+    except OSError:
+        pass
+    fd, temp_path = tempfile.mkstemp(dir=directory,
+                                     prefix=os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(document, f, sort_keys=True)
+        if mode is not None:
+            os.chmod(temp_path, mode)
+        if os.name == 'nt' and os.path.exists(path):
+            # renaming over an existing file isn't possible on windows
+            os.remove(path)
+        os.rename(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@contextmanager
+def lock(path):
+    """
+    Holds an exclusive lock on a file next to the given one (path.lock)
+    within the context; a thread already holding the lock may take it
+    again. Doesn't lock where fcntl isn't available (i.e. windows).
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    held = _held_locks.__dict__.setdefault('paths', set())
+    if path in held:
+        yield
+        return
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.remove(path)
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
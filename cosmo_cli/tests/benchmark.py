@@ -0,0 +1,374 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# Startup and per-command latency benchmarks of the cli, run against the
+# mock REST client.
+#
+# Measures, in seconds:
+#   imports     - the import time of each module, in a fresh interpreter
+#   parse       - the time _parse_args takes for each command line
+#   in_process  - the wall time of each command run by cosmo_cli.main
+#   subprocess  - the wall time of each command run by a new interpreter
+#
+# Every measurement is the median of --repeat runs. The report is a json
+# file meant to be kept with each release and diffed between releases;
+# given a baseline report, measurements slower than the baseline by more
+# than the thresholds are reported as regressions (and fail the run).
+#
+# Usage:
+#   python -m cosmo_cli.tests.benchmark [-o report.json] [-b baseline.json]
+#       [--threshold 0.25] [--min-delta 0.002] [-r 5] [-s SECTION ...]
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+__author__ = 'ran'
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PACKAGE_PARENT_DIR = os.path.dirname(os.path.dirname(THIS_DIR))
+PROVIDERS_DIR = os.path.join(THIS_DIR, 'providers')
+BLUEPRINT_PATH = os.path.join(THIS_DIR, 'blueprints', 'helloworld',
+                              'blueprint.yaml')
+
+SECTIONS = ('imports', 'parse', 'in_process', 'subprocess')
+
+MODULES = (
+    'cosmo_cli.cfy',
+    'cosmo_cli.completion',
+    'cosmo_cli.cosmo_cli',
+    'cosmo_cli.daemon',
+    'cosmo_cli.formatting',
+    'cosmo_cli.provider_common'
+)
+
+# (name, command line, whether it's run end to end). commands which can't
+# be run against the mock REST client and mock providers are only parsed:
+# validate (fetches resources from github), teardown (the mock providers
+# fail it), dev and ssh (need a reachable manager), and daemon (spawns a
+# background process).
+SCENARIOS = (
+    ('status', 'status -t 127.0.0.1', True),
+    ('use', 'use 127.0.0.1', True),
+    ('init', 'init cloudify_mock_provider2 -r', True),
+    ('bootstrap', 'bootstrap', True),
+    ('teardown', 'teardown -f -t 127.0.0.1', False),
+    ('blueprints upload',
+     'blueprints upload {blueprint} -b a-blueprint-id -t 127.0.0.1', True),
+    ('blueprints download',
+     'blueprints download -b a-blueprint-id -o {work_dir}/blueprint.tar.gz '
+     '-t 127.0.0.1', True),
+    ('blueprints list', 'blueprints list -t 127.0.0.1', True),
+    ('blueprints delete', 'blueprints delete -b a-blueprint-id -t 127.0.0.1',
+     True),
+    ('blueprints validate', 'blueprints validate {blueprint}', False),
+    ('deployments create',
+     'deployments create -b a-blueprint-id -d a-deployment-id -t 127.0.0.1',
+     True),
+    ('deployments delete',
+     'deployments delete -d a-deployment-id -t 127.0.0.1', True),
+    ('deployments execute',
+     'deployments execute install -d a-deployment-id -t 127.0.0.1', True),
+    ('deployments list', 'deployments list -t 127.0.0.1', True),
+    ('executions list', 'executions list -d a-deployment-id -t 127.0.0.1',
+     True),
+    ('executions cancel', 'executions cancel -e an-execution-id -t 127.0.0.1',
+     True),
+    ('workflows list', 'workflows list -d a-deployment-id -t 127.0.0.1', True),
+    ('events', 'events -e an-execution-id -t 127.0.0.1', True),
+    ('dev', 'dev run --tasks some_task -t 127.0.0.1', False),
+    ('completion', 'completion -o {work_dir}/completion-index.json', True),
+    ('daemon start', 'daemon start', False),
+    ('ssh', 'ssh -c uptime', False)
+)
+
+# run by a new interpreter to import a module, printing the time it took
+IMPORT_SCRIPT = ('import sys, time; started_at = time.time(); import {0}; '
+                 'sys.stdout.write(repr(time.time() - started_at))')
+
+# run by a new interpreter to run a command against the mock REST client
+RUN_SCRIPT = ('import sys; '
+              'from cosmo_cli import cosmo_cli as cli; '
+              'from cosmo_cli.tests.mock_cosmo_manager_rest_client '
+              'import MockCosmoManagerRestClient; '
+              'cli._get_rest_client = '
+              'lambda ip: MockCosmoManagerRestClient(); '
+              'cli._get_new_rest_client = '
+              'lambda ip: MockCosmoManagerRestClient(); '
+              'sys.argv = ["cfy"] + sys.argv[1:]; '
+              'cli.main()')
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def _median(samples):
+    samples = sorted(samples)
+    middle = len(samples) / 2
+    if len(samples) % 2:
+        return samples[middle]
+    return (samples[middle - 1] + samples[middle]) / 2.0
+
+
+def _get_argv(command_line, work_dir):
+    return command_line.format(blueprint=BLUEPRINT_PATH,
+                               work_dir=work_dir).split()
+
+
+def _get_env(home_dir):
+    env = dict(os.environ, HOME=home_dir, CFY_NO_DAEMON='true')
+    env['PYTHONPATH'] = os.pathsep.join(
+        [PACKAGE_PARENT_DIR, PROVIDERS_DIR] +
+        filter(None, [os.environ.get('PYTHONPATH')]))
+    return env
+
+
+def measure_imports(repeat, env):
+    results = {}
+    for module in MODULES:
+        samples = []
+        for _ in range(repeat):
+            output = subprocess.check_output(
+                [sys.executable, '-c', IMPORT_SCRIPT.format(module)],
+                env=env)
+            samples.append(float(output))
+        results[module] = _median(samples)
+    return results
+
+
+def measure_parse(repeat, work_dir):
+    from cosmo_cli.cosmo_cli import _parse_args
+    results = {}
+    for name, command_line, _ in SCENARIOS:
+        argv = _get_argv(command_line, work_dir)
+        samples = []
+        for _ in range(repeat):
+            started_at = time.time()
+            _parse_args(argv)
+            samples.append(time.time() - started_at)
+        results[name] = _median(samples)
+    return results
+
+
+class _SilencedOutput(object):
+    # redirects the file descriptors rather than sys.stdout, which the
+    # console log handler holds on to
+
+    def __enter__(self):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self._saved_fds = [os.dup(1), os.dup(2)]
+        devnull_fd = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull_fd, 1)
+        os.dup2(devnull_fd, 2)
+        os.close(devnull_fd)
+
+    def __exit__(self, *exc_info):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for fd, saved_fd in zip((1, 2), self._saved_fds):
+            os.dup2(saved_fd, fd)
+            os.close(saved_fd)
+
+
+def _run_in_process(cli, argv):
+    sys.argv = ['cfy'] + argv
+    try:
+        cli.main()
+    except SystemExit as ex:
+        if ex.code:
+            raise BenchmarkError('cfy {0} failed: {1}'
+                                 .format(' '.join(argv), ex.code))
+
+
+def measure_in_process(repeat, work_dir):
+    from cosmo_cli import cosmo_cli as cli
+    from cosmo_cli.tests.mock_cosmo_manager_rest_client \
+        import MockCosmoManagerRestClient
+    cli._get_rest_client = lambda ip: MockCosmoManagerRestClient()
+    cli._get_new_rest_client = lambda ip: MockCosmoManagerRestClient()
+    sys.path.append(PROVIDERS_DIR)
+
+    results = {}
+    for name, command_line, is_run in SCENARIOS:
+        if not is_run:
+            continue
+        argv = _get_argv(command_line, work_dir)
+        samples = []
+        for _ in range(repeat):
+            started_at = time.time()
+            with _SilencedOutput():
+                _run_in_process(cli, argv)
+            samples.append(time.time() - started_at)
+        results[name] = _median(samples)
+    return results
+
+
+def measure_subprocess(repeat, work_dir, env):
+    results = {}
+    with open(os.devnull, 'w') as devnull:
+        for name, command_line, is_run in SCENARIOS:
+            if not is_run:
+                continue
+            argv = _get_argv(command_line, work_dir)
+            samples = []
+            for _ in range(repeat):
+                started_at = time.time()
+                exit_code = subprocess.call(
+                    [sys.executable, '-c', RUN_SCRIPT] + argv,
+                    stdout=devnull, stderr=devnull, cwd=work_dir, env=env)
+                samples.append(time.time() - started_at)
+                if exit_code:
+                    raise BenchmarkError('cfy {0} failed with exit code {1}'
+                                         .format(' '.join(argv), exit_code))
+            results[name] = _median(samples)
+    return results
+
+
+def run(sections=SECTIONS, repeat=5):
+    """
+    Runs the benchmarks in an isolated home and working directory.
+
+    :param sections: the sections of SECTIONS to run.
+    :param int repeat: the number of runs each measurement is the median of.
+    :rtype: `dict` the report.
+    """
+    temp_dir = tempfile.mkdtemp(prefix='cfy-benchmark-')
+    home_dir = os.path.join(temp_dir, 'home')
+    work_dir = os.path.join(temp_dir, 'work')
+    os.mkdir(home_dir)
+    os.mkdir(work_dir)
+    env = _get_env(home_dir)
+    # the cli's user directory is resolved when its config is imported
+    os.environ['HOME'] = home_dir
+    os.environ['CFY_NO_DAEMON'] = 'true'
+    prev_cwd = os.getcwd()
+    os.chdir(work_dir)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat
+    }
+    try:
+        if 'imports' in sections:
+            report['imports'] = measure_imports(repeat, env)
+        if 'parse' in sections:
+            report['parse'] = measure_parse(repeat, work_dir)
+        if 'in_process' in sections or 'subprocess' in sections:
+            # the working directory the commands are run in
+            subprocess.check_call(
+                [sys.executable, '-c', RUN_SCRIPT, 'init',
+                 'cloudify_mock_provider2'], cwd=work_dir, env=env)
+        if 'in_process' in sections:
+            report['in_process'] = measure_in_process(repeat, work_dir)
+        if 'subprocess' in sections:
+            report['subprocess'] = measure_subprocess(repeat, work_dir, env)
+    finally:
+        os.chdir(prev_cwd)
+        shutil.rmtree(temp_dir)
+    return report
+
+
+def compare(report, baseline, threshold=0.25, min_delta=0.002):
+    """
+    Compares a report to a baseline report.
+
+    :param float threshold: the relative slowdown allowed per measurement.
+    :param float min_delta: slowdowns of fewer seconds than this are never
+     regressions (they're within the noise of the shorter measurements).
+    :rtype: `list` of (section, name, baseline, current) tuples of the
+     measurements which regressed.
+    """
+    regressions = []
+    for section in SECTIONS:
+        for name, baseline_value in sorted(baseline.get(section, {}).items()):
+            value = report.get(section, {}).get(name)
+            if value is None:
+                continue
+            if value > baseline_value * (1 + threshold) and \
+                    value - baseline_value > min_delta:
+                regressions.append((section, name, baseline_value, value))
+    return regressions
+
+
+def _print_report(report, baseline):
+    for section in SECTIONS:
+        if section not in report:
+            continue
+        print '{0}:'.format(section)
+        for name, value in sorted(report[section].items()):
+            line = '  {0:<30} {1:9.2f}ms'.format(name, value * 1000)
+            baseline_value = baseline.get(section, {}).get(name)
+            if baseline_value:
+                line += '  ({0:+.0%} from {1:.2f}ms)'.format(
+                    value / baseline_value - 1, baseline_value * 1000)
+            print line
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the startup and per-command latency of the '
+                    'cli against the mock REST client')
+    parser.add_argument('-o', '--output', dest='output', metavar='REPORT',
+                        help='Path to write the json report to')
+    parser.add_argument('-b', '--baseline', dest='baseline',
+                        metavar='BASELINE',
+                        help='Path of a previous report to compare to')
+    parser.add_argument('--threshold', dest='threshold', type=float,
+                        default=0.25,
+                        help='The relative slowdown from the baseline '
+                             'allowed per measurement (default: 0.25)')
+    parser.add_argument('--min-delta', dest='min_delta', type=float,
+                        default=0.002,
+                        help='Slowdowns from the baseline of fewer seconds '
+                             'than this are ignored (default: 0.002)')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=5,
+                        help='The number of runs each measurement is the '
+                             'median of (default: 5)')
+    parser.add_argument('-s', '--section', dest='sections', action='append',
+                        choices=SECTIONS,
+                        help='A section to run; may be given more than once '
+                             '(default: all sections)')
+    args = parser.parse_args(args)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report = run(args.sections or SECTIONS, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+            f.write('\n')
+
+    _print_report(report, baseline)
+    regressions = compare(report, baseline, args.threshold, args.min_delta)
+    for section, name, baseline_value, value in regressions:
+        print 'REGRESSION: {0} {1}: {2:.2f}ms -> {3:.2f}ms'.format(
+            section, name, baseline_value * 1000, value * 1000)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -38,6 +38,10 @@ class MockCosmoManagerRestClient(object):
         self.blueprints = MicroMock()
         self.deployments = MicroMock()
         self.executions = MicroMock()
+        # the http client of CloudifyClient, for requests it has no method
+        # for (e.g. paged listings)
+        self._client = MicroMock(
+            get=lambda uri, params=None, _include=None: [])
 
     def status(self):
         return type('obj', (object,), {'status': 'running',
@@ -52,6 +56,9 @@ class MockCosmoManagerRestClient(object):
     def publish_blueprint(self, blueprint_path, blueprint_id='a-blueprint-id'):
         return MicroMock(id=blueprint_id)
 
+    def download_blueprint(self, blueprint_id, output_file=None):
+        return output_file or '{0}.tar.gz'.format(blueprint_id)
+
     def delete_blueprint(self, blueprint_id):
         if not isinstance(blueprint_id, str):
             raise RuntimeError("blueprint_id should be a string")
@@ -107,9 +114,12 @@ class MicroMock(object):
     def __init__(self, **kwargs):
         self.__dict__.update(kwargs)
 
-    def list(self, *args):
+    def list(self, *args, **kwargs):
         return []
 
+    def create(self, blueprint_id, deployment_id):
+        return MicroMock(id=deployment_id, blueprint_id=blueprint_id)
+
     def list_workflows(self, deployment_id):
         return WorkflowsMock()
 
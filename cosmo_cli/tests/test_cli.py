@@ -17,20 +17,33 @@
 __author__ = 'ran'
 
 import unittest
+import logging
+import logging.handlers
 import os
 import sys
 import shutil
 import subprocess
 from mock_cosmo_manager_rest_client import MockCosmoManagerRestClient
+from mock_cosmo_manager_rest_client import MicroMock
+from cosmo_cli import config
 from cosmo_cli import cosmo_cli as cli
 from cosmo_cli.cosmo_cli import CosmoCliError
 from cosmo_manager_rest_client.cosmo_manager_rest_client \
     import CosmoManagerRestCallError
+from cosmo_manager_rest_client.cosmo_manager_rest_client \
+    import CosmoManagerRestCallTimeoutError
 
 
 TEST_DIR = '/tmp/cloudify-cli-unit-tests'
 TEST_WORK_DIR = TEST_DIR + "/cloudify"
 TEST_PROVIDER_DIR = TEST_DIR + "/mock-provider"
+TEST_HOME_DIR = TEST_DIR + "/home"
+# the files the cli keeps under ~/.cloudify (e.g. the registry of
+# management servers and the response cache), which the tests keep under
+# TEST_HOME_DIR instead
+USER_PATHS = ('COMPLETION_INDEX_FILE', 'INVENTORY_DIR', 'PROFILES_DIR',
+              'MANAGERS_REGISTRY_FILE', 'CIRCUIT_BREAKERS_FILE', 'CACHE_DIR',
+              'DAEMON_SOCKET')
 THIS_DIR = os.path.dirname(os.path.realpath(__file__))
 BLUEPRINTS_DIR = os.path.join(THIS_DIR, 'blueprints')
 
@@ -60,8 +73,25 @@ class CliTest(unittest.TestCase):
     def setUp(self):
         os.mkdir(TEST_WORK_DIR)
         os.chdir(TEST_WORK_DIR)
+        # the subprocesses' ~/.cloudify is moved as well
+        os.mkdir(TEST_HOME_DIR)
+        self.original_home = os.environ.get('HOME')
+        os.environ['HOME'] = TEST_HOME_DIR
+        self.original_user_paths = dict(
+            (name, getattr(config, name)) for name in USER_PATHS)
+        for name, original_path in self.original_user_paths.iteritems():
+            setattr(config, name, os.path.join(
+                TEST_HOME_DIR, '.cloudify',
+                os.path.relpath(original_path, config.USER_DIR)))
 
     def tearDown(self):
+        for name, original_path in self.original_user_paths.iteritems():
+            setattr(config, name, original_path)
+        if self.original_home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = self.original_home
+        shutil.rmtree(TEST_HOME_DIR)
         shutil.rmtree(TEST_WORK_DIR)
 
     def _assert_ex(self, cli_cmd, err_str_segment):
@@ -230,9 +260,11 @@ class CliTest(unittest.TestCase):
 
     def test_teardown_force_deployments(self):
         rest_client = MockCosmoManagerRestClient()
-        rest_client.list_deployments = lambda: [{}]
+        rest_client.deployments = MicroMock(list=lambda *args: [{}])
         cli._get_rest_client = \
             lambda ip: rest_client
+        cli._get_new_rest_client = \
+            lambda ip: rest_client
         self._run_cli("cfy init mock_provider -v")
         self._assert_ex("cfy teardown -t 10.0.0.1 -f --ignore-validation "
                         "-c cloudify-config.yaml -v",
@@ -292,6 +324,28 @@ class CliTest(unittest.TestCase):
         self._create_cosmo_wd_settings()
         self._run_cli("cfy status -t 127.0.0.1")
 
+    def test_status_command_does_not_import_heavy_modules(self):
+        # the status command should only pay for the modules it uses;
+        # running it in a fresh interpreter to get a clean sys.modules
+        self._create_cosmo_wd_settings()
+        script = '\n'.join([
+            'import sys',
+            'from cosmo_cli import cosmo_cli as cli',
+            'from cosmo_cli.tests.mock_cosmo_manager_rest_client import '
+            'MockCosmoManagerRestClient',
+            'cli._get_rest_client = lambda ip: MockCosmoManagerRestClient()',
+            'sys.argv = ["cfy", "status", "-t", "127.0.0.1"]',
+            'cli.main()',
+            'heavy = ("paramiko", "fabric", "dsl_parser")',
+            'sys.stderr.write(",".join(m for m in heavy if m in sys.modules))'
+        ])
+        process = subprocess.Popen([sys.executable, '-c', script],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        _, imported_heavy_modules = process.communicate()
+        self.assertEquals(0, process.returncode)
+        self.assertEquals('', imported_heavy_modules)
+
     def test_blueprints_list(self):
         self._set_mock_rest_client()
         self._create_cosmo_wd_settings()
@@ -356,6 +410,74 @@ class CliTest(unittest.TestCase):
         self._run_cli("cfy deployments delete -d my-dep --ignore-live-nodes"
                       " -t 127.0.0.1")
 
+    def test_deployments_delete_matching(self):
+        rest_client = MockCosmoManagerRestClient()
+        deployments = [
+            {'id': 'ci-1', 'blueprintId': 'ci-bp',
+             'createdAt': '2014-01-01 00:00:00.000'},
+            {'id': 'ci-2', 'blueprintId': 'bp',
+             'createdAt': '2014-01-01 00:00:00.000'},
+            {'id': 'prod', 'blueprintId': 'ci-bp',
+             'createdAt': '2014-01-01 00:00:00.000'}]
+        rest_client._client = MicroMock(
+            get=lambda uri, params=None, _include=None: deployments)
+        rest_client.blueprints = MicroMock(list=lambda **kwargs: [
+            {'id': 'ci-bp', 'createdAt': '2014-01-01 00:00:00.000'},
+            {'id': 'bp', 'createdAt': '2014-01-01 00:00:00.000'}])
+        # the deletions are recorded; deleting prod fails once it's
+        # listed in failing_deployment_ids
+        deleted = []
+        failing_deployment_ids = []
+
+        def delete_deployment(deployment_id, ignore_live_nodes=False):
+            if deployment_id in failing_deployment_ids:
+                raise CosmoManagerRestCallError(
+                    'deployment {0} has live nodes'.format(deployment_id))
+            deleted.append(('deployment', deployment_id, ignore_live_nodes))
+
+        rest_client.delete_deployment = delete_deployment
+        rest_client.delete_blueprint = \
+            lambda blueprint_id: deleted.append(('blueprint', blueprint_id))
+        cli._get_rest_client = \
+            lambda ip: rest_client
+        cli._get_new_rest_client = \
+            lambda ip: rest_client
+        self._create_cosmo_wd_settings()
+        self._run_cli("cfy deployments delete --match ci-* --older-than 2d "
+                      "--dry-run -t 127.0.0.1")
+        self.assertEquals([], deleted)
+
+        self._run_cli("cfy deployments delete --match ci-* -f "
+                      "--concurrency 2 -t 127.0.0.1")
+        # prod doesn't match, and ci-2 is deleted although its blueprint
+        # doesn't match either
+        self.assertEquals([('deployment', 'ci-1', True),
+                           ('deployment', 'ci-2', True)], sorted(deleted))
+
+        # the blueprints are deleted along with their deployments, and a
+        # blueprint is kept if any of its deployments is
+        del deleted[:]
+        failing_deployment_ids.append('prod')
+        self._assert_ex("cfy blueprints delete --match ci-* -t 127.0.0.1",
+                        "Failed deleting 2 of the 3 deployments and "
+                        "blueprints matching 'ci-*'")
+        self.assertEquals([('deployment', 'ci-1', False)], deleted)
+        del deleted[:]
+        del failing_deployment_ids[:]
+        self._run_cli("cfy blueprints delete --match ci-* -t 127.0.0.1")
+        self.assertEquals([('blueprint', 'ci-bp'),
+                           ('deployment', 'ci-1', False),
+                           ('deployment', 'prod', False)], sorted(deleted))
+
+        del deleted[:]
+        self._run_cli("cfy blueprints delete --match nothing-* -t 127.0.0.1")
+        self.assertEquals([], deleted)
+        self._assert_ex("cfy deployments delete -t 127.0.0.1",
+                        "Either --deployment-id or --match")
+        self._assert_ex("cfy blueprints delete -b ci-bp --dry-run "
+                        "-t 127.0.0.1",
+                        "may only be given with --match")
+
     def test_deployments_execute(self):
         self._set_mock_rest_client()
         self._create_cosmo_wd_settings()
@@ -366,6 +488,77 @@ class CliTest(unittest.TestCase):
                       "--deployment-id a-deployment-id")
         self._run_cli("cfy deployments execute install -d dep-id --force")
 
+    def test_deployments_execute_batch(self):
+        rest_client = MockCosmoManagerRestClient()
+        # the executions are recorded; on d2 the workflow fails, and on d3
+        # it times out
+        executed = []
+
+        def execute_deployment(deployment_id, operation, events_handler=None,
+                               timeout=900, include_logs=False, force=False):
+            executed.append((deployment_id, operation))
+            if deployment_id == 'd3':
+                raise CosmoManagerRestCallTimeoutError(
+                    'execution-d3', 'timed out')
+            return ('execution-{0}'.format(deployment_id),
+                    'workflow failed' if deployment_id == 'd2' else None)
+
+        rest_client.execute_deployment = execute_deployment
+        rest_client._client = MicroMock(
+            get=lambda uri, params=None, _include=None: [
+                {'id': 'd4', 'blueprintId': 'a-blueprint'},
+                {'id': 'd5', 'blueprintId': 'a-blueprint'},
+                {'id': 'd6', 'blueprintId': 'another-blueprint'}])
+        cli._get_rest_client = \
+            lambda ip: rest_client
+        cli._get_new_rest_client = \
+            lambda ip: rest_client
+        self._create_cosmo_wd_settings()
+        self._run_cli("cfy use 127.0.0.1")
+        logged = logging.handlers.BufferingHandler(capacity=1000)
+        logging.getLogger('main').addHandler(logged)
+        try:
+            self._run_cli("cfy deployments execute-batch install "
+                          "--deployments d1 --concurrency 2 --timeout 50")
+            self.assertEquals([('d1', 'install')], executed)
+
+            del executed[:]
+            self._run_cli("cfy deployments execute-batch install "
+                          "-b a-blueprint")
+            self.assertEquals([('d4', 'install'), ('d5', 'install')],
+                              sorted(executed))
+
+            del executed[:]
+            del logged.buffer[:]
+            self._assert_ex("cfy deployments execute-batch install "
+                            "--deployments d1,d2,d3",
+                            "Workflow 'install' didn't succeed on 2 of 3 "
+                            "deployments")
+            self.assertEquals([('d1', 'install'), ('d2', 'install'),
+                               ('d3', 'install')], sorted(executed))
+            messages = [record.getMessage() for record in logged.buffer]
+            for message in [
+                    "Workflow 'install' succeeded on deployment 'd1'",
+                    "Workflow 'install' failed on deployment 'd2' "
+                    "[error=workflow failed]",
+                    "Workflow 'install' timed out on deployment 'd3'",
+                    "Workflow 'install' succeeded on 1 deployments, failed "
+                    "on 1 and timed out on 1",
+                    "* Run 'cfy events --include-logs --execution-id "
+                    "execution-d2' for retrieving the events/logs of "
+                    "deployment 'd2'",
+                    "* Run 'cfy events --include-logs --execution-id "
+                    "execution-d3' for retrieving the events/logs of "
+                    "deployment 'd3'"]:
+                self.assertIn(message, messages)
+        finally:
+            logging.getLogger('main').removeHandler(logged)
+
+        del executed[:]
+        self._assert_ex("cfy deployments execute-batch install",
+                        "Either --deployments or --blueprint-id")
+        self.assertEquals([], executed)
+
     def test_deployments_list(self):
         self._set_mock_rest_client()
         self._create_cosmo_wd_settings()
@@ -16,15 +16,73 @@
 
 __author__ = 'dan'
 
+import json
+import logging
+import logging.handlers
+import os
+import StringIO
+import subprocess
+import sys
+import time
 import unittest
+import shutil
+import tempfile
 
+from cosmo_cli import batch
+from cosmo_cli import circuit_breaker
+from cosmo_cli import clients
+from cosmo_cli import commands
+from cosmo_cli import completion
+from cosmo_cli import config
+from cosmo_cli import daemon
+from cosmo_cli import formatting
+from cosmo_cli import http_cache
+from cosmo_cli import inventory
+from cosmo_cli import log_handlers
+from cosmo_cli import managers
+from cosmo_cli import parallel
+from cosmo_cli import profiling
+from cosmo_cli import storage
+from cosmo_cli import transport
+from cosmo_cli import cosmo_cli
 from cosmo_cli.cosmo_cli import (
-    _create_event_message_prefix
+    _create_event_message_prefix,
+    _build_parser,
+    _parse_args
 )
 
 
 class CliUnitTests(unittest.TestCase):
 
+    def setUp(self):
+        self.original_inventory_dir = config.INVENTORY_DIR
+        self.temp_dir = tempfile.mkdtemp()
+        config.INVENTORY_DIR = self.temp_dir
+        self.original_managers_registry_file = config.MANAGERS_REGISTRY_FILE
+        config.MANAGERS_REGISTRY_FILE = os.path.join(self.temp_dir,
+                                                     'managers.json')
+        self.original_cache_dir = config.CACHE_DIR
+        config.CACHE_DIR = os.path.join(self.temp_dir, 'cache')
+        self.original_circuit_breakers_file = config.CIRCUIT_BREAKERS_FILE
+        config.CIRCUIT_BREAKERS_FILE = os.path.join(self.temp_dir,
+                                                    'circuit-breakers.json')
+        # the tests (and the parsers' defaults) use the current directory,
+        # which earlier tests may have removed
+        try:
+            self.original_cwd = os.getcwd()
+        except OSError:
+            self.original_cwd = None
+        os.chdir(self.temp_dir)
+
+    def tearDown(self):
+        if self.original_cwd:
+            os.chdir(self.original_cwd)
+        config.INVENTORY_DIR = self.original_inventory_dir
+        config.CACHE_DIR = self.original_cache_dir
+        config.CIRCUIT_BREAKERS_FILE = self.original_circuit_breakers_file
+        config.MANAGERS_REGISTRY_FILE = self.original_managers_registry_file
+        shutil.rmtree(self.temp_dir)
+
     def test_create_event_message_prefix_with_unicode(self):
 
         unicode_message = u'\u2018'
@@ -38,3 +96,834 @@ class CliUnitTests(unittest.TestCase):
         }
 
         _create_event_message_prefix(event)
+
+    def test_commands_registry_handlers_exist(self):
+        def assert_handlers(command_specs):
+            for spec in command_specs:
+                if 'sub_commands' in spec:
+                    assert_handlers(spec['sub_commands'])
+                else:
+                    self.assertTrue(hasattr(cosmo_cli, spec['handler']),
+                                    spec['handler'])
+
+        assert_handlers(commands.COMMANDS)
+
+    def test_parse_args_of_invoked_command(self):
+        args = _parse_args(['deployments', 'list', '-b', 'b1',
+                            '-t', '10.0.0.1'])
+        self.assertEquals('b1', args.blueprint_id)
+        self.assertEquals('10.0.0.1', args.management_ip)
+        self.assertFalse(args.verbosity)
+        self.assertTrue(callable(args.handler))
+
+    def test_parse_args_matches_full_command_tree(self):
+        argv = ['deployments', 'execute', 'install', '-d', 'd1', '--force']
+        on_demand = vars(_parse_args(argv))
+        full_tree = vars(_build_parser().parse_args(argv))
+        del on_demand['handler']
+        del full_tree['handler']
+        self.assertEquals(full_tree, on_demand)
+
+    def test_parse_args_unknown_command(self):
+        self.assertRaises(SystemExit, _parse_args, ['no-such-command'])
+        self.assertRaises(SystemExit, _parse_args, ['blueprints', 'nope'])
+
+    def test_completion_of_commands(self):
+        index = completion.build_index()
+        self.assertEquals(['blueprints'],
+                          completion.get_completions(index, 'cfy blue'))
+        self.assertEquals(['delete', 'download'],
+                          completion.get_completions(index,
+                                                     'cfy blueprints d'))
+
+    def test_completion_of_options(self):
+        index = completion.build_index()
+        self.assertEquals(
+            ['--blueprint-id', '--columns', '--concurrency', '--format',
+             '--help', '--limit', '--management-ip', '--managers',
+             '--no-cache', '--page-size', '--profile', '--profile-dump',
+             '--timeout', '--verbosity'],
+            completion.get_completions(index, 'cfy deployments list --'))
+        # options which were already given aren't offered again
+        self.assertEquals(
+            ['--columns', '--concurrency', '--format', '--help', '--limit',
+             '--managers', '--no-cache', '--page-size', '--profile',
+             '--profile-dump', '--timeout', '--verbosity'],
+            completion.get_completions(
+                index, 'cfy deployments list --blueprint-id b1 '
+                       '--management-ip 10.0.0.1 --'))
+        # no static completion for an option's value
+        self.assertEquals(
+            [], completion.get_completions(index, 'cfy deployments list -b '))
+
+    def test_inventory_update(self):
+        inventory.update('10.0.0.1', inventory.DEPLOYMENTS, ['d1', 'd2'])
+        inventory.update('10.0.0.1', inventory.DEPLOYMENTS, ['d3'],
+                         partial=True)
+        self.assertEquals((['d1', 'd2', 'd3'], False),
+                          inventory.get_ids('10.0.0.1', inventory.DEPLOYMENTS))
+        inventory.update('10.0.0.1', inventory.DEPLOYMENTS, ['d4'])
+        self.assertEquals((['d4'], False),
+                          inventory.get_ids('10.0.0.1', inventory.DEPLOYMENTS))
+        self.assertEquals(([], True),
+                          inventory.get_ids('10.0.0.2', inventory.DEPLOYMENTS))
+
+    def test_completion_of_ids_from_inventory(self):
+        inventory.update('10.0.0.1', inventory.EXECUTIONS, ['e1', 'e2'],
+                         deployment_id='d1')
+        inventory.update('10.0.0.1', inventory.EXECUTIONS, ['x1'],
+                         deployment_id='d2')
+        self.assertEquals(
+            ['e1', 'e2'],
+            completion.get_completions(completion.build_index(),
+                                       'cfy events -t 10.0.0.1 -e e',
+                                       value_completer=inventory.
+                                       complete_value))
+
+    def test_init_logger_configures_logging_once(self):
+        loggers = cosmo_cli.init_logger()
+        self.assertIs(loggers, cosmo_cli.init_logger())
+
+    def test_queued_file_handler_writes_records_in_order(self):
+        log_path = os.path.join(self.temp_dir, 'cli.log')
+        handler = log_handlers.QueuedRotatingFileHandler(log_path)
+        logger = logging.getLogger('test_queued_file_handler')
+        logger.propagate = False
+        logger.addHandler(handler)
+        # records are passed on to the next handlers as they were logged
+        next_handler = logging.handlers.BufferingHandler(capacity=1000)
+        logger.addHandler(next_handler)
+        try:
+            arguments = ['first']
+            logger.info('record %s', arguments)
+            # the message is formatted when it's logged, not when written
+            arguments.append('second')
+            for i in range(100):
+                logger.info('record %d', i)
+            try:
+                raise ValueError('failure')
+            except ValueError:
+                logger.exception('record with exception')
+            handler.flush()
+            with open(log_path) as f:
+                lines = f.read().splitlines()
+            self.assertEquals(
+                ["record ['first']"] +
+                ['record {0}'.format(i) for i in range(100)] +
+                ['record with exception',
+                 'Traceback (most recent call last):'],
+                lines[:103])
+            self.assertEquals('ValueError: failure', lines[-1])
+            first_record = next_handler.buffer[0]
+            self.assertEquals('record %s', first_record.msg)
+            self.assertEquals((arguments,), first_record.args)
+            self.assertIsNotNone(next_handler.buffer[-1].exc_info)
+        finally:
+            logger.removeHandler(next_handler)
+            logger.removeHandler(handler)
+            handler.close()
+        logger.info('after close')
+
+    def _run_cfy(self, args, env):
+        process = subprocess.Popen(
+            [sys.executable, '-c',
+             'import sys; sys.argv[0] = "cfy"; '
+             'from cosmo_cli.cfy import main; main()'] + args,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+            cwd=self.temp_dir)
+        stdout, stderr = process.communicate()
+        return process.returncode, stdout, stderr
+
+    def test_daemon_runs_commands_like_a_local_run(self):
+        env = dict(os.environ, HOME=self.temp_dir)
+        socket_path = os.path.join(self.temp_dir, '.cloudify', 'daemon.sock')
+        local_env = dict(env)
+        local_env[daemon.NO_DAEMON_ENV_VAR] = 'true'
+        self.assertEquals(0, self._run_cfy(['daemon', 'start'], env)[0])
+        try:
+            self.assertTrue(daemon.is_running(socket_path))
+            for args in (['status'], ['blueprints', 'nope'],
+                         ['deployments', '-h']):
+                self.assertEquals(self._run_cfy(args, local_env),
+                                  self._run_cfy(args, env))
+            self.assertIn('3 commands run',
+                          daemon.send_control(daemon.STATUS, socket_path))
+        finally:
+            self._run_cfy(['daemon', 'stop'], env)
+        self.assertFalse(daemon.is_running(socket_path))
+
+    def test_profile_accounts_nested_phases_exclusively(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            with profiling.profile('some_command'):
+                with profiling.phase(profiling.REST):
+                    with profiling.phase(profiling.RENDER):
+                        time.sleep(0.05)
+                profile = profiling._profile
+            summary = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertIsNone(profiling._profile)
+        self.assertGreaterEqual(profile.durations[profiling.RENDER], 0.05)
+        self.assertLess(profile.durations[profiling.REST], 0.05)
+        self.assertIn('profile of some_command', summary)
+        self.assertIn(profiling.RENDER, summary)
+
+    def test_wd_settings_session(self):
+        settings = cosmo_cli.CosmoWorkingDirectorySettings()
+        settings.set_management_server('10.0.0.1')
+        cosmo_cli._dump_cosmo_working_dir_settings(settings)
+        loaded_settings = cosmo_cli._load_cosmo_working_dir_settings()
+        self.assertEquals(settings, loaded_settings)
+        # loaded once per process, as long as the file doesn't change
+        self.assertIs(loaded_settings,
+                      cosmo_cli._load_cosmo_working_dir_settings())
+
+        # settings which didn't change aren't written back
+        os.utime(cosmo_cli.CLOUDIFY_WD_SETTINGS_FILE_NAME, (1, 1))
+        with cosmo_cli._update_wd_settings() as wd_settings:
+            wd_settings.set_management_server('10.0.0.1')
+        self.assertEquals(
+            1, os.stat(cosmo_cli.CLOUDIFY_WD_SETTINGS_FILE_NAME).st_mtime)
+        with cosmo_cli._update_wd_settings() as wd_settings:
+            wd_settings.set_management_server('10.0.0.2')
+        self.assertEquals(
+            '10.0.0.1', loaded_settings.get_management_server())
+
+        # a file changed by another process is loaded again
+        settings.set_management_server('10.0.0.3')
+        with open(cosmo_cli.CLOUDIFY_WD_SETTINGS_FILE_NAME, 'w') as f:
+            f.write(json.dumps(settings.to_dict()) + '\n')
+        self.assertEquals(
+            '10.0.0.3', cosmo_cli._load_cosmo_working_dir_settings()
+            .get_management_server())
+
+    def test_legacy_wd_settings_migration(self):
+        with open(cosmo_cli.CLOUDIFY_WD_SETTINGS_FILE_NAME, 'w') as f:
+            f.write('!WD_Settings\n'
+                    '_management_ip: 10.0.0.1\n'
+                    '_management_key: null\n'
+                    '_management_user: ubuntu\n'
+                    '_mgmt_aliases: {alias: 10.0.0.2}\n'
+                    '_mgmt_to_contextual_aliases: {}\n'
+                    '_provider: cloudify_openstack\n'
+                    '_provider_context:\n'
+                    '  key: value\n')
+        self.assertEquals('10.0.0.1',
+                          inventory._get_active_management_ip())
+        settings = cosmo_cli._load_cosmo_working_dir_settings()
+        self.assertEquals('ubuntu', settings.get_management_user())
+        self.assertEquals('10.0.0.2',
+                          settings.translate_management_alias('alias'))
+        self.assertEquals({'key': 'value'},
+                          settings.get_provider_context())
+
+        # the file is migrated to the versioned format
+        with open(cosmo_cli.CLOUDIFY_WD_SETTINGS_FILE_NAME) as f:
+            settings_dict = json.load(f)
+        self.assertEquals(cosmo_cli.WD_SETTINGS_VERSION,
+                          settings_dict['version'])
+        self.assertEquals('10.0.0.1',
+                          inventory._get_active_management_ip())
+
+        # the provider context is decoded only once it's needed
+        cosmo_cli._wd_settings_session.clear()
+        settings = cosmo_cli._load_cosmo_working_dir_settings()
+        self.assertIsNone(settings._provider_context)
+        self.assertEquals({'key': 'value'},
+                          settings.get_provider_context())
+
+    def test_merge_wd_settings(self):
+        base = cosmo_cli.CosmoWorkingDirectorySettings()
+        base.save_management_alias('a', '10.0.0.1', False)
+        base.save_management_alias('b', '10.0.0.2', False)
+        # updated by this process
+        updated = cosmo_cli.CosmoWorkingDirectorySettings.from_dict(
+            base.to_dict())
+        updated.set_management_user('ubuntu')
+        updated.save_management_alias('c', '10.0.0.3', False)
+        del updated._mgmt_aliases['a']
+        # concurrently updated by another process
+        current = cosmo_cli.CosmoWorkingDirectorySettings.from_dict(
+            base.to_dict())
+        current.set_management_server('10.0.0.4')
+        current.save_management_alias('d', '10.0.0.5', False)
+
+        merged = cosmo_cli._merge_wd_settings(base, updated, current)
+        self.assertEquals('ubuntu', merged.get_management_user())
+        self.assertEquals('10.0.0.4', merged.get_management_server())
+        self.assertEquals({'b': '10.0.0.2', 'c': '10.0.0.3',
+                           'd': '10.0.0.5'}, merged._mgmt_aliases)
+
+    def test_concurrent_wd_settings_updates(self):
+        cosmo_cli._dump_cosmo_working_dir_settings(
+            cosmo_cli.CosmoWorkingDirectorySettings())
+        processes = [subprocess.Popen(
+            [sys.executable, '-c',
+             'from cosmo_cli import cosmo_cli\n'
+             'for i in range(20):\n'
+             '    with cosmo_cli._update_wd_settings() as settings:\n'
+             '        settings.save_management_alias(\n'
+             '            "p{0}-{{0}}".format(i), "10.0.0.{0}", False)'
+             .format(process_index)])
+            for process_index in range(4)]
+        for process in processes:
+            self.assertEquals(0, process.wait())
+        aliases = cosmo_cli._load_cosmo_working_dir_settings()\
+            ._mgmt_aliases
+        self.assertEquals(80, len(aliases))
+        self.assertEquals(['.cloudify', '.cloudify.lock'],
+                          sorted(name for name in os.listdir('.')
+                                 if name.startswith('.cloudify.') or
+                                 name == '.cloudify'))
+
+    def test_manager_registry(self):
+        with managers.update() as registry:
+            registry.register('10.0.0.1', alias='prod', tags=['eu'],
+                              provider='openstack',
+                              provider_context={'resources': {}})
+            registry.register('10.0.0.2', tags=['eu', 'dev'],
+                              provider='ec2', status=managers.RUNNING)
+        registry = managers.load()
+        self.assertEquals('10.0.0.1', managers.translate('prod'))
+        self.assertEquals('10.0.0.3', managers.translate('10.0.0.3'))
+        self.assertEquals({'resources': {}},
+                          registry.get_provider_context('prod'))
+        self.assertEquals(['10.0.0.1', '10.0.0.2'],
+                          [m['ip'] for m in registry.find(tag='eu')])
+        self.assertEquals(['10.0.0.2'],
+                          [m['ip'] for m in registry.find(tag='eu',
+                                                          provider='ec2')])
+        self.assertEquals(managers.RUNNING,
+                          registry.get('10.0.0.2')['status'])
+
+        with managers.update() as registry:
+            self.assertRaises(managers.ManagerRegistryError,
+                              registry.register, '10.0.0.2', alias='prod')
+            registry.register('10.0.0.2', alias='prod',
+                              is_allow_overwrite=True)
+        self.assertEquals('10.0.0.2', managers.translate('prod'))
+        self.assertEquals([], managers.load().get('10.0.0.1')['aliases'])
+
+        with managers.update() as registry:
+            registry.remove('prod')
+        self.assertIsNone(managers.load().get('10.0.0.2'))
+        self.assertEquals('prod', managers.translate('prod'))
+
+    def test_corrupt_manager_registry_is_not_overwritten(self):
+        with managers.update() as registry:
+            registry.register('10.0.0.1', alias='prod')
+        with open(config.MANAGERS_REGISTRY_FILE) as f:
+            content = f.read()
+        with open(config.MANAGERS_REGISTRY_FILE, 'w') as f:
+            f.write(content[:len(content) / 2])
+
+        def register():
+            with managers.update() as registry:
+                registry.register('10.0.0.2')
+        self.assertRaises(managers.ManagerRegistryError, register)
+        with self.assertRaises(SystemExit) as raised:
+            cosmo_cli._remove_manager(
+                _parse_args(['managers', 'remove', 'prod']))
+        self.assertIn('is corrupt', raised.exception.code)
+        with open(config.MANAGERS_REGISTRY_FILE) as f:
+            self.assertEquals(content[:len(content) / 2], f.read())
+
+    def test_use_registered_manager_without_calling_it(self):
+        with managers.update() as registry:
+            registry.register('10.0.0.1', alias='prod', provider='openstack',
+                              provider_context={'resources': {}})
+        get_status = cosmo_cli._get_management_server_status
+        try:
+            # a registered manager is used without checking its status
+            cosmo_cli._get_management_server_status = None
+            cosmo_cli._use_management_server(_parse_args(['use', 'prod']))
+            settings = cosmo_cli._load_cosmo_working_dir_settings()
+            self.assertEquals('10.0.0.1', settings.get_management_server())
+            self.assertEquals('openstack', settings.get_provider())
+            self.assertEquals({'resources': {}},
+                              settings.get_provider_context())
+        finally:
+            cosmo_cli._get_management_server_status = get_status
+
+    def test_use_alias_of_another_manager_changes_nothing(self):
+        with managers.update() as registry:
+            registry.register('10.0.0.1', alias='prod', provider='openstack',
+                              provider_context={'resources': {}})
+            registry.register('10.0.0.2', provider='ec2',
+                              provider_context={})
+        get_status = cosmo_cli._get_management_server_status
+        try:
+            cosmo_cli._get_management_server_status = None
+            cosmo_cli._use_management_server(_parse_args(['use', 'prod']))
+            with open(cosmo_cli.CLOUDIFY_WD_SETTINGS_FILE_NAME) as f:
+                settings_content = f.read()
+            registry_content = storage.read_json(
+                config.MANAGERS_REGISTRY_FILE)
+
+            with self.assertRaises(SystemExit) as raised:
+                cosmo_cli._use_management_server(
+                    _parse_args(['use', '10.0.0.2', '--alias', 'prod']))
+            self.assertIn('already in use by 10.0.0.1', raised.exception.code)
+            with open(cosmo_cli.CLOUDIFY_WD_SETTINGS_FILE_NAME) as f:
+                self.assertEquals(settings_content, f.read())
+            self.assertEquals(registry_content, storage.read_json(
+                config.MANAGERS_REGISTRY_FILE))
+            self.assertEquals('10.0.0.1', cosmo_cli
+                              ._load_cosmo_working_dir_settings()
+                              .get_management_server())
+        finally:
+            cosmo_cli._get_management_server_status = get_status
+
+    def test_list_from_many_managers(self):
+        with managers.update() as registry:
+            registry.register('10.0.0.1', alias='a')
+            registry.register('10.0.0.2', alias='b')
+            registry.register('10.0.0.3')
+
+        def list_records(management_ip):
+            if management_ip == '10.0.0.2':
+                raise ValueError('unreachable')
+            if management_ip == '10.0.0.3':
+                time.sleep(5)
+            return [{'id': 'x', 'plan': {}}]
+
+        args = _parse_args(['blueprints', 'list', '--managers', 'all,a',
+                            '--timeout', '0.5', '--format', 'jsonl'])
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            with self.assertRaises(SystemExit) as raised:
+                cosmo_cli._list_from_managers(args, 'Blueprints:', ['id'],
+                                              list_records)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        # the failing and the hanging managers don't hold up the others
+        self.assertEquals(['{"id": "x", "manager": "10.0.0.1", "plan": {}}'],
+                          output.splitlines())
+        self.assertEquals('Failed listing from 2 of 3 management servers',
+                          raised.exception.code)
+
+    def _start_json_server(self, etag=None):
+        # serves an empty json list, revalidating it by the etag if given
+        import BaseHTTPServer
+        import threading
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self.server.requests_handled += 1
+                if etag and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', '2')
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write('[]')
+
+            def log_message(self, *args):
+                pass
+
+        server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+        server.requests_handled = 0
+        server_thread = threading.Thread(target=server.serve_forever,
+                                         kwargs={'poll_interval': 0.01})
+        server_thread.daemon = True
+        server_thread.start()
+        original_session, clients._session = clients._session, None
+
+        def stop():
+            clients._session.close()
+            clients._session = original_session
+            clients._clients.clear()
+            server.shutdown()
+            server.server_close()
+        self.addCleanup(stop)
+        return server
+
+    def test_rest_clients_reuse_connections(self):
+        server = self._start_json_server()
+        client = clients.get_client('127.0.0.1', server.server_port)
+        self.assertIs(client, clients.get_client('127.0.0.1',
+                                                 server.server_port))
+        with http_cache.bypass():
+            for _ in range(3):
+                self.assertEquals([], client.blueprints.list())
+        stats = clients.get_stats()
+        self.assertEquals(3, stats['requests'])
+        self.assertEquals(1, stats['connections'])
+
+    def test_http_cache(self):
+        server = self._start_json_server()
+        client = clients.get_client('127.0.0.1', server.server_port)
+        for _ in range(3):
+            self.assertEquals([], client.blueprints.list())
+        # answered from the cache within the ttl
+        self.assertEquals(1, server.requests_handled)
+        http_cache.invalidate('127.0.0.1', server.server_port)
+        self.assertEquals([], client.blueprints.list())
+        self.assertEquals(2, server.requests_handled)
+
+        server = self._start_json_server(etag='"v1"')
+        client = clients.get_client('127.0.0.1', server.server_port)
+        for _ in range(3):
+            self.assertEquals([], client.blueprints.list())
+        # revalidated every time, but only fetched once
+        self.assertEquals(3, server.requests_handled)
+
+        original_size_limit = config.CACHE_SIZE_LIMIT
+        config.CACHE_SIZE_LIMIT = 0
+        try:
+            client.deployments.list()
+        finally:
+            config.CACHE_SIZE_LIMIT = original_size_limit
+        self.assertEquals([], [name for _, _, names in os.walk(
+            config.CACHE_DIR) for name in names])
+
+    def test_transport_routes_retries_and_errors(self):
+        import socket
+        from cloudify_rest_client.exceptions import CloudifyClientError
+
+        class Blueprints(object):
+            calls = 0
+
+            def list(self):
+                Blueprints.calls += 1
+                if Blueprints.calls < 2:
+                    raise socket.error('connection reset')
+                return ['blueprint']
+
+        class Client(object):
+            blueprints = Blueprints()
+
+        class LegacyClient(object):
+            calls = 0
+
+            def delete_deployment(self, deployment_id):
+                LegacyClient.calls += 1
+                raise socket.error('connection reset')
+
+            def get_all_execution_events(self, execution_id):
+                raise CloudifyClientError('no such execution', 404)
+
+        original_backoff = config.REST_RETRY_BACKOFF
+        config.REST_RETRY_BACKOFF = 0
+        try:
+            rest = transport.Transport('10.0.0.1', LegacyClient, Client)
+            stats = transport.get_stats()
+            self.assertEquals(['blueprint'], rest.list_blueprints())
+            self.assertEquals(2, Blueprints.calls)
+            # calls which aren't idempotent are never retried
+            self.assertRaises(socket.error, rest.delete_deployment, 'd')
+            self.assertEquals(1, LegacyClient.calls)
+            self.assertRaises(transport.NotFoundError,
+                              rest.get_execution_events, 'e')
+            self.assertIn('list_blueprints: 1 calls, 1 errors, 1 retries',
+                          transport.format_stats(transport.get_stats(),
+                                                 stats))
+        finally:
+            config.REST_RETRY_BACKOFF = original_backoff
+
+    def test_transport_circuit_breaker(self):
+        import socket
+
+        class Blueprints(object):
+            calls = 0
+            is_up = False
+
+            def list(self):
+                Blueprints.calls += 1
+                if not Blueprints.is_up:
+                    raise socket.error('connection refused')
+                return []
+
+        class Client(object):
+            blueprints = Blueprints()
+
+        original_settings = (config.REST_RETRIES, config.REST_RETRY_BACKOFF,
+                             config.CIRCUIT_BREAKER_THRESHOLD)
+        config.REST_RETRIES, config.REST_RETRY_BACKOFF = 1, 0
+        config.CIRCUIT_BREAKER_THRESHOLD = 2
+        try:
+            rest = transport.Transport('10.0.0.1', None, Client)
+            stats = transport.get_stats()
+            self.assertRaises(socket.error, rest.list_blueprints)
+            self.assertRaises(socket.error, rest.list_blueprints)
+            self.assertEquals(4, Blueprints.calls)
+            # the circuit is open for other processes as well
+            self.assertRaises(circuit_breaker.CircuitOpenError,
+                              transport.Transport('10.0.0.1', None, Client)
+                              .list_blueprints)
+            self.assertEquals(4, Blueprints.calls)
+            self.assertIn('list_blueprints: 3 calls, 5 errors, 2 retries, '
+                          '1 rejected',
+                          transport.format_stats(transport.get_stats(),
+                                                 stats))
+            # other managers' calls aren't affected
+            Blueprints.is_up = True
+            transport.Transport('10.0.0.2', None, Client).list_blueprints()
+            # a trial call is let through once the circuit is reset
+            breakers = storage.read_json(config.CIRCUIT_BREAKERS_FILE)
+            breakers['10.0.0.1']['opened_at'] -= config.CIRCUIT_BREAKER_RESET
+            storage.write_json(config.CIRCUIT_BREAKERS_FILE, breakers)
+            self.assertEquals([], rest.list_blueprints())
+            self.assertEquals({}, storage.read_json(
+                config.CIRCUIT_BREAKERS_FILE))
+        finally:
+            config.REST_RETRIES, config.REST_RETRY_BACKOFF, \
+                config.CIRCUIT_BREAKER_THRESHOLD = original_settings
+        for attempt in range(10):
+            delay = transport.get_retry_delay(attempt)
+            maximal_delay = min(config.REST_RETRY_BACKOFF * 2 ** attempt,
+                                config.REST_RETRY_BACKOFF_MAX)
+            self.assertTrue(maximal_delay / 2 <= delay <= maximal_delay)
+
+    def test_parallel_run_bounds_and_times_out_calls(self):
+        import threading
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def call(item):
+            with lock:
+                running.append(item)
+                max_running.append(len(running))
+            try:
+                time.sleep(item)
+                if item == 0.02:
+                    raise ValueError('failed')
+                return item * 2
+            finally:
+                with lock:
+                    running.remove(item)
+
+        results = list(parallel.run(call, [0.01, 0.02, 0.01, 5, 0.01], 2,
+                                    timeout=0.5))
+        self.assertEquals(2, max(max_running))
+        self.assertEquals([0.01, 0.01, 0.01, 0.02, 5],
+                          sorted(result.item for result in results))
+        self.assertEquals(5, results[-1].item)
+        self.assertTrue(results[-1].is_timed_out)
+        failed = [result for result in results if result.error]
+        self.assertEquals([0.02], [result.item for result in failed])
+        self.assertEquals([0.02] * 3, [result.value for result in results
+                                       if result.is_success])
+        # calls not started before the overall timeout are timed out too
+        started_at = time.time()
+        results = list(parallel.run(call, [5, 5, 0.01], 2,
+                                    total_timeout=0.2))
+        self.assertTrue(time.time() - started_at < 2)
+        self.assertEquals([5, 5, 0.01], [result.item for result in results])
+        self.assertTrue(all(result.is_timed_out for result in results))
+
+    def test_batch_manifest_and_journal(self):
+        yaml_path = os.path.join(self.temp_dir, 'manifest.yaml')
+        with open(yaml_path, 'w') as f:
+            f.write('deployments:\n'
+                    '  - {blueprint_id: b1, deployment_id: d1}\n'
+                    '  - {blueprint_id: b1, deployment_id: 2}\n')
+        csv_path = os.path.join(self.temp_dir, 'manifest.csv')
+        with open(csv_path, 'w') as f:
+            f.write('blueprint_id,deployment_id\nb1,d1\nb2,d1\n')
+        fields = ['blueprint_id', 'deployment_id']
+        self.assertEquals(
+            [{'blueprint_id': 'b1', 'deployment_id': 'd1'},
+             {'blueprint_id': 'b1', 'deployment_id': '2'}],
+            batch.load_manifest(yaml_path, fields, 'deployment_id'))
+        self.assertRaises(batch.ManifestError, batch.load_manifest,
+                          csv_path, fields, 'deployment_id')
+        self.assertRaises(batch.ManifestError, batch.load_manifest,
+                          csv_path, ['blueprint_id', 'inputs'],
+                          'blueprint_id')
+
+        journal = batch.Journal(os.path.join(self.temp_dir, 'progress'),
+                                'deployment_id')
+        self.assertEquals({}, journal.load())
+        journal.record({'deployment_id': 'd1', 'status': 'failed'})
+        journal.record({'deployment_id': 'd1', 'status': 'created'})
+        with open(journal.path, 'a') as f:
+            # an interrupted write
+            f.write('{"deployment_id": "d2", "sta')
+        self.assertEquals({'d1': {'deployment_id': 'd1',
+                                  'status': 'created'}}, journal.load())
+
+    def test_batch_selects_by_pattern_and_age(self):
+        self.assertEquals(7200, batch.parse_age('2h'))
+        self.assertEquals(1.5 * 86400, batch.parse_age(' 1.5D'))
+        for age in ('', '2', 'd', '2y'):
+            self.assertRaises(ValueError, batch.parse_age, age)
+        self.assertEquals(86400, batch.parse_timestamp('1970-01-02 00:00:00'))
+        self.assertEquals(86400, batch.parse_timestamp(
+            '1970-01-02T00:00:00.123Z'))
+        self.assertIsNone(batch.parse_timestamp(None))
+        records = [{'id': 'ci-1', 'createdAt': '1970-01-01 00:00:00.000'},
+                   {'id': 'ci-2', 'createdAt': '1970-01-02 00:00:00.000'},
+                   {'id': 'ci-3'},
+                   {'id': 'prod-ci-4', 'createdAt': '1970-01-01 00:00:00'}]
+        self.assertEquals(['ci-1', 'ci-2', 'ci-3'],
+                          [record['id'] for record in
+                           batch.select(records, 'ci-*')])
+        # records whose age is unknown aren't selected by age
+        self.assertEquals(['ci-1'],
+                          [record['id'] for record in batch.select(
+                              records, 'ci-*', older_than=86400,
+                              now=86400 + 3600)])
+
+    def test_token_bucket_limits_the_rate(self):
+        bucket = parallel.TokenBucket(50, capacity=5)
+        started_at = time.time()
+        for _ in range(10):
+            bucket.acquire()
+        # the first 5 tokens are taken at once, the others at the rate
+        self.assertTrue(0.08 <= time.time() - started_at < 0.5)
+        unlimited = parallel.TokenBucket(0)
+        started_at = time.time()
+        for _ in range(1000):
+            unlimited.acquire()
+        self.assertTrue(time.time() - started_at < 0.1)
+
+    def test_transport_iterates_over_deployment_pages(self):
+        deployments = [{'id': 'd{0}'.format(i),
+                        'blueprintId': 'b{0}'.format(i % 2)}
+                       for i in range(10)]
+        requests = []
+
+        def get_paged(uri, params=None):
+            requests.append(params)
+            matching = [d for d in deployments
+                        if d['blueprintId'] == params.get('blueprint_id',
+                                                          d['blueprintId'])]
+            return matching[params['_offset']:
+                            params['_offset'] + params['_size']]
+
+        def get_all(uri, params=None):
+            requests.append(params)
+            return deployments
+
+        def iter_deployments(get, *args, **kwargs):
+            client = type('Client', (object,), {})()
+            client._client = type('HttpClient', (object,), {})()
+            client._client.get = get
+            rest = transport.Transport('10.0.0.1', None, lambda: client)
+            del requests[:]
+            return [d['id'] for d in rest.iter_deployments(*args, **kwargs)]
+
+        self.assertEquals(['d1', 'd3', 'd5', 'd7', 'd9'],
+                          iter_deployments(get_paged, 'b1', 2))
+        self.assertEquals(3, len(requests))
+        self.assertEquals(['d0', 'd1', 'd2'],
+                          iter_deployments(get_paged, page_size=2, limit=3))
+        self.assertEquals(2, len(requests))
+        # managers which ignore the paging and the filter
+        self.assertEquals(['d0', 'd2', 'd4', 'd6', 'd8'],
+                          iter_deployments(get_all, 'b0', 3))
+        self.assertEquals(1, len(requests))
+        self.assertEquals(['d{0}'.format(i) for i in range(10)],
+                          iter_deployments(get_all, page_size=10))
+        self.assertEquals(2, len(requests))
+
+    def test_transport_selects_listed_fields(self):
+        from cloudify_rest_client.exceptions import NoSuchIncludeFieldError
+        blueprints = [{'id': 'b1', 'createdAt': 't1', 'plan': {}}]
+        requests = []
+
+        class Blueprints(object):
+            is_include_supported = True
+
+            def list(self, _include=None):
+                requests.append(_include)
+                if _include and not Blueprints.is_include_supported:
+                    raise NoSuchIncludeFieldError('no such field', 400)
+                return blueprints
+
+        class Client(object):
+            blueprints = Blueprints()
+            _client = type('HttpClient', (object,), {})()
+            _client.get = lambda uri, params=None, _include=None: \
+                requests.append(_include) or blueprints
+
+        rest = transport.Transport('10.0.0.1', None, Client)
+        self.assertEquals([{'id': 'b1', 'createdAt': 't1'}],
+                          rest.list_blueprints(_include=['id', 'createdAt']))
+        self.assertEquals([['id', 'createdAt']], requests)
+        # managers which don't support selecting the fields
+        Blueprints.is_include_supported = False
+        self.assertEquals([{'id': 'b1'}], rest.list_blueprints(
+            _include=['id']))
+        self.assertEquals([['id', 'createdAt'], ['id'], None], requests)
+        self.assertEquals(blueprints, rest.list_blueprints())
+        # the fields the paging relies on are fetched as well
+        del requests[:]
+        self.assertEquals([{'createdAt': 't1'}],
+                          list(rest.iter_deployments(fields=['createdAt'])))
+        self.assertEquals([['blueprintId', 'createdAt', 'id']], requests)
+
+    def test_table_is_laid_out_as_rows_are_consumed(self):
+        consumed = []
+
+        def rows():
+            for i in range(5):
+                consumed.append(i)
+                yield {'id': 'd{0}'.format(i) if i < 4 else 'wider-than-d',
+                       'name': u'\u2018n'}
+
+        original_sample_rows = config.TABLE_SAMPLE_ROWS
+        config.TABLE_SAMPLE_ROWS = 2
+        try:
+            lines = iter(formatting.table(['id', 'name'], rows()))
+            self.assertEquals(u'+----+------+', next(lines))
+            self.assertEquals([0, 1], consumed)
+            self.assertEquals([u'| id | name |',
+                               u'+----+------+',
+                               u'| d0 |  \u2018n  |',
+                               u'| d1 |  \u2018n  |',
+                               u'| d2 |  \u2018n  |'],
+                              [next(lines) for _ in range(5)])
+            self.assertEquals([0, 1, 2], consumed)
+            # a value wider than the sampled ones is truncated
+            self.assertEquals([u'| d3 |  \u2018n  |',
+                               u'| w\u2026 |  \u2018n  |',
+                               u'+----+------+'], list(lines))
+        finally:
+            config.TABLE_SAMPLE_ROWS = original_sample_rows
+        self.assertEquals(u'| abc\u2026 |', list(formatting.table(
+            ['id'], [{'id': 'abcdef'}], widths={'id': 4}))[3])
+
+        stream = StringIO.StringIO()
+        formatting.write_lines(stream, [u'\u2018', 'b'])
+        self.assertEquals('\xe2\x80\x98{0}b{0}'.format(os.linesep),
+                          stream.getvalue())
+
+    def test_machine_readable_records(self):
+        data = [{'id': 'd1', 'name': u'\u2018n'}, {'id': 'd,2'}]
+        defaults = {'name': None}
+        self.assertEquals(
+            ['[', '{"id": "d1", "name": "\\u2018n"},',
+             '{"id": "d,2", "name": null}', ']'],
+            list(formatting.records(formatting.JSON, ['id'], data,
+                                    defaults)))
+        self.assertEquals(['[', ']'], list(formatting.records(
+            formatting.JSON, ['id'], [])))
+        self.assertEquals(
+            ['{"id": "d1", "name": "\\u2018n"}', '{"id": "d,2"}'],
+            list(formatting.records(formatting.JSONL, ['id'], data)))
+        self.assertEquals(
+            ['id,name', 'd1,\xe2\x80\x98n', '"d,2",'],
+            list(formatting.records(formatting.CSV, ['id', 'name'], data,
+                                    defaults)))
+        self.assertEquals(
+            ['id\tname', 'd1\t\xe2\x80\x98n', 'd,2\t'],
+            list(formatting.records(formatting.TSV, ['id', 'name'], data,
+                                    defaults)))
+        self.assertEquals(
+            ['{"name": "\\u2018n"}', '{"name": null}'],
+            list(formatting.records(formatting.JSONL, ['name', 'size'],
+                                    data, defaults, is_projected=True)))
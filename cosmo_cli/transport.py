@@ -0,0 +1,349 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+############
+
+# The single path of the handlers' calls to a management server.
+#
+# Handlers call operations (e.g. transport.list_blueprints()) rather than
+# client methods; ROUTES maps every operation to the client which serves
+# it - the legacy CosmoManagerRestClient or the new CloudifyClient - and
+# to the client's method, so that operations can be moved from one client
+# to the other without touching the handlers.
+#
+# Every call is timed (as the profile's REST phase as well), counted and
+# retried with exponential backoff and jitter on transient failures when
+# the operation is idempotent. Transient failures which retrying didn't
+# overcome count towards opening the management server's circuit breaker,
+# after which calls to the server fail at once for a while (see
+# circuit_breaker). Calls of operations which aren't idempotent drop the
+# server's cached responses (see http_cache). Not-found errors of either
+# client are raised as NotFoundError; other errors are raised as the
+# clients raise them.
+#
+# The fields given to listings as _include are selected by the server, and
+# picked out of the records once decoded as well, for managers which
+# don't support selecting fields (or not the given ones).
+
+import random
+import socket
+import sys
+import threading
+import time
+
+import circuit_breaker
+import clients
+import config
+import http_cache
+import profiling
+
+__author__ = 'ran'
+
+RETRIES_ENV_VAR = 'CFY_REST_RETRIES'
+RETRY_BACKOFF_ENV_VAR = 'CFY_REST_RETRY_BACKOFF'
+
+LEGACY = 'legacy'
+NEW = 'new'
+
+# operation: (client, method, whether it's idempotent)
+ROUTES = {
+    'status': (LEGACY, 'status', True),
+    'get_provider_context': (LEGACY, 'get_provider_context', True),
+    'post_provider_context': (LEGACY, 'post_provider_context', False),
+    'list_blueprints': (NEW, 'blueprints.list', True),
+    'upload_blueprint': (LEGACY, 'publish_blueprint', False),
+    'download_blueprint': (LEGACY, 'download_blueprint', True),
+    'delete_blueprint': (LEGACY, 'delete_blueprint', False),
+    'list_deployments': (NEW, 'deployments.list', True),
+    # a page of the deployments, by query parameters (see iter_deployments)
+    'get_deployments': (NEW, '_client.get', True),
+    'create_deployment': (NEW, 'deployments.create', False),
+    'delete_deployment': (LEGACY, 'delete_deployment', False),
+    'execute_deployment': (LEGACY, 'execute_deployment', False),
+    'list_workflows': (NEW, 'deployments.list_workflows', True),
+    'list_executions': (NEW, 'executions.list', True),
+    'cancel_execution': (LEGACY, 'cancel_execution', False),
+    'get_execution_events': (LEGACY, 'get_all_execution_events', True),
+}
+
+# the modules and names of the clients' base error types
+_CLIENT_ERRORS = (
+    ('cosmo_manager_rest_client.cosmo_manager_rest_client',
+     'CosmoManagerRestCallError'),
+    ('cloudify_rest_client.exceptions', 'CloudifyClientError'),
+)
+# the module and name of the error of unsupported _include fields
+_INCLUDE_FIELD_ERROR = ('cloudify_rest_client.exceptions',
+                        'NoSuchIncludeFieldError')
+# http statuses of responses worth retrying
+_TRANSIENT_STATUSES = (502, 503, 504)
+
+# calls, errors, retries, calls rejected by the circuit breaker and seconds
+# spent, by operation
+_stats = {}
+# calls may be made by several threads at once (see parallel)
+_stats_lock = threading.Lock()
+
+
+class NotFoundError(Exception):
+
+    def __init__(self, message, cause):
+        super(NotFoundError, self).__init__(message)
+        self.cause = cause
+        self.status_code = 404
+
+
+def is_rest_error(error_type):
+    """
+    :rtype: `bool` whether the error type is an error of one of the clients.
+    """
+    if issubclass(error_type, (NotFoundError,
+                               circuit_breaker.CircuitOpenError)):
+        return True
+    for module_name, class_name in _CLIENT_ERRORS:
+        # a client's errors can only be raised once its module is imported
+        module = sys.modules.get(module_name)
+        if module and issubclass(error_type, getattr(module, class_name)):
+            return True
+    return False
+
+
+def _is_transient(ex):
+    if isinstance(ex, socket.error):
+        return True
+    requests_exceptions = sys.modules.get('requests.exceptions')
+    if requests_exceptions and isinstance(
+            ex, (requests_exceptions.ConnectionError,
+                 requests_exceptions.Timeout)):
+        return True
+    return is_rest_error(type(ex)) and \
+        getattr(ex, 'status_code', None) in _TRANSIENT_STATUSES
+
+
+def _is_include_field_error(ex):
+    module_name, class_name = _INCLUDE_FIELD_ERROR
+    module = sys.modules.get(module_name)
+    return bool(module) and isinstance(ex, getattr(module, class_name))
+
+
+def project(record, fields):
+    """
+    :rtype: `dict` of the record's fields among the given ones.
+    """
+    return dict((field, record[field]) for field in fields if field in record)
+
+
+def _record(operation, seconds, is_error=False, is_retry=False,
+            is_rejected=False):
+    with _stats_lock:
+        stats = _stats.setdefault(operation, {'calls': 0, 'errors': 0,
+                                              'retries': 0, 'rejected': 0,
+                                              'seconds': 0})
+        stats['calls'] += 0 if is_retry else 1
+        stats['errors'] += 1 if is_error else 0
+        stats['retries'] += 1 if is_retry else 0
+        stats['rejected'] += 1 if is_rejected else 0
+        stats['seconds'] += seconds
+
+
+def get_retry_delay(attempt):
+    """
+    :rtype: `float` seconds to wait before retrying a call for the
+     attempt's time (0 for the first retry): the backoff doubled for every
+     earlier retry (up to config.REST_RETRY_BACKOFF_MAX), of which the
+     second half is random, so that clients don't retry in step.
+    """
+    backoff = clients.get_setting(RETRY_BACKOFF_ENV_VAR,
+                                  config.REST_RETRY_BACKOFF, float)
+    delay = min(backoff * 2 ** attempt, config.REST_RETRY_BACKOFF_MAX) / 2
+    return delay + random.uniform(0, delay)
+
+
+class Transport(object):
+
+    def __init__(self, management_ip, get_legacy_client, get_client,
+                 is_cache_used=True):
+        """
+        :param string management_ip: the management server called.
+        :param get_legacy_client: returns the server's legacy client.
+        :param get_client: returns the server's (new) client.
+        :param bool is_cache_used: whether responses may be answered from
+         the cache.
+        """
+        self.management_ip = management_ip
+        self._is_cache_used = is_cache_used
+        self._client_factories = {LEGACY: get_legacy_client,
+                                  NEW: get_client}
+
+    def __getattr__(self, operation):
+        if operation not in ROUTES:
+            raise AttributeError(operation)
+        return lambda *args, **kwargs: self.call(operation, *args, **kwargs)
+
+    def _get_method(self, operation):
+        client_name, method_path, _ = ROUTES[operation]
+        target = self._client_factories[client_name]()
+        for attribute_name in method_path.split('.'):
+            target = getattr(target, attribute_name)
+        return target
+
+    def call(self, operation, *args, **kwargs):
+        """
+        Calls an operation (see ROUTES) on the management server.
+
+        :raises NotFoundError: if the server responded with 404.
+        :raises CircuitOpenError: if the server's calls failed repeatedly
+         of late.
+        """
+        is_idempotent = ROUTES[operation][2]
+        method = self._get_method(operation)
+        try:
+            circuit_breaker.check(self.management_ip)
+        except circuit_breaker.CircuitOpenError:
+            _record(operation, 0, is_error=True, is_rejected=True)
+            raise
+        fields = kwargs.get('_include')
+        try:
+            with http_cache.bypass(not self._is_cache_used):
+                try:
+                    result = self._call(operation, method, is_idempotent,
+                                        *args, **kwargs)
+                except Exception as ex:
+                    if not fields or not _is_include_field_error(ex):
+                        raise
+                    # fetching the whole records, and picking the fields here
+                    del kwargs['_include']
+                    result = self._call(operation, method, is_idempotent,
+                                        *args, **kwargs)
+        finally:
+            if not is_idempotent:
+                http_cache.invalidate(self.management_ip)
+        if fields and isinstance(result, list):
+            result = [project(record, fields) for record in result]
+        return result
+
+    def iter_deployments(self, blueprint_id=None, page_size=None,
+                         limit=None, fields=None):
+        """
+        Iterates over the deployments (of a blueprint, if given), fetching
+        them a page at a time.
+
+        The blueprint filter and the paging are sent as query parameters.
+        Managers which don't support them return all the deployments at
+        once, in which case the deployments are filtered here.
+
+        :param string blueprint_id: the blueprint to list deployments of.
+        :param int page_size: deployments per page; defaults to
+         config.DEPLOYMENTS_PAGE_SIZE.
+        :param int limit: the maximal number of deployments to iterate over.
+        :param list fields: the deployments' fields to fetch (all of them,
+         if not given).
+        """
+        page_size = page_size or config.DEPLOYMENTS_PAGE_SIZE
+        kwargs = {}
+        if fields:
+            # the fields the paging and the filter rely on are fetched too
+            kwargs['_include'] = sorted(set(fields) | {'id', 'blueprintId'})
+        offset = 0
+        count = 0
+        previous_ids = set()
+        while True:
+            params = {'_offset': offset, '_size': page_size}
+            if blueprint_id:
+                params['blueprint_id'] = blueprint_id
+            page = self.get_deployments('/deployments', params=params,
+                                        **kwargs)
+            if isinstance(page, dict):
+                # paged responses of newer managers
+                page = page['items']
+            page_ids = set(deployment['id'] for deployment in page)
+            if len(page) > page_size or previous_ids & page_ids:
+                # the paging was ignored, and these are all the deployments
+                page = [deployment for deployment in page
+                        if deployment['id'] not in previous_ids]
+                is_last_page = True
+            else:
+                is_last_page = len(page) < page_size
+            for deployment in page:
+                if blueprint_id and deployment['blueprintId'] != blueprint_id:
+                    continue
+                if limit is not None and count >= limit:
+                    return
+                count += 1
+                yield project(deployment, fields) if fields else deployment
+            if is_last_page:
+                return
+            offset += len(page)
+            previous_ids = page_ids
+
+    def _call(self, operation, method, is_idempotent, *args, **kwargs):
+        retries = clients.get_setting(RETRIES_ENV_VAR, config.REST_RETRIES,
+                                      int)
+        attempt = 0
+        while True:
+            started_at = time.time()
+            try:
+                with profiling.phase(profiling.REST):
+                    result = method(*args, **kwargs)
+                _record(operation, time.time() - started_at,
+                        is_retry=attempt > 0)
+                circuit_breaker.record_success(self.management_ip)
+                return result
+            except Exception as ex:
+                _record(operation, time.time() - started_at, is_error=True,
+                        is_retry=attempt > 0)
+                is_transient = _is_transient(ex)
+                if not is_idempotent or attempt >= retries or \
+                        not is_transient:
+                    if is_transient:
+                        circuit_breaker.record_failure(self.management_ip)
+                    if is_rest_error(type(ex)) and \
+                            getattr(ex, 'status_code', None) == 404:
+                        raise NotFoundError(str(ex), ex), \
+                            None, sys.exc_info()[2]
+                    raise
+            time.sleep(get_retry_delay(attempt))
+            attempt += 1
+
+
+def get_stats():
+    """
+    :rtype: `dict` of the calls, errors, retries, rejected calls and seconds
+     spent so far, by operation.
+    """
+    with _stats_lock:
+        return dict((operation, dict(stats))
+                    for operation, stats in _stats.iteritems())
+
+
+def format_stats(stats, since=None):
+    """
+    :param dict stats: stats returned by get_stats().
+    :param dict since: earlier stats to subtract, if any.
+    :rtype: `string` a line per operation called.
+    """
+    since = since or {}
+    lines = []
+    for operation in sorted(stats):
+        previous = since.get(operation, {})
+        delta = dict((key, value - previous.get(key, 0))
+                     for key, value in stats[operation].iteritems())
+        if delta['calls'] or delta['retries']:
+            lines.append(
+                'rest: {0}: {1} calls, {2} errors, {3} retries, {4} rejected '
+                'by the circuit breaker, {5:.1f}ms'.format(
+                    operation, delta['calls'], delta['errors'],
+                    delta['retries'], delta['rejected'],
+                    delta['seconds'] * 1000))
+    return '\n'.join(lines)
@@ -32,7 +32,7 @@ setup(
     description='Cloudify CLI',
     entry_points={
         'console_scripts': [
-            'cfy = cosmo_cli.cosmo_cli:main',
+            'cfy = cosmo_cli.cfy:main',
             'activate_cfy_bash_completion = cosmo_cli.activate_bash_completion:main'  # NOQA
         ]
     },